@@ -0,0 +1,104 @@
+"""
+Response compression for API views.
+
+Bodies of at least `API_COMPRESS_MIN_SIZE` bytes are compressed with the
+best encoding the client accepts, in the order zstd, brotli, gzip (zstd and
+brotli only when their libraries are installed). Views can set
+`response.compression_cache_key` to keep compressed bodies in the cache,
+next to the payload they were rendered from, so a hot page is compressed
+once per encoding instead of once per request.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from .serving import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/yaml', 'application/javascript', 'text/')
+VARIANT_CACHE_TIMEOUT = 300  # Matches the list/filter payload timeout
+
+# Levels favour speed: these run on the request path, unlike the static files' max levels
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data: brotli.compress(data, quality=5)
+COMPRESSORS['gzip'] = lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def negotiate(request):
+    """
+    The preferred encoding the client accepts, or None.
+    """
+    accepted = accepted_encodings(request)
+    return next((encoding for encoding in COMPRESSORS if encoding in accepted), None)
+
+
+def compress(response, encoding):
+    """
+    Compressed body for a response, reusing a cached variant when the view
+    named one and the uncompressed content is unchanged.
+    """
+    variant_key = getattr(response, 'compression_cache_key', None)
+    if variant_key is None:
+        return COMPRESSORS[encoding](response.content)
+
+    digest = hashlib.blake2b(response.content, digest_size=16).digest()
+    variant_key = f"{variant_key}_{encoding}"
+    cached = cache.get(variant_key)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    body = COMPRESSORS[encoding](response.content)
+    cache.set(variant_key, (digest, body), VARIANT_CACHE_TIMEOUT)
+    return body
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+        body = compress(response, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # As GZipMiddleware does: a strong ETag must not match another encoding's bytes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def compressible(self, response):
+        return (
+            not response.streaming
+            and response.status_code == 200
+            and not response.has_header('Content-Encoding')
+            and response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+            and 'no-transform' not in response.get('Cache-Control', '')
+            and len(response.content) >= settings.API_COMPRESS_MIN_SIZE
+        )
@@ -0,0 +1,192 @@
+"""
+Primary/replica database routing.
+
+Reads go to a healthy replica only while a request with a safe method is
+being served; writes, reads outside requests (commands, workers) and reads
+by users who wrote within the last `DATABASE_PIN_SECONDS` use the primary,
+so users always see their own writes. Reads that fill a cache shared by
+every user go to the primary while a replica may still lag the write that
+made the cache key new (`fresh_reads`).
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+HEALTH_CHECK_INTERVAL = 5  # Seconds a replica health result is reused
+
+
+@dataclass
+class ReadRouting:
+    request: object
+    replica_allowed: bool
+    pinned: bool = field(default=None)
+
+
+_routing = ContextVar('read_routing', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def pin_cache_key(user_id):
+    return f"db_pin_user_{user_id}"
+
+
+def _request_user(request):
+    """
+    The authenticated user if already resolved. DRF replaces `request.user`
+    once it authenticates; an unevaluated session user is left alone so the
+    router never triggers a query while routing one.
+    """
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def _is_pinned(routing):
+    if routing.pinned is None:
+        user = _request_user(routing.request)
+        if user is None or not user.is_authenticated:
+            return False  # Not known yet, decide again on the next query
+        routing.pinned = bool(cache.get(pin_cache_key(user.pk)))
+    return routing.pinned
+
+
+class ReplicaHealth:
+    """
+    Per-process replica health, refreshed at most every HEALTH_CHECK_INTERVAL.
+    A replica is unhealthy when it does not answer within
+    `DATABASE_REPLICA_TIMEOUT` or lags more than `DATABASE_REPLICA_MAX_LAG`
+    seconds behind the primary.
+    """
+
+    def __init__(self):
+        self._checked = {}
+        self._checking = set()
+        self._lock = threading.Lock()
+
+    def check(self, alias):
+        """
+        Return `(healthy, lag_seconds, error)` for a replica, querying it now.
+        """
+        timeout = getattr(settings, 'DATABASE_REPLICA_TIMEOUT', 2)
+        try:
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                if connections[alias].vendor == 'postgresql':
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(int(timeout * 1000))])
+                    # The last replay time stands still while the primary is idle, so a
+                    # replica that has replayed everything it received is not lagging
+                    cursor.execute(
+                        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                    )
+                    lag = float(cursor.fetchone()[0])
+                else:
+                    cursor.execute("SELECT 1")
+                    lag = 0.0
+        except Exception as e:
+            return False, None, str(e)
+        max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+        return lag <= max_lag, lag, None
+
+    def is_healthy(self, alias):
+        with self._lock:
+            checked_at, healthy = self._checked.get(alias, (None, True))
+            if checked_at is not None and time.monotonic() - checked_at <= HEALTH_CHECK_INTERVAL:
+                return healthy
+            if alias in self._checking:
+                return healthy  # Another thread is checking it; go on with the last result
+            self._checking.add(alias)
+
+        # Outside the lock, so a replica that hangs only holds up the thread checking it
+        try:
+            healthy, lag, error = self.check(alias)
+        finally:
+            with self._lock:
+                self._checking.discard(alias)
+        if not healthy:
+            logger.warning(f"Replica {alias} unhealthy (lag={lag}, error={error})")
+        with self._lock:
+            self._checked[alias] = (time.monotonic(), healthy)
+        return healthy
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+@contextmanager
+def fresh_reads(changed_at):
+    """
+    Route the block's reads to the primary if a healthy replica may still
+    lag a write made at `changed_at` (Unix time, None if unknown), so what
+    they fill a shared cache with is not older than the key it goes under.
+    """
+    window = max(getattr(settings, 'DATABASE_PIN_SECONDS', 5), getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10))
+    token = _routing.set(None) if changed_at is None or time.time() - changed_at < window else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.replica_allowed or _is_pinned(routing):
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replica_aliases() if replica_health.is_healthy(alias)]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas share the primary's schema; allowing them lets test databases be built for them
+        return db == DEFAULT_DB_ALIAS or db in replica_aliases()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allows replica reads for safe-method requests, and pins the user to the
+    primary for `DATABASE_PIN_SECONDS` after a successful write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = ReadRouting(request=request, replica_allowed=request.method in SAFE_METHODS)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if not routing.replica_allowed and response.status_code < 400:
+            user = _request_user(request)
+            if user is not None and user.is_authenticated:
+                cache.set(pin_cache_key(user.pk), True, timeout=getattr(settings, 'DATABASE_PIN_SECONDS', 5))
+        return response
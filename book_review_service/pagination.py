@@ -0,0 +1,122 @@
+"""
+Pagination that does not count every row of large tables.
+
+Above PAGINATION_ESTIMATE_THRESHOLD rows the total is the Postgres
+planner's estimate: `pg_class.reltuples` for a whole table, the EXPLAIN
+row estimate for a filtered query. Below it, or on other databases, the
+count is exact. Pages past an estimated end are still served, and whether
+there is a next page comes from fetching one row more than the page holds.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.response import Response
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for the queryset, or None when there is
+    none (not Postgres, or a table never analyzed).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    if not query.where and not query.distinct and not query.combinator:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None  # -1 until the first ANALYZE
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1 if len(self) else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose `count` is an estimate, with `approximate` set, when
+    the planner expects at least `threshold` rows.
+    """
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, threshold=None, **kwargs):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page, **kwargs)
+        self.threshold = settings.PAGINATION_ESTIMATE_THRESHOLD if threshold is None else threshold
+        self.approximate = False
+
+    @cached_property
+    def count(self):
+        count = self.cached_count()
+        if count is not None:
+            return count
+        estimate = estimated_count(self.object_list) if self.threshold and hasattr(self.object_list, 'query') else None
+        if estimate is not None and estimate >= self.threshold:
+            self.approximate = True
+            return estimate
+        return self.exact_count()
+
+    def cached_count(self):
+        """An exact count known without querying, or None. Checked before estimating."""
+        return None
+
+    def exact_count(self):
+        return super().count
+
+    def validate_number(self, number):
+        if not self.count or not self.approximate:  # Reading count sets approximate
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return EstimatedPage(rows[:self.per_page], number, self, more=len(rows) > self.per_page)
+
+
+class EstimatedCountPagination(pagination.PageNumberPagination):
+    """
+    Page number pagination over `EstimatedCountPaginator`. Responses carry
+    `count_approximate`, true when `count` is an estimate.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_approximate': self.page.paginator.approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_approximate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
@@ -0,0 +1,208 @@
+"""
+On-demand profiling of single API requests by staff.
+
+A staff user (`is_staff`, or the 'admin' role) adds `X-Profile: collapsed`
+or `?profile=collapsed` to a request. The request then runs under a
+sampling profiler: a thread records the request thread's stack every
+PROFILE_SAMPLE_INTERVAL seconds, giving collapsed stacks for flamegraph
+tools. `pstats` instead runs cProfile, which is exact but slows the
+request down. Results go to a ring buffer of PROFILE_BUFFER_SIZE entries
+in the shared cache, listed and downloaded from /api/profiling/. The
+response names its entry in `X-Profile-Id`.
+
+Requests without the flag pay for one header lookup and one substring
+test of the query string.
+"""
+import cProfile
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from users.permissions import IsAdmin
+
+FORMATS = ('collapsed', 'pstats')
+SEQUENCE_KEY = 'profiling_sequence'
+PROFILE_TTL = 60 * 60 * 24
+MAX_STACK_DEPTH = 200
+
+
+def slot_keys(slot):
+    return f"profiling_slot:{slot}:meta", f"profiling_slot:{slot}:data"
+
+
+def requested_format(request):
+    mode = request.META.get('HTTP_X_PROFILE')
+    if mode is None and 'profile=' in request.META.get('QUERY_STRING', ''):
+        mode = request.GET.get('profile')
+    if mode is None:
+        return None
+    return mode if mode in FORMATS else 'collapsed'
+
+
+def staff_user(request):
+    """
+    The staff user making the request, authenticated by the session or by
+    the API's authentication classes (JWT), else None.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        user = None
+        drf_request = Request(request)
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authentication().authenticate(drf_request)
+            except Exception:  # Invalid credentials: not profiled, the view answers them
+                return None
+            if result is not None:
+                user = result[0]
+                break
+    if user is not None and (user.is_staff or getattr(user, 'role', None) == 'admin'):
+        return user
+    return None
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler(threading.Thread):
+    """
+    Counts the stacks of another thread, sampled every `interval` seconds.
+    Sampling needs the GIL, so CPU-bound code is sampled about every
+    `sys.getswitchinterval()` at best.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+def store(meta, data):
+    """
+    Write a profile to the next ring buffer slot, returning its id.
+    """
+    if cache.add(SEQUENCE_KEY, 1, timeout=None):
+        profile_id = 1
+    else:
+        try:
+            profile_id = cache.incr(SEQUENCE_KEY)
+        except ValueError:  # Evicted between add and incr
+            cache.set(SEQUENCE_KEY, 1, timeout=None)
+            profile_id = 1
+    meta_key, data_key = slot_keys(profile_id % settings.PROFILE_BUFFER_SIZE)
+    cache.set_many({meta_key: dict(meta, id=profile_id), data_key: (profile_id, data)}, PROFILE_TTL)
+    return profile_id
+
+
+def stored_profiles():
+    """
+    Metadata of the profiles in the ring buffer, newest first.
+    """
+    keys = [slot_keys(slot)[0] for slot in range(settings.PROFILE_BUFFER_SIZE)]
+    return sorted(cache.get_many(keys).values(), key=lambda meta: -meta['id'])
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_format(request)
+        if mode is None:
+            return self.get_response(request)
+        user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        if mode == 'pstats':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            profiler.create_stats()
+            data, samples = marshal.dumps(profiler.stats), None
+        else:
+            sampler = Sampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            data, samples = sampler.collapsed(), sum(sampler.stacks.values())
+
+        profile_id = store({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'format': mode,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'samples': samples,
+            'user': user.get_username(),
+            'created_at': timezone.now().isoformat(),
+        }, data)
+        response['X-Profile-Id'] = str(profile_id)
+        return response
+
+
+STAFF_ONLY = [IsAuthenticated & (IsAdminUser | IsAdmin)]
+
+
+class ProfileListView(APIView):
+    permission_classes = STAFF_ONLY
+
+    def get(self, request):
+        """
+        Profiles in the ring buffer, newest first.
+        """
+        return Response({'results': stored_profiles()})
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = STAFF_ONLY
+
+    def get(self, request, profile_id):
+        """
+        The profile's collapsed stacks as text, or its pstats file.
+        """
+        meta_key, data_key = slot_keys(profile_id % settings.PROFILE_BUFFER_SIZE)
+        entries = cache.get_many([meta_key, data_key])
+        meta, stored = entries.get(meta_key), entries.get(data_key)
+        if meta is None or stored is None or meta['id'] != profile_id or stored[0] != profile_id:
+            raise Http404("Profile not found, or overwritten by a newer one.")
+        if meta['format'] == 'pstats':
+            response = HttpResponse(stored[1], content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.prof"'
+            return response
+        return HttpResponse(stored[1], content_type='text/plain; charset=utf-8')
@@ -0,0 +1,121 @@
+"""
+OpenAPI schema served from precomputed bytes.
+
+The schema only changes when code is deployed, so it is generated once,
+either by `manage.py generate_schema` at build time or on the first request,
+and served with an ETag afterwards instead of walking every view per hit.
+"""
+import hashlib
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from rest_framework import permissions
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Book Review Service API",
+        default_version='v1',
+        description="API documentation for the Book Review Service",
+        terms_of_service="https://www.example.com/terms/",
+        contact=openapi.Contact(email="contact@example.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_ui_schema_view():
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        api_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def _codec(fmt):
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    return {'.json': OpenAPICodecJson, '.yaml': OpenAPICodecYaml}[fmt](validators=[])
+
+
+SCHEMA_FORMATS = {
+    '.json': 'application/json',
+    '.yaml': 'application/yaml',
+}
+SCHEMA_CACHE_CONTROL = 'public, max-age=60'
+UI_CACHE_TIMEOUT = 60 * 60 * 24
+
+_schemas = {}  # format -> (content, etag), kept for the life of the process
+_lock = threading.Lock()
+
+
+def schema_path(fmt):
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f"openapi{fmt}"
+
+
+def render_schema(fmt):
+    """
+    Generate the public schema and encode it, without any request context.
+    """
+    from drf_yasg.app_settings import swagger_settings
+
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(api_info())
+    schema = generator.get_schema(request=None, public=True)
+    return _codec(fmt).encode(schema)
+
+
+def write_schemas():
+    """
+    Write every schema format to OPENAPI_SCHEMA_DIR, returning the paths.
+    """
+    paths = []
+    for fmt in SCHEMA_FORMATS:
+        path = schema_path(fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(render_schema(fmt))
+        paths.append(path)
+    return paths
+
+
+def get_schema(fmt):
+    """
+    Return `(content, etag)` from memory, from the build-time file, or by
+    generating it once.
+    """
+    if fmt not in _schemas:
+        with _lock:
+            if fmt not in _schemas:
+                path = schema_path(fmt)
+                if path.is_file():
+                    content = path.read_bytes()
+                else:
+                    content = render_schema(fmt)
+                etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+                _schemas[fmt] = (content, etag)
+    return _schemas[fmt]
+
+
+def reset_schemas():
+    _schemas.clear()
+
+
+def precomputed_schema(request, format):
+    if format not in SCHEMA_FORMATS:
+        raise Http404
+    content, etag = get_schema(format)
+
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=SCHEMA_FORMATS[format])
+        response.compression_cache_key = f"openapi_schema_{etag.strip(chr(34))}"
+    response['ETag'] = etag
+    response['Cache-Control'] = SCHEMA_CACHE_CONTROL
+    return response
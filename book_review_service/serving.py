@@ -0,0 +1,245 @@
+"""
+Static and media file serving for deployments without a separate web server.
+
+Static files are collected with hashed names and precompressed `.gz`/`.br`
+siblings, so serving them is a negotiation and a file open, never a
+compression on the request path. Media files go through `FileResponse`,
+which WSGI servers with `wsgi.file_wrapper` (gunicorn) send with
+`sendfile()`; byte ranges keep that zero-copy path as well.
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip variants are still produced
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.map', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.eot'}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_STATIC_CACHE_CONTROL = 'public, max-age=60'
+
+# Precompressed variants in order of preference: (encoding, file suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def compress_variants(data):
+    """
+    Return `{suffix: bytes}` for the encodings that actually shrink `data`.
+    """
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage (content-hashed names) that also writes `.gz` and `.br`
+    files next to every compressible collected file during collectstatic.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in list(self.hashed_files.values()) + list(paths):
+            if Path(name).suffix.lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            for suffix, body in compress_variants(data).items():
+                with open(self.path(name + suffix), 'wb') as compressed:
+                    compressed.write(body)
+
+
+class RangeFile:
+    """
+    File wrapper limited to one byte range. It keeps `fileno()` so gunicorn
+    can still `sendfile()` from the current offset for `Content-Length` bytes,
+    while servers that `read()` stop at the end of the range.
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.name = file.name
+        self.start = start
+        self.end = end  # Exclusive
+        self.file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            return self.file.seek(self.end + offset)
+        return self.file.seek(offset, whence)
+
+    def read(self, size=-1):
+        remaining = self.end - self.file.tell()
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=` range into `(start, end_exclusive)`. Returns None
+    for absent, multi-part or malformed ranges (served as a full response)
+    and raises ValueError for unsatisfiable ones.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size  # Suffix range: the last N bytes
+    else:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    if start >= size or start >= end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _validators(stat):
+    return quote_etag(f"{int(stat.st_mtime):x}-{stat.st_size:x}"), http_date(stat.st_mtime)
+
+
+def _not_modified(request, etag, stat):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    return not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+
+
+def file_response(request, full_path, cache_control, encoding=None, content_type=None):
+    stat = os.stat(full_path)
+    etag, last_modified = _validators(stat)
+    if encoding:
+        etag = quote_etag(f"{etag.strip(chr(34))}-{encoding}")
+
+    if _not_modified(request, etag, stat):
+        response = HttpResponseNotModified()
+    else:
+        file = open(full_path, 'rb')
+        status = 200
+        content_range = None
+        if encoding is None:
+            try:
+                byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+            except ValueError:
+                file.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{stat.st_size}"
+                return response
+            if byte_range is not None:
+                start, end = byte_range
+                file = RangeFile(file, start, end)
+                status = 206
+                content_range = f"bytes {start}-{end - 1}/{stat.st_size}"
+
+        response = FileResponse(file, status=status, content_type=content_type)
+        if content_range:
+            response['Content-Range'] = content_range
+        if encoding:
+            response['Content-Encoding'] = encoding
+        else:
+            response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _resolve(root, path):
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:  # Path traversal outside of root
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return full_path
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+_immutable_static_names = None
+
+
+def _is_hashed_static_name(path):
+    global _immutable_static_names
+    if _immutable_static_names is None:
+        _immutable_static_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    return path in _immutable_static_names
+
+
+def serve_static(request, path):
+    """
+    Serve a collected static file, preferring a precompressed variant the
+    client accepts. Hashed names are cached forever.
+    """
+    full_path = _resolve(settings.STATIC_ROOT, path)
+    cache_control = IMMUTABLE_CACHE_CONTROL if _is_hashed_static_name(path) else DEFAULT_STATIC_CACHE_CONTROL
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    accepted = accepted_encodings(request)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            response = file_response(request, full_path + suffix, cache_control, encoding, content_type)
+            break
+    else:
+        response = file_response(request, full_path, cache_control, content_type=content_type)
+
+    if Path(path).suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+        response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve an uploaded or generated media file with range support. Cache
+    lifetimes come from `MEDIA_CACHE_CONTROL`, a list of (path regex, value).
+    """
+    full_path = _resolve(settings.MEDIA_ROOT, path)
+    cache_control = DEFAULT_STATIC_CACHE_CONTROL
+    for pattern, value in getattr(settings, 'MEDIA_CACHE_CONTROL', []):
+        if re.match(pattern, path):
+            cache_control = value
+            break
+    return file_response(request, full_path, cache_control)
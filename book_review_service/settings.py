@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import config, Csv
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -22,6 +22,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cover renditions are generated by a process pool (books/images.py), 0 = inline
+COVER_WORKERS = config('COVER_WORKERS', default=os.cpu_count() or 1, cast=int)
+COVER_RENDITION_SIZES = [160, 480, 1024]
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -78,18 +82,36 @@ SWAGGER_SETTINGS = {
         },
     },
     'USE_SESSION_AUTH': False,  # Disable session authentication
+    'SPEC_URL': '/swagger.json',  # The UIs load the precomputed schema
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': '/swagger.json',
 }
 
+# Written by `manage.py generate_schema` at build time, see book_review_service/schema.py
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'schema'
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'book_review_service.compression.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'book_review_service.profiling.ProfilingMiddleware',
+    'book_review_service.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+API_COMPRESS_MIN_SIZE = config('API_COMPRESS_MIN_SIZE', default=1024, cast=int)  # Smaller bodies fit a packet anyway
+
+# Staff request profiling (X-Profile: collapsed|pstats), see book_review_service.profiling
+PROFILE_SAMPLE_INTERVAL = config('PROFILE_SAMPLE_INTERVAL', default=0.001, cast=float)  # Seconds between stack samples
+PROFILE_BUFFER_SIZE = config('PROFILE_BUFFER_SIZE', default=50, cast=int)  # Profiles kept, oldest overwritten first
+
 ROOT_URLCONF = 'book_review_service.urls'
 
 TEMPLATES = [
@@ -125,6 +147,26 @@ DATABASES = {
     }
 }
 
+# Read replicas, one entry per replica: HOST[:PORT] for Postgres, or a file
+# path for SQLite. Safe-method API reads are routed to them by
+# book_review_service.db_router; everything else stays on 'default'.
+DATABASE_REPLICA_TIMEOUT = config('DATABASE_REPLICA_TIMEOUT', default=2, cast=int)  # Seconds, connect and health check
+for index, replica in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    replica_settings = dict(DATABASES['default'])
+    if replica_settings['ENGINE'].endswith('sqlite3'):
+        replica_settings['NAME'] = replica
+    else:
+        replica_settings['HOST'], _, port = replica.partition(':')
+        replica_settings['PORT'] = port or replica_settings['PORT']
+        replica_settings['OPTIONS'] = {**replica_settings.get('OPTIONS', {}), 'connect_timeout': DATABASE_REPLICA_TIMEOUT}
+    DATABASES[f'replica_{index}'] = replica_settings
+
+DATABASE_ROUTERS = ['book_review_service.db_router.PrimaryReplicaRouter']
+DATABASE_PIN_SECONDS = config('DATABASE_PIN_SECONDS', default=5, cast=int)  # Read-your-writes window
+DATABASE_REPLICA_MAX_LAG = config('DATABASE_REPLICA_MAX_LAG', default=10, cast=float)  # Seconds
+# Rows above which paginated counts are Postgres planner estimates (0 counts exactly)
+PAGINATION_ESTIMATE_THRESHOLD = config('PAGINATION_ESTIMATE_THRESHOLD', default=100000, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -173,6 +215,23 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'static'
+
+# collectstatic writes content-hashed names plus .gz/.br variants, served by
+# book_review_service.serving when no separate web server is in front
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'book_review_service.serving.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
+# Cache-Control for media paths, first matching regex wins
+MEDIA_CACHE_CONTROL = [
+    (r'^book_covers/[0-9a-f]{2}/[0-9a-f]{64}/', 'public, max-age=31536000, immutable'),  # Content-addressed renditions
+]
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -209,4 +268,24 @@ CACHES = {
     }
 }
 
-CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
\ No newline at end of file
+CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+
+# Change-event outbox, streamed by `manage.py dispatch_outbox`
+OUTBOX_REDIS_URL = config('OUTBOX_REDIS_URL', default=f"redis://{REDIS_HOST}:{REDIS_PORT}/2")
+OUTBOX_STREAM = config('OUTBOX_STREAM', default='book_review_events')
+OUTBOX_STREAM_MAXLEN = config('OUTBOX_STREAM_MAXLEN', default=100000, cast=int)  # Approximate trim
+
+# Cache warming, run by `manage.py warm_cache`
+CACHE_WARMER_TOP_K = config('CACHE_WARMER_TOP_K', default=200, cast=int)  # Hot keys tracked per process and shared
+CACHE_WARMER_BASE_URL = config('CACHE_WARMER_BASE_URL', default='http://localhost:8000')  # Host used in pagination links
+CACHE_WARMER_CONCURRENCY = config('CACHE_WARMER_CONCURRENCY', default=2, cast=int)
+CACHE_WARMER_RATE = config('CACHE_WARMER_RATE', default=10.0, cast=float)  # Renders per second
+
+# Review leaderboards (sorted sets), rebuilt by `manage.py rebuild_leaderboards`
+LEADERBOARD_REDIS_URL = config('LEADERBOARD_REDIS_URL', default=f"redis://{REDIS_HOST}:{REDIS_PORT}/3")
+LEADERBOARD_REDIS_TIMEOUT = config('LEADERBOARD_REDIS_TIMEOUT', default=2.0, cast=float)  # Connect and read, seconds
+LEADERBOARD_PRIOR_WEIGHT = config('LEADERBOARD_PRIOR_WEIGHT', default=10, cast=int)  # Reviews' worth of the mean rating
+
+# In-process title/author autocomplete
+AUTOCOMPLETE_PRELOAD = config('AUTOCOMPLETE_PRELOAD', default=True, cast=bool)  # Load the index at worker start
+AUTOCOMPLETE_REFRESH_SECONDS = config('AUTOCOMPLETE_REFRESH_SECONDS', default=1.0, cast=float)  # Outbox polling interval
\ No newline at end of file
@@ -17,29 +17,25 @@ Including another URLconf
 
 from django.urls import path, include, re_path
 from django.contrib import admin
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Book Review Service API",
-        default_version='v1',
-        description="API documentation for the Book Review Service",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from .profiling import ProfileDownloadView, ProfileListView
+from .schema import precomputed_schema, get_ui_schema_view, UI_CACHE_TIMEOUT
+from .serving import serve_static, serve_media
 
 urlpatterns = [
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    re_path(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    re_path(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', precomputed_schema, name='schema-json'),
 
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')), 
     path('api/books/', include('books.urls')),    
-]
\ No newline at end of file
+    path('api/profiling/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiling/<int:profile_id>/', ProfileDownloadView.as_view(), name='profile-download'),
+    re_path(r'^static/(?P<path>.+)$', serve_static, name='static'),
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
+]
+
+# The UI pages only reference SPEC_URL, but drf_yasg still builds the schema to render them
+schema_view = get_ui_schema_view()
+urlpatterns += [
+    re_path(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=UI_CACHE_TIMEOUT), name='schema-swagger-ui'),
+    re_path(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=UI_CACHE_TIMEOUT), name='schema-redoc'),
+]
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_review_service.settings')
 
 application = get_wsgi_application()
+
+from books.autocomplete import preload  # noqa: E402  (needs the app registry loaded above)
+
+preload()
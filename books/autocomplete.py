@@ -0,0 +1,456 @@
+"""
+In-process autocomplete over book titles and authors.
+
+Each worker keeps an index of the words in every title and author: a
+sorted vocabulary (a prefix is a bisect into it) with the ids of the books
+using each word, plus the words' trigrams for queries with a typo. The
+index is loaded from the database on first use, or at worker start by
+`preload()`, and then patched from the book change events in the outbox
+table, read at most every AUTOCOMPLETE_REFRESH_SECONDS. A search never
+queries the database.
+"""
+import gc
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import Book, ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+MAX_LIMIT = 20
+MAX_CANDIDATES = 100  # Matches ranked per search; enough for the top MAX_LIMIT
+SCAN_LIMIT = 8192  # Books of the rarest word intersected per multi-word search
+WORD_COST = 32  # Ids a word is worth when picking the group to scan: each word is cut out per range
+WORDS_PER_SPLIT = 8  # Splitting a book's words costs about as much as cutting out this many words' ids
+BISECT_RATIO = 16  # Postings this many times longer than the candidates are bisected, not cut out
+FIRST_CHUNK = 256  # Books of the rarest word intersected first; doubles for each further range
+SHORT_PREFIX = 2  # Single-word searches up to this length are memoized, they match the most books
+MIN_TYPO_OVERLAP = 0.4  # Share of a misspelt word's trigrams a correction must contain
+SETTLE_DELAY = timedelta(seconds=10)  # Leaves time for slower transactions to commit their events
+REBUILD_AFTER = 24 * 3600  # Seconds without a refresh after which events may have been purged
+
+WORD_RE = re.compile(r'\w+')
+END = '\U0010ffff'
+
+
+def normalize(text):
+    text = text.casefold()
+    if text.isascii():
+        return text
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def initial_bit(word):
+    """
+    Bit of a word's first character in a book's initials mask: one per
+    ASCII letter and digit, the 26 others shared by all other characters.
+    """
+    first = word[0]
+    if 'a' <= first <= 'z':
+        return 1 << (ord(first) - 97)
+    if '0' <= first <= '9':
+        return 1 << (ord(first) - 22)
+    return 1 << (36 + ord(first) % 26)
+
+
+def trigrams(word, complete=True):
+    padded = f"${word}$" if complete else f"${word}"
+    return {padded[i:i + 3] for i in range(max(len(padded) - 2, 1))}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.docs = {}  # Book id -> (title, author, initials mask of its words)
+        self.vocab = []  # Sorted distinct words
+        self.lead = {}  # First title word -> book ids
+        self.title = {}  # Title word -> book ids
+        self.author = {}  # Author word -> book ids
+        self.grams = {}  # Trigram -> words
+        self.short = {}  # Short prefix -> its ranked matches
+        self.watermark = 0  # Events up to this id are applied
+        self.refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, chunk_size=10000):
+        index = cls()
+        index.watermark = _settled_event_id()
+        rows = Book.objects.order_by('pk').values_list('id', 'title', 'author__name').iterator(chunk_size=chunk_size)
+        index.build(rows)
+        # Keep the collector from walking millions of long-lived index objects during requests
+        gc.collect()
+        gc.freeze()
+        return index
+
+    def build(self, rows):
+        """
+        Add `(id, title, author)` rows in bulk, in id order so the book ids
+        of each word stay sorted; the vocabulary is sorted once at the end.
+        """
+        for book_id, title, author in rows:
+            self._add(book_id, title, author, bulk=True)
+        self.vocab = sorted(set(self.title) | set(self.author))
+        self.grams, self.short = {}, {}
+        for word in self.vocab:
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, []).append(word)
+
+    def upsert(self, book_id, title, author):
+        with self._lock:
+            if self.docs.get(book_id, ())[:2] == (title, author):
+                return
+            self._remove(book_id)
+            self._add(book_id, title, author)
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def _add(self, book_id, title, author, bulk=False):
+        title_words, author_words = words(title), words(author)
+        initials = 0
+        for word in title_words + author_words:
+            initials |= initial_bit(word)
+        self.docs[book_id] = (title, sys.intern(author), initials)
+        if not bulk:
+            self._forget(title_words + author_words)
+        for word in set(title_words):
+            self._post(self.title, word, book_id, bulk)
+        for word in set(author_words):
+            self._post(self.author, word, book_id, bulk)
+        if title_words:
+            self._post(self.lead, title_words[0], book_id, bulk)  # Already in the vocabulary as a title word
+
+    def _post(self, postings, word, book_id, bulk):
+        if not bulk and word not in self.title and word not in self.author:
+            insort(self.vocab, word)
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, []).append(word)
+        ids = postings.setdefault(word, array('q'))
+        if bulk:
+            ids.append(book_id)
+        else:
+            insort(ids, book_id)
+
+    def _remove(self, book_id):
+        if book_id not in self.docs:
+            return
+        title, author, _ = self.docs.pop(book_id)
+        title_words, author_words = words(title), words(author)
+        self._forget(title_words + author_words)
+        if title_words:
+            self._unpost(self.lead, title_words[0], book_id)
+        for word in set(title_words):
+            self._unpost(self.title, word, book_id)
+        for word in set(author_words):
+            self._unpost(self.author, word, book_id)
+        for word in set(title_words) | set(author_words):
+            if word not in self.title and word not in self.author:
+                del self.vocab[bisect_left(self.vocab, word)]
+                for gram in trigrams(word):
+                    self.grams[gram].remove(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def _unpost(self, postings, word, book_id):
+        ids = postings[word]
+        del ids[bisect_left(ids, book_id)]
+        if not ids:
+            del postings[word]
+
+    def _forget(self, changed):
+        for word in changed:
+            for length in range(1, SHORT_PREFIX + 1):
+                self.short.pop(word[:length], None)
+
+    def search(self, query, limit=10):
+        """
+        `(results, correction)`: books whose title or author has words
+        starting with the query's words (the last one may be unfinished),
+        best first. When nothing matches, the query is retried with
+        misspelt words replaced by their closest indexed word, returned as
+        `correction`.
+        """
+        terms = words(query)
+        if not terms:
+            return [], None
+        with self._lock:
+            results = self._search(terms, limit)
+            if results:
+                return results, None
+            corrected = self._correct(terms)
+            if corrected is None or corrected == terms:
+                return [], None
+            return self._search(corrected, limit), ' '.join(corrected)
+
+    def _search(self, terms, limit):
+        *complete, prefix = terms
+        if not complete and len(prefix) <= SHORT_PREFIX and prefix in self.short:
+            ranked = self.short[prefix]
+        else:
+            lo, hi = bisect_left(self.vocab, prefix), bisect_left(self.vocab, prefix + END)
+            if complete:
+                matches = self._search_phrase(complete, prefix, lo, hi)
+            else:
+                matches = self._search_prefix(lo, hi)
+            docs = self.docs
+            ranked = heapq.nsmallest(
+                MAX_LIMIT,
+                ((tier, len(docs[book_id][0]), docs[book_id][0], book_id) for book_id, tier in matches.items()),
+            )
+            if not complete and len(prefix) <= SHORT_PREFIX:
+                self.short[prefix] = ranked
+
+        return [
+            {'id': book_id, 'title': title, 'author': self.docs[book_id][1]}
+            for _, _, title, book_id in ranked[:limit]
+        ]
+
+    def _search_prefix(self, lo, hi):
+        """
+        Book id -> tier (0 title starts with the prefix, 1 a title word
+        does, 2 an author word does), for up to MAX_CANDIDATES books.
+        """
+        matches = {}
+        for tier, postings in enumerate((self.lead, self.title, self.author)):
+            for position in range(lo, hi):
+                for book_id in postings.get(self.vocab[position], ()):
+                    matches.setdefault(book_id, tier)
+                    if len(matches) >= MAX_CANDIDATES:
+                        return matches
+        return matches
+
+    def _search_phrase(self, complete, prefix, lo, hi):
+        """
+        Books having every complete word and a word starting with the
+        prefix. The book ids of each word group are sorted, so they are
+        intersected a range of ids at a time: the rarest group's next ids
+        (FIRST_CHUNK, doubling each time) give the range, each group's ids
+        in that range are cut out by bisection and intersected as sets.
+        Stops at MAX_CANDIDATES matches or after SCAN_LIMIT ids of the
+        rarest group. Tiers are as for single words, 0 meaning the title
+        starts with the first word and has the others.
+        """
+        groups = [[word] for word in set(complete)]
+        sizes = [self._group_size(group) for group in groups]
+        prefix_words = self.vocab[lo:hi]
+        groups.append(prefix_words)
+        sizes.append(self._group_size(prefix_words, cap=max(sizes)) + WORD_COST * len(prefix_words))
+        exact = len(prefix) == 1 and ('a' <= prefix <= 'z' or '0' <= prefix <= '9')  # See initial_bit
+        order = sorted(range(len(groups)), key=sizes.__getitem__)
+        rarest, others = groups[order[0]], [groups[position] for position in order[1:]]
+
+        pacing = max((postings.get(word, ()) for word in rarest for postings in (self.title, self.author)), key=len)
+        matches, start, scanned, chunk = {}, 0, 0, FIRST_CHUNK
+        while len(matches) < MAX_CANDIDATES and scanned < SCAN_LIMIT:
+            position = bisect_left(pacing, start)
+            end = pacing[position + chunk - 1] + 1 if position + chunk <= len(pacing) else None
+            chunk *= 2
+            candidates = self._ids_between(rarest, start, end)
+            scanned += len(candidates)
+            for group in others:
+                if not candidates:
+                    break
+                if group is prefix_words and (exact or len(group) > len(candidates) * WORDS_PER_SPLIT):
+                    # Cheaper than cutting out the ids of every word starting with a short prefix
+                    candidates = self._with_prefix(candidates, prefix, exact)
+                else:
+                    candidates = self._intersect(candidates, group, start, end)
+            if candidates:
+                in_title = set(candidates)
+                for word in set(complete):
+                    in_title = self._intersect(in_title, [word], start, end, (self.title,))
+                leading = self._intersect(in_title, complete[:1], start, end, (self.lead,))
+                for book_id in heapq.nsmallest(MAX_CANDIDATES - len(matches), candidates):
+                    matches[book_id] = 0 if book_id in leading else 1 if book_id in in_title else 2
+            if end is None:
+                break
+            start = end
+        return matches
+
+    def _with_prefix(self, candidates, prefix, exact):
+        """
+        The candidates having a word starting with the prefix, found from
+        their initials mask, then checked on their words unless `exact`.
+        """
+        bit = initial_bit(prefix)
+        candidates = {book_id for book_id in candidates if self.docs[book_id][2] & bit}
+        if exact:
+            return candidates
+        return {
+            book_id for book_id in candidates
+            if any(word.startswith(prefix) for word in words(' '.join(self.docs[book_id][:2])))
+        }
+
+    def _group_size(self, group, cap=None):
+        """
+        Books using the group's words (counted twice if in title and
+        author), or a value above `cap` once it is exceeded.
+        """
+        size = 0
+        for word in group:
+            size += len(self.title.get(word, ())) + len(self.author.get(word, ()))
+            if cap is not None and size > cap:
+                break
+        return size
+
+    def _ids_between(self, group, start, end, postings_lists=None):
+        """
+        Ids from `start` up to `end` (or the last one) of the books using a
+        word of the group, in their title or author unless `postings_lists`
+        says otherwise.
+        """
+        ids = set()
+        for word in group:
+            for postings in postings_lists or (self.title, self.author):
+                found = postings.get(word)
+                if found:
+                    ids.update(found[bisect_left(found, start):bisect_left(found, end) if end else len(found)])
+        return ids
+
+    def _intersect(self, candidates, group, start, end, postings_lists=None):
+        """
+        The candidates using a word of the group, as `_ids_between` would
+        find them. Postings much longer in the range than the candidates
+        are searched by bisection instead of being cut out.
+        """
+        found_ids = set()
+        for word in group:
+            for postings in postings_lists or (self.title, self.author):
+                found = postings.get(word)
+                if not found:
+                    continue
+                first = bisect_left(found, start)
+                last = bisect_left(found, end) if end else len(found)
+                if last - first > len(candidates) * BISECT_RATIO:
+                    for book_id in candidates:
+                        position = bisect_left(found, book_id, first, last)
+                        if position < last and found[position] == book_id:
+                            found_ids.add(book_id)
+                else:
+                    found_ids.update(found[first:last])
+        return candidates & found_ids
+
+    def _correct(self, terms):
+        corrected = []
+        for position, term in enumerate(terms):
+            complete = position < len(terms) - 1
+            if complete and (term in self.title or term in self.author):
+                corrected.append(term)
+            elif not complete and bisect_left(self.vocab, term + END) > bisect_left(self.vocab, term):
+                corrected.append(term)
+            else:
+                closest = self._closest(term, complete)
+                if closest is None:
+                    return None
+                corrected.append(closest)
+        return corrected
+
+    def _closest(self, term, complete):
+        """
+        The indexed word sharing most of the term's trigrams, then the one
+        closest in length, then the most used.
+        """
+        grams = trigrams(term, complete)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        if not shared:
+            return None
+
+        def score(word):
+            return (shared[word], -abs(len(word) - len(term)), len(self.title.get(word, ())))
+
+        best = max(shared, key=score)
+        if shared[best] / len(grams) < MIN_TYPO_OVERLAP:
+            return None
+        return best
+
+    def refresh(self):
+        """
+        Apply book change events written since the last refresh. Events
+        newer than SETTLE_DELAY are applied again next time, in case an
+        older transaction commits an event with a lower id meanwhile.
+        """
+        settled = _settled_event_id()
+        events = ChangeEvent.objects.filter(topic='book', id__gt=self.watermark).order_by('id')
+        for book_id, action, payload in events.values_list('object_id', 'action', 'payload'):
+            if action == ChangeEvent.DELETED:
+                self.remove(book_id)
+            else:
+                self.upsert(book_id, payload['title'], payload['author'])
+        self.watermark = max(self.watermark, settled)
+        self.refreshed_at = time.monotonic()
+
+
+def _settled_event_id():
+    return ChangeEvent.objects.filter(
+        created_at__lte=timezone.now() - SETTLE_DELAY
+    ).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+_index = None
+_index_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def get_index():
+    """
+    This worker's index, loaded on first use and refreshed from the outbox
+    at most every AUTOCOMPLETE_REFRESH_SECONDS.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                started = time.perf_counter()
+                _index = AutocompleteIndex.from_database()
+                logger.info(f"Autocomplete index of {len(_index.docs)} books loaded in "
+                            f"{time.perf_counter() - started:.2f}s")
+        return _index
+
+    idle = time.monotonic() - _index.refreshed_at
+    if idle >= settings.AUTOCOMPLETE_REFRESH_SECONDS and _refresh_lock.acquire(blocking=False):
+        try:
+            if idle >= REBUILD_AFTER:
+                _index = AutocompleteIndex.from_database()  # The outbox may have purged missed events
+            else:
+                _index.refresh()
+        except DatabaseError:
+            logger.exception("Autocomplete refresh failed, serving the last index")
+        finally:
+            _refresh_lock.release()
+    return _index
+
+
+def preload():
+    """
+    Load the index in the background at worker start, so the first
+    autocomplete request does not wait for it.
+    """
+    def load():
+        try:
+            get_index()
+        finally:
+            connection.close()
+
+    if settings.AUTOCOMPLETE_PRELOAD:
+        threading.Thread(target=load, name='autocomplete-preload', daemon=True).start()
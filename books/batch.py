@@ -0,0 +1,82 @@
+"""
+Book documents (what `book-detail` returns) for many ids at once. One
+`get_many` reads the cached documents. For the misses, one `id__in` query
+loads the books with their authors, and one `get_many` reads their Google
+Books metadata, fetching what is missing concurrently for at most
+METADATA_WAIT seconds in all. One `set_many` caches the new documents. Keys carry the cache generation, so book writes orphan them.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.cache import cache
+
+from book_review_service.db_router import fresh_reads
+
+from .cache_keys import current_generation, generation_modified, METADATA_CACHE_TIMEOUT
+from .metadata import fetch_google_books_metadata, metadata_cache_key, metadata_failed
+from .models import Book
+from .serializers import BookSerializer
+
+
+MAX_BOOK_BATCH_SIZE = 100
+METADATA_WORKERS = 8  # Concurrent Google Books requests for metadata cache misses
+METADATA_WAIT = 5  # Seconds a batch waits for all its metadata lookups together
+METADATA_TIMED_OUT = {'error': "Timed out waiting for Google Books metadata"}
+
+# Shared by all batches, so a request never waits for its executor to shut down
+_metadata_pool = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix='batch-metadata')
+
+
+def book_document_key(book_id, generation):
+    return f"book_document_g{generation}_{book_id}"
+
+
+def book_documents(ids):
+    """
+    `(documents, missing)`: the documents of the books in `ids` order, and
+    the ids no book has. `ids` must not repeat.
+    """
+    generation = current_generation()
+    keys = {book_id: book_document_key(book_id, generation) for book_id in ids}
+    cached = cache.get_many(list(keys.values()))
+    documents = {book_id: cached[key] for book_id, key in keys.items() if key in cached}
+    misses = [book_id for book_id in ids if book_id not in documents]
+    if misses:
+        with fresh_reads(generation_modified()):  # Cached for everyone under the new generation
+            documents.update(_load_documents(misses, generation))
+    return [documents[book_id] for book_id in ids if documents[book_id] is not None], [
+        book_id for book_id in ids if documents[book_id] is None
+    ]
+
+
+def _load_documents(ids, generation):
+    books = list(Book.objects.select_related('author').filter(id__in=ids))
+    metadata_keys = {book.pk: metadata_cache_key(book.title, book.author.name) for book in books}
+    metadata = cache.get_many(list(set(metadata_keys.values())))
+    unfetched = [book for book in books if metadata_keys[book.pk] not in metadata]
+    if unfetched:
+        lookups = {
+            book.pk: _metadata_pool.submit(fetch_google_books_metadata, book.title, book.author.name)
+            for book in unfetched
+        }
+        wait(lookups.values(), timeout=METADATA_WAIT)
+        for book in unfetched:
+            lookup = lookups[book.pk]
+            if lookup.done():
+                metadata[metadata_keys[book.pk]] = lookup.result()
+            else:
+                lookup.cancel()  # Still queued: leave the workers to other requests
+                metadata[metadata_keys[book.pk]] = dict(METADATA_TIMED_OUT)
+
+    # Unknown ids are cached as None, until a book write moves the generation on
+    documents = dict.fromkeys(ids)
+    cacheable = {book_document_key(book_id, generation): None for book_id in ids}
+    for book in books:
+        document = dict(BookSerializer(book).data, google_books_metadata=metadata[metadata_keys[book.pk]])
+        documents[book.pk] = document
+        if metadata_failed(document['google_books_metadata']):  # Retried once the failure expires
+            del cacheable[book_document_key(book.pk, generation)]
+        else:
+            cacheable[book_document_key(book.pk, generation)] = document
+    if cacheable:
+        cache.set_many(cacheable, METADATA_CACHE_TIMEOUT)
+    return documents
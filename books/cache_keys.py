@@ -0,0 +1,128 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+from .fieldsets import normalize_fieldset
+
+
+MAX_CACHE_KEY_LENGTH = 200
+LIST_CACHE_TIMEOUT = 300  # Book list and filter pages
+METADATA_CACHE_TIMEOUT = 60 * 60 * 24  # Google Books metadata
+KEY_CARDINALITY_WINDOW = LIST_CACHE_TIMEOUT
+GENERATION_CACHE_KEY = 'book_cache_generation'
+GENERATION_MODIFIED_CACHE_KEY = 'book_cache_generation_modified'
+
+
+def normalize_search(value):
+    # SearchFilter matches case-insensitively and splits terms on whitespace
+    return ' '.join(value.split()).lower()
+
+
+def normalize_exact(value):
+    # django-filter strips form input but keeps exact-match case
+    return value.strip()
+
+
+def normalize_page(value):
+    value = value.strip() or '1'
+    try:
+        return str(int(value))
+    except ValueError:
+        return value  # e.g. 'last', left for the paginator to handle
+
+
+LIST_PARAMS = {
+    'page': normalize_page,
+    'fields': normalize_fieldset,
+    'exclude': normalize_fieldset,
+}
+
+FILTER_PARAMS = {
+    'search': normalize_search,
+    'genre': normalize_exact,
+    'page': normalize_page,
+    'fields': normalize_fieldset,
+    'exclude': normalize_fieldset,
+}
+
+
+def canonical_params(query_params, allowed):
+    """
+    Reduce query params to the ones the view reads, in canonical form.
+    Parameters the view ignores (such as `limit`) and empty values are dropped.
+    """
+    params = {}
+    for name, normalize in allowed.items():
+        value = normalize(query_params.get(name, ''))
+        if value:
+            params[name] = value
+    return params
+
+
+def current_generation():
+    """
+    Generation of the cached book payloads. Book writes bump it, which orphans
+    every list/filter key at once without scanning the keyspace.
+    """
+    # Seeded from the clock: after a flush or eviction the count starts over
+    # from a new value, not from one old keys and ETags were built with
+    return cache.get_or_set(GENERATION_CACHE_KEY, time.time_ns, timeout=None)
+
+
+def generation_modified():
+    """
+    Unix time of the last generation bump, the `Last-Modified` of book lists.
+    """
+    return cache.get_or_set(GENERATION_MODIFIED_CACHE_KEY, time.time, timeout=None)
+
+
+def bump_generation():
+    cache.set(GENERATION_MODIFIED_CACHE_KEY, time.time(), timeout=None)
+    try:
+        return cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:  # Never set, or evicted
+        return current_generation()
+
+
+def build_cache_key(family, query_params, allowed, generation=None):
+    """
+    Build a bounded cache key such as `book_list_g3_<digest>` for a request.
+    Equivalent queries share a key and user text never reaches the key name.
+    """
+    payload = json.dumps(canonical_params(query_params, allowed), sort_keys=True)
+    digest = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    if generation is not None:
+        digest = f"g{generation}_{digest}"
+    prefix = family[:MAX_CACHE_KEY_LENGTH - len(digest) - 1]
+    return f"{prefix}_{digest}"
+
+
+def _cardinality_key(family):
+    window = int(time.time() // KEY_CARDINALITY_WINDOW)
+    return f"cache_key_cardinality:{family}:{window}"
+
+
+def set_tracked(family, cache_key, value, timeout):
+    """
+    Cache a value and count it towards the family's key cardinality
+    when the key is new for the current window.
+    """
+    if not cache.add(cache_key, value, timeout):
+        cache.set(cache_key, value, timeout)
+        return
+
+    counter = _cardinality_key(family)
+    if not cache.add(counter, 1, KEY_CARDINALITY_WINDOW * 2):
+        try:
+            cache.incr(counter)
+        except ValueError:  # Counter expired between add and incr
+            cache.set(counter, 1, KEY_CARDINALITY_WINDOW * 2)
+
+
+def key_cardinality(family):
+    """
+    Number of distinct keys written for a family in the current window.
+    """
+    return cache.get(_cardinality_key(family), 0)
@@ -0,0 +1,47 @@
+"""
+Validators for conditional GET on book payloads.
+
+They come from data the views already have, so a matching `If-None-Match`
+is answered with a 304 before any payload is read or serialized: lists are
+identified by their cache key, which includes the cache generation, and a
+book by its `updated_at`, its cover and a digest of the Google Books
+metadata it is served with. That metadata can change (or stop being an
+error) while the book does not, so book details have no Last-Modified.
+"""
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache_keys import generation_modified
+
+
+def list_validators(request, cache_key):
+    # The renderer is part of the tag: the JSON and browsable API bodies differ
+    etag = quote_etag(f"{cache_key}-{request.accepted_renderer.format}")
+    return etag, generation_modified()
+
+
+def book_validators(request, book, metadata):
+    metadata_digest = hashlib.blake2b(json.dumps(metadata, sort_keys=True, default=str).encode(),
+                                      digest_size=8).hexdigest()
+    etag = quote_etag(f"book-{book.pk}-{book.updated_at.timestamp():.6f}-{book.cover_hash[:16]}-"
+                      f"{metadata_digest}-{request.accepted_renderer.format}")
+    return etag, None
+
+
+def not_modified(request, etag, last_modified):
+    """
+    A 304 response when the client's copy is current, else None.
+    """
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified) if last_modified is not None else None
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,188 @@
+"""
+Compound book documents: a book with, on request, its first page of
+reviews (with usernames), its Google Books metadata and its rating stats,
+in one response.
+
+The parts are assembled in at most four queries whatever the number of
+reviews: the book with its author, one aggregate for the stats (whose
+count also pages the reviews), the page of reviews, and one batched
+lookup of their reviewers through a `BatchLoader`. The metadata, which
+needs only the book's title and author, is fetched in a worker thread
+while the other queries run.
+
+Each document is cached whole, per book and set of parts, under a key
+holding the book's document versions: one moved on by book writes, and
+one by review writes that only documents with reviews or stats include.
+Writes set new versions when they commit, so a document that a
+concurrent read computes from older rows lands under a key no one reads
+again. Its links are relative; the view makes them absolute per request.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+
+from book_review_service.db_router import fresh_reads
+
+from .metadata import fetch_google_books_metadata, metadata_failed
+from .models import Book, Review
+from .pagination import BookReviewsPagination
+from .serializers import BookSerializer, ReviewSerializer
+
+INCLUDES = ('metadata', 'reviews', 'stats')
+REVIEW_PARTS = {'reviews', 'stats'}  # The parts a review write changes
+VERSION_SCOPES = ('book', 'reviews')
+COMPOUND_DOCUMENT_TIMEOUT = 60 * 60  # Expires documents orphaned by a version change
+REVIEWS_PER_DOCUMENT = BookReviewsPagination.page_size
+METADATA_WORKERS = 4
+METADATA_WAIT = 5  # Seconds a document waits for its metadata, queued behind other lookups or not
+
+# Long-lived threads keep their cache connections from one request to the next
+_metadata_pool = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix='compound-metadata')
+
+
+def document_version_key(book_id, scope):
+    return f"book_compound_version_{scope}_{book_id}"
+
+
+def document_versions(book_id):
+    """
+    `{scope: version}` of the book's documents. Missing versions are seeded
+    from the clock, so they never repeat one that cached documents used.
+    """
+    keys = {scope: document_version_key(book_id, scope) for scope in VERSION_SCOPES}
+    stored = cache.get_many(list(keys.values()))
+    return {
+        scope: stored[key] if key in stored else cache.get_or_set(key, time.time_ns, timeout=None)
+        for scope, key in keys.items()
+    }
+
+
+def compound_document_key(book_id, parts, versions):
+    version = versions['book']
+    if parts & REVIEW_PARTS:
+        version = f"{version}.{versions['reviews']}"
+    return f"book_compound_{book_id}_v{version}_{'+'.join(sorted(parts)) or 'book'}"
+
+
+def bump_document_versions(book_ids, scope='book'):
+    """
+    Give `book_ids` new `scope` versions, orphaning their cached documents:
+    all of them for 'book', those with reviews or stats for 'reviews'.
+    """
+    versions = {document_version_key(book_id, scope): time.time_ns() for book_id in book_ids}
+    if versions:
+        cache.set_many(versions, timeout=None)
+
+
+def invalidate_compound_documents(book_ids, scope='book'):
+    """
+    `bump_document_versions` once the current transaction commits.
+    """
+    book_ids = list(book_ids)
+    if book_ids:
+        transaction.on_commit(lambda: bump_document_versions(book_ids, scope))
+
+
+class BatchLoader:
+    """
+    Dataloader-style batching: keys asked for with `want` are loaded
+    together, with one call of `load_batch(keys)` returning `{key: value}`,
+    the first time any of them is read with `get`. Loaded keys are kept.
+    """
+
+    def __init__(self, load_batch):
+        self.load_batch = load_batch
+        self.pending = set()
+        self.loaded = {}
+
+    def want(self, keys):
+        self.pending.update(key for key in keys if key not in self.loaded)
+
+    def get(self, key):
+        if key not in self.loaded:
+            self.pending.add(key)
+            self.loaded.update(dict.fromkeys(self.pending))  # Keys not found load as None
+            self.loaded.update(self.load_batch(sorted(self.pending)))
+            self.pending.clear()
+        return self.loaded[key]
+
+
+def load_users(ids):
+    return get_user_model().objects.only('id', 'username').in_bulk(ids)
+
+
+def compound_document(book_id, parts, reviews_path=None):
+    """
+    The book's document with `parts` (a set of INCLUDES), or None if no book
+    has that id. `reviews_path` is the book-reviews-list path, for `next`.
+    """
+    versions = document_versions(book_id)
+    key = compound_document_key(book_id, parts, versions)
+    document = cache.get(key)
+    if document is not None:
+        return document
+
+    # Versions are clock readings: a new one means a write a replica may not have yet
+    with fresh_reads(max(versions.values()) / 1e9):
+        document = _build_document(book_id, parts, reviews_path)
+    if document is not None and not metadata_failed(document.get('google_books_metadata', {})):
+        cache.set(key, document, COMPOUND_DOCUMENT_TIMEOUT)  # Failed lookups are retried once they expire
+    return document
+
+
+def _build_document(book_id, parts, reviews_path):
+    book = Book.objects.select_related('author').filter(pk=book_id).first()
+    if book is None:
+        return None
+    metadata = None
+    if 'metadata' in parts:
+        metadata = _metadata_pool.submit(fetch_google_books_metadata, book.title, book.author.name)
+    document = dict(BookSerializer(book).data)
+    if parts & REVIEW_PARTS:
+        stats = review_stats(book_id)
+        if 'stats' in parts:
+            document['stats'] = stats
+        if 'reviews' in parts:
+            document['reviews'] = review_page(book_id, stats['review_count'], reviews_path)
+    if metadata is not None:
+        try:
+            document['google_books_metadata'] = metadata.result(timeout=METADATA_WAIT)
+        except TimeoutError:
+            metadata.cancel()  # Still queued: leave the workers to other documents
+            document['google_books_metadata'] = {'error': "Timed out waiting for Google Books metadata"}
+    return document
+
+
+def review_stats(book_id):
+    stats = Review.objects.filter(book_id=book_id).aggregate(
+        review_count=Count('id'),
+        average_rating=Avg('rating'),
+        **{str(rating): Count('id', filter=Q(rating=rating)) for rating in range(1, 6)},
+    )
+    average = stats.pop('average_rating')
+    return {
+        'review_count': stats.pop('review_count'),
+        'average_rating': round(average, 2) if average is not None else None,
+        'ratings': stats,
+    }
+
+
+def review_page(book_id, count, reviews_path=None):
+    reviews = []
+    if count:
+        reviews = list(Review.objects.filter(book_id=book_id).order_by('-created_at', '-id')[:REVIEWS_PER_DOCUMENT])
+    users = BatchLoader(load_users)
+    users.want(review.user_id for review in reviews)
+    # A reviewer deleted meanwhile takes their review with them: skip it
+    reviews = [review for review in reviews if users.get(review.user_id) is not None]
+    for review in reviews:
+        review.user = users.get(review.user_id)
+    return {
+        'count': count,
+        'next': f"{reviews_path}?page=2" if count > REVIEWS_PER_DOCUMENT and reviews_path else None,
+        'results': ReviewSerializer(reviews, many=True, context={'include_username': True}).data,
+    }
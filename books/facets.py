@@ -0,0 +1,116 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import ALLOWED_GENRES, Book, ChangeEvent, GenreFacet, RatingFacet, Review
+
+
+GENRE_FACETS_CACHE_KEY = 'book_facets_genres'
+RATING_FACETS_CACHE_KEY = 'book_facets_ratings'
+RATING_BUCKETS = [1, 2, 3, 4, 5]
+
+
+def adjust_genre_count(genre, delta):
+    """
+    Move a genre's materialized count by `delta` and drop the cached facets
+    once the surrounding transaction commits.
+    """
+    if not genre or not delta:
+        return
+    # Clamped at zero: a count that drifted (writes that skipped signals) must not fail the write
+    count = Greatest(F('book_count') + delta, 0)
+    updated = GenreFacet.objects.filter(genre=genre).update(book_count=count)
+    if not updated and delta > 0:
+        GenreFacet.objects.get_or_create(genre=genre, defaults={'book_count': 0})
+        GenreFacet.objects.filter(genre=genre).update(book_count=count)
+    transaction.on_commit(lambda: cache.delete(GENRE_FACETS_CACHE_KEY))
+
+
+def adjust_rating_counts(events):
+    """
+    Move the materialized review count per rating by review change events
+    (dicts as built by `outbox.event_data`), in the current transaction,
+    and drop the cached rating facets once it commits.
+    """
+    deltas = Counter()
+    for event in events:
+        if event['topic'] != 'review':
+            continue
+        payload = event['payload']
+        if event['action'] == ChangeEvent.CREATED:
+            deltas[payload['rating']] += 1
+        elif event['action'] == ChangeEvent.DELETED:
+            deltas[payload['rating']] -= 1
+        elif payload.get('previous_rating') not in (None, payload['rating']):
+            deltas[payload['previous_rating']] -= 1
+            deltas[payload['rating']] += 1
+    deltas = {rating: delta for rating, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # One statement for any number of reviews; the migration creates a row per rating
+    change = Case(*(When(rating=rating, then=Value(delta)) for rating, delta in deltas.items()), default=Value(0))
+    count = Greatest(F('review_count') + change, 0)
+    if RatingFacet.objects.filter(rating__in=deltas).update(review_count=count) < len(deltas):
+        missing = set(deltas) - set(RatingFacet.objects.filter(rating__in=deltas).values_list('rating', flat=True))
+        RatingFacet.objects.bulk_create(
+            [RatingFacet(rating=rating, review_count=0) for rating in missing], ignore_conflicts=True
+        )
+        RatingFacet.objects.filter(rating__in=missing).update(review_count=count)
+    transaction.on_commit(lambda: cache.delete(RATING_FACETS_CACHE_KEY))
+
+
+def rebuild_genre_facets():
+    """
+    Recompute the genre table from Book, e.g. after bulk imports that bypass signals.
+    """
+    counts = Book.objects.exclude(genre='').values('genre').annotate(count=Count('id'))
+    with transaction.atomic():
+        GenreFacet.objects.all().delete()
+        GenreFacet.objects.bulk_create(
+            GenreFacet(genre=row['genre'], book_count=row['count']) for row in counts
+        )
+    cache.delete(GENRE_FACETS_CACHE_KEY)
+
+
+def rebuild_rating_facets():
+    """
+    Recompute the rating table from Review.
+    """
+    counts = dict(Review.objects.values_list('rating').annotate(count=Count('id')).order_by())
+    with transaction.atomic():
+        RatingFacet.objects.all().delete()
+        RatingFacet.objects.bulk_create(
+            RatingFacet(rating=rating, review_count=counts.get(rating, 0)) for rating in RATING_BUCKETS
+        )
+    cache.delete(RATING_FACETS_CACHE_KEY)
+
+
+def genre_counts():
+    """
+    Per-genre book counts, every allowed genre included. Costs one cache read,
+    or one read of the small facet table on a miss.
+    """
+    counts = cache.get(GENRE_FACETS_CACHE_KEY)
+    if counts is None:
+        counts = dict.fromkeys(ALLOWED_GENRES, 0)
+        for facet in GenreFacet.objects.filter(book_count__gt=0):
+            counts[facet.genre] = facet.book_count
+        cache.set(GENRE_FACETS_CACHE_KEY, counts, timeout=None)
+    return counts
+
+
+def rating_counts():
+    """
+    Number of reviews per star rating, from the materialized rating table
+    (cached) like `genre_counts`.
+    """
+    counts = cache.get(RATING_FACETS_CACHE_KEY)
+    if counts is None:
+        counts = {str(rating): 0 for rating in RATING_BUCKETS}
+        for facet in RatingFacet.objects.filter(review_count__gt=0):
+            counts[str(facet.rating)] = facet.review_count
+        cache.set(RATING_FACETS_CACHE_KEY, counts, timeout=None)
+    return counts
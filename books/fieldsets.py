@@ -0,0 +1,59 @@
+"""
+Sparse fieldsets for list endpoints: `?fields=id,title` keeps only the
+named fields, `?exclude=comment` drops them. Both narrow the serializer
+output and the columns selected.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+def split_names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+def normalize_fieldset(value):
+    # Order and repetition don't change the response, so they don't change the cache key
+    return ','.join(sorted(set(split_names(value))))
+
+
+def requested_fields(query_params, available):
+    """
+    The fields to serialize in `available`'s order, or None for all of
+    them. Unknown names are a 400 rather than silently ignored.
+    """
+    fields, exclude = split_names(query_params.get('fields', '')), split_names(query_params.get('exclude', ''))
+    if not fields and not exclude:
+        return None
+    for param, names in (('fields', fields), ('exclude', exclude)):
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({param: f"Unknown field(s): {', '.join(unknown)}. "
+                                          f"Choose from: {', '.join(available)}."})
+    kept = [name for name in available if (not fields or name in fields) and name not in exclude]
+    if not kept:
+        raise ValidationError({'fields': "At least one field must be kept."})
+    return kept
+
+
+class SparseFieldsetMixin:
+    """
+    List view mixin. `field_columns` maps each serialized field to the
+    model fields it reads; the queryset loads only those of the requested
+    fields (the primary key is always loaded).
+    """
+    field_columns = {}
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = requested_fields(self.request.query_params, list(self.field_columns))
+        return self._fieldset
+
+    def narrow_queryset(self, queryset):
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+        return queryset.only(*{column for name in fieldset for column in self.field_columns[name]})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_fieldset()
+        return context
@@ -0,0 +1,201 @@
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+
+COVER_SIZES = getattr(settings, 'COVER_RENDITION_SIZES', [160, 480, 1024])  # Max width in pixels
+COVER_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+COVER_QUALITY = 80
+COVER_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+COVER_FETCH_TIMEOUT = 10
+COVER_MAX_REDIRECTS = 3
+
+_executor = None
+
+
+class CoverImageError(Exception):
+    pass
+
+
+def resolve_public_address(host, port):
+    """
+    The address to connect to for `host`, refusing hosts that resolve to
+    anything but public unicast addresses (private, loopback, link-local,
+    metadata services...), so cover URLs cannot reach internal services.
+    """
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except (socket.gaierror, UnicodeError) as e:
+        raise CoverImageError(f"Cannot resolve cover host {host}: {str(e)}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise CoverImageError(f"Cover host {host} resolves to a non-public address.")
+    return addresses[0]
+
+
+def fetch_cover(url):
+    """
+    Download a cover image, refusing anything that is not http(s), not on a
+    public address, or too large. Connections go to the address that was
+    checked, not to a second lookup, and every redirect is checked again.
+    """
+    import urllib3  # Deferred: only cover jobs make outbound requests
+    from requests.certs import where
+
+    for _ in range(COVER_MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CoverImageError(f"Unsupported cover URL: {url}")
+        try:
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            raise CoverImageError(f"Unsupported cover URL: {url}")
+        address = resolve_public_address(parts.hostname, port)
+        host = f"[{parts.hostname}]" if ':' in parts.hostname else parts.hostname
+        options = {'timeout': COVER_FETCH_TIMEOUT, 'retries': False, 'maxsize': 1}
+        if parts.scheme == 'https':
+            # TLS still verifies the certificate against the URL's host name
+            pool = urllib3.HTTPSConnectionPool(address, port, server_hostname=parts.hostname,
+                                               assert_hostname=parts.hostname, ca_certs=where(), **options)
+        else:
+            pool = urllib3.HTTPConnectionPool(address, port, **options)
+
+        try:
+            response = pool.urlopen(
+                'GET', urlunsplit(('', '', parts.path or '/', parts.query, '')),
+                headers={'Host': host if parts.port is None else f"{host}:{port}"},
+                redirect=False, preload_content=False,
+            )
+            try:
+                if response.get_redirect_location():
+                    url = urljoin(url, response.get_redirect_location())
+                    continue
+                if response.status >= 400:
+                    raise CoverImageError(f"Failed to fetch cover image: HTTP {response.status}")
+                data = response.read(COVER_MAX_SOURCE_BYTES + 1, decode_content=True)
+            finally:
+                response.release_conn()
+        except urllib3.exceptions.HTTPError as e:
+            raise CoverImageError(f"Failed to fetch cover image: {str(e)}")
+        finally:
+            pool.close()
+        if len(data) > COVER_MAX_SOURCE_BYTES:
+            raise CoverImageError("Cover image is too large.")
+        return data
+    raise CoverImageError("Too many redirects fetching the cover image.")
+
+
+def render_renditions(source):
+    """
+    Resize a cover into every configured size and format.
+
+    Runs inside the worker processes, so it only deals with bytes: `source` is
+    either raw image bytes or a URL to fetch. Returns the content hash of the
+    source and a `{(format, width): bytes}` mapping.
+    """
+    from PIL import Image, ImageOps  # Deferred: only the worker processes need Pillow
+
+    data = fetch_cover(source) if isinstance(source, str) else source
+    digest = hashlib.sha256(data).hexdigest()
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise CoverImageError(f"Invalid cover image: {str(e)}")
+
+    renditions = {}
+    for width in COVER_SIZES:
+        resized = image
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, pil_format in COVER_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=COVER_QUALITY, optimize=True)
+            renditions[(extension, width)] = buffer.getvalue()
+    return digest, renditions
+
+
+def rendition_path(digest, extension, width):
+    return f"book_covers/{digest[:2]}/{digest}/{width}.{extension}"
+
+
+def store_renditions(digest, renditions):
+    """
+    Save renditions under their content-hash paths. Identical covers share
+    files, so existing paths are left untouched.
+    """
+    stored = {}
+    for (extension, width), content in renditions.items():
+        path = rendition_path(digest, extension, width)
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        stored.setdefault(extension, {})[str(width)] = path
+    return stored
+
+
+def rendition_urls(stored):
+    return {
+        extension: {width: default_storage.url(path) for width, path in sizes.items()}
+        for extension, sizes in (stored or {}).items()
+    }
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'COVER_WORKERS', None) or os.cpu_count()
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def apply_renditions(book_id, digest, renditions):
+    stored = store_renditions(digest, renditions)
+    # Saved through the model, so the change event moves ETags and drops cached documents
+    book = Book.objects.select_related('author').filter(pk=book_id).first()
+    if book is not None:
+        book.cover_hash, book.cover_renditions = digest, stored
+        book.save(update_fields=['cover_hash', 'cover_renditions', 'updated_at'])
+    return stored
+
+
+def process_cover(book_id, source):
+    """
+    Generate and attach renditions for a book's cover in the background
+    process pool. With `COVER_WORKERS = 0` the work runs inline instead.
+    """
+    if getattr(settings, 'COVER_WORKERS', None) == 0:
+        try:
+            return apply_renditions(book_id, *render_renditions(source))
+        except CoverImageError:
+            logger.exception(f"Cover processing failed for book {book_id}")
+            return None
+
+    def on_done(future):
+        close_old_connections()
+        try:
+            apply_renditions(book_id, *future.result())
+        except Exception:
+            logger.exception(f"Cover processing failed for book {book_id}")
+        finally:
+            close_old_connections()
+
+    get_executor().submit(render_renditions, source).add_done_callback(on_done)
@@ -0,0 +1,41 @@
+"""
+Cache invalidation for Book and Review change events, in one place.
+
+Model signals apply it when a write commits, so the writer sees fresh lists
+at once. The `cache-invalidation` consumer group applies the same mapping
+from the event stream for processes that keep caches of their own.
+"""
+from django.db import transaction
+
+from .cache_keys import bump_generation
+from .documents import invalidate_compound_documents
+from .pagination import invalidate_review_counts
+from .recommendations import invalidate_user_recommendations
+
+
+def apply_changes(events):
+    """
+    Drop the caches affected by change events (dicts as built by
+    `outbox.event_data`). Safe to apply more than once.
+    """
+    changed_books = set()
+    reviewed_books = set()
+    reviewers = set()
+    for event in events:
+        if event['topic'] == 'book':
+            changed_books.add(event['object_id'])
+        elif event['topic'] == 'review':
+            reviewed_books.add(event['payload']['book_id'])
+            reviewers.add(event['payload']['user_id'])
+
+    if changed_books:
+        transaction.on_commit(bump_generation)
+        invalidate_compound_documents(changed_books)
+    if reviewed_books:
+        invalidate_compound_documents(reviewed_books, 'reviews')
+        invalidate_review_counts(reviewed_books)
+        invalidate_user_recommendations(reviewers)
+
+
+def apply_change(event):
+    apply_changes([event])
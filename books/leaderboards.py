@@ -0,0 +1,295 @@
+"""
+Review leaderboards in Redis sorted sets.
+
+Each window (day, week, month, all time) has three sorted sets per scope,
+where a scope is all books or one genre: the number of reviews per book,
+the sum of their ratings, and a Bayesian average that pulls books with few
+reviews towards the mean rating. Rolling windows are kept per day they end
+on. A review counts in every window that covers its day and ends today or
+later, so a read is a ZREVRANGE of today's set. Requests never merge or
+score sets.
+
+Review writes reach the boards through the outbox stream: the
+`leaderboards` consumer group (`manage.py consume_events leaderboards`)
+updates the counts and sums, then rewrites the book's averages from the
+values those increments return, so requests never wait on Redis. Each
+event is applied once, redeliveries being recognized by `event_id`. The
+mean rating is stored by `rebuild_leaderboards`, which is meant to run
+periodically; the scale's midpoint stands in until it first runs. Two
+consumers applying events of the same book together can leave its
+average one event behind until its next review or the next rebuild.
+
+Reviews count in the windows of the day they were created; a rating change
+moves their sums. A book changing genre keeps its reviews on the old
+genre's boards until `rebuild_leaderboards` runs.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Book, ChangeEvent, Review
+
+logger = logging.getLogger(__name__)
+
+
+BOARDS = ('top-rated', 'most-reviewed')
+WINDOWS = {'day': 1, 'week': 7, 'month': 30, 'all': None}
+METRICS = ('count', 'sum', 'bayes')
+MEAN_KEY = 'leaderboard:mean'
+APPLIED_TIMEOUT = 60 * 60 * 24  # Seconds an applied event_id is remembered, to skip redeliveries
+DEFAULT_MEAN = 3.0  # Until rebuild_leaderboards stores the mean rating
+MAX_LIMIT = 100
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        import redis  # Only needed once a leaderboard is read or written
+
+        _client = redis.Redis.from_url(
+            settings.LEADERBOARD_REDIS_URL,
+            socket_connect_timeout=settings.LEADERBOARD_REDIS_TIMEOUT,
+            socket_timeout=settings.LEADERBOARD_REDIS_TIMEOUT,
+        )
+    return _client
+
+
+def board_key(scope, metric, bucket):
+    return f"leaderboard:{scope}:{metric}:{bucket}"
+
+
+def applied_key(event_id):
+    return f"leaderboard_applied:{event_id}"
+
+
+def day_bucket(day):
+    return day.strftime('%Y%m%d')
+
+
+def window_bucket(window, end):
+    return 'all' if window == 'all' else f"{window}-{day_bucket(end)}"
+
+
+def window_buckets(day, today):
+    """
+    `(bucket, last day)` of every window that counts reviews of `day` and
+    ends today or later. The all-time window has no last day.
+    """
+    buckets = [('all', None)]
+    for window, days in WINDOWS.items():
+        if days is not None:
+            ends = (day + timedelta(days=offset) for offset in range(days))
+            buckets.extend((window_bucket(window, end), end) for end in ends if end >= today)
+    return buckets
+
+
+def bucket_expiry(end):
+    """
+    Unix time at which the window ending on `end` is no longer read, a day late as slack.
+    """
+    return int(timezone.make_aware(datetime.combine(end + timedelta(days=2), time.min)).timestamp())
+
+
+def bayesian_average(count, total, mean):
+    """
+    (C * mean + sum) / (C + n), C being LEADERBOARD_PRIOR_WEIGHT.
+    """
+    prior = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (prior * mean + total) / (prior + count)
+
+
+def scopes(genre):
+    return ['all', f"genre:{genre}"] if genre else ['all']
+
+
+def _deltas(events):
+    """
+    `(book id, created day, count delta, rating sum delta)` per review event.
+    """
+    deltas = []
+    for event in events:
+        if event['topic'] != 'review':
+            continue
+        payload = event['payload']
+        if event['action'] == ChangeEvent.CREATED:
+            count, total = 1, payload['rating']
+        elif event['action'] == ChangeEvent.DELETED:
+            count, total = -1, -payload['rating']
+        elif payload.get('previous_rating') is not None:
+            count, total = 0, payload['rating'] - payload['previous_rating']
+        else:
+            continue
+        if count or total:
+            deltas.append((payload['book_id'], parse_datetime(payload['created_at']).date(), count, total))
+    return deltas
+
+
+def apply_events(events, client=None):
+    client = client or get_client()
+    deltas = _deltas(events)
+    if not deltas:
+        return
+    genres = dict(Book.objects.filter(pk__in={delta[0] for delta in deltas}).values_list('pk', 'genre'))
+    today = timezone.now().date()
+
+    touched, expiries = [], {}
+    pipe = client.pipeline(transaction=False)
+    pipe.get(MEAN_KEY)
+    for book_id, day, count, total in deltas:
+        for bucket, end in window_buckets(day, today):
+            for scope in scopes(genres.get(book_id)):
+                pipe.zincrby(board_key(scope, 'count', bucket), count, book_id)
+                pipe.zincrby(board_key(scope, 'sum', bucket), total, book_id)
+                touched.append((scope, bucket, book_id))
+                if end is not None:
+                    expiries[(scope, bucket)] = bucket_expiry(end)
+    mean, *scores = pipe.execute()
+    mean = float(mean) if mean is not None else DEFAULT_MEAN
+
+    # The increments returned each book's new count and sum: rewrite its averages
+    pipe = client.pipeline(transaction=False)
+    for (scope, bucket, book_id), count, total in zip(touched, scores[::2], scores[1::2]):
+        if count > 0:
+            pipe.zadd(board_key(scope, 'bayes', bucket), {book_id: bayesian_average(count, total, mean)})
+        else:
+            for metric in METRICS:
+                pipe.zrem(board_key(scope, metric, bucket), book_id)
+    for (scope, bucket), expiry in expiries.items():
+        for metric in METRICS:
+            pipe.expireat(board_key(scope, metric, bucket), expiry)
+    pipe.execute()
+
+
+def apply_event(event, client=None):
+    """
+    Handler of the `leaderboards` consumer group: apply one change event,
+    unless its `event_id` was applied already. A failure partway through
+    can leave the book's counts off until the next rebuild.
+    """
+    if event['topic'] != 'review':
+        return
+    client = client or get_client()
+    key = applied_key(event['event_id'])
+    if not client.set(key, 1, nx=True, ex=APPLIED_TIMEOUT):
+        return
+    try:
+        apply_events([event], client)
+    except Exception:
+        client.delete(key)  # Retried on redelivery
+        raise
+
+
+def leaderboard(board, window='week', genre=None, limit=10, client=None):
+    """
+    `[{'book', 'score', 'reviews', 'average_rating'}]`, best first.
+    """
+    client = client or get_client()
+    scope = f"genre:{genre}" if genre else 'all'
+    bucket = window_bucket(window, timezone.now().date())
+    count_key, sum_key, bayes_key = (board_key(scope, metric, bucket) for metric in METRICS)
+    rank_key = count_key if board == 'most-reviewed' else bayes_key
+
+    top = client.zrevrange(rank_key, 0, limit - 1, withscores=True)
+    pipe = client.pipeline(transaction=False)
+    for book, _ in top:
+        pipe.zscore(count_key, book)
+        pipe.zscore(sum_key, book)
+    stats = pipe.execute()
+
+    entries = []
+    for (book, score), count, total in zip(top, stats[::2], stats[1::2]):
+        if count and count > 0:
+            entries.append({
+                'book': int(book),
+                'score': round(score, 4),
+                'reviews': int(count),
+                'average_rating': round((total or 0) / count, 2),
+            })
+    return entries
+
+
+def window_counts(since=None):
+    """
+    Review count and rating total per book, for reviews created since `since` (all when None).
+    """
+    # A range on created_at itself, so monthly review partitions are pruned
+    reviews = Review.objects.all() if since is None else Review.objects.filter(created_at__gte=since)
+    return reviews.values('book_id', 'book__genre').annotate(reviews=Count('id'), total=Sum('rating')).order_by()
+
+
+def window_starts(today):
+    """
+    `(bucket, first moment, last day)` of every window a read can ask for,
+    today or on a later day.
+    """
+    yield 'all', None, None
+    for window, days in WINDOWS.items():
+        if days is not None:
+            for offset in range(days):
+                end = today + timedelta(days=offset)
+                since = timezone.make_aware(datetime.combine(end - timedelta(days=days - 1), time.min))
+                yield window_bucket(window, end), since, end
+
+
+def rebuild_leaderboards(client=None, batch_size=10000):
+    """
+    Replace every leaderboard key with counts aggregated from Review, and
+    store the current mean rating. Returns the number of (book, window)
+    rows written. The boards are built under temporary keys and renamed
+    over the live ones at the end, so reads never see them half built.
+    Review events applied during the rebuild may be lost; run it when
+    traffic is low.
+    """
+    client = client or get_client()
+    staging = f"leaderboard_rebuild:{timezone.now().timestamp():.0f}:"
+    mean = Review.objects.aggregate(mean=Avg('rating'))['mean'] or DEFAULT_MEAN
+    written, expiries = 0, {}
+    pipe = client.pipeline(transaction=False)
+    for bucket, since, end in window_starts(timezone.now().date()):
+        for row in window_counts(since).iterator(chunk_size=batch_size):
+            for scope in scopes(row['book__genre']):
+                keys = [board_key(scope, metric, bucket) for metric in METRICS]
+                pipe.zadd(staging + keys[0], {row['book_id']: row['reviews']})
+                pipe.zadd(staging + keys[1], {row['book_id']: row['total']})
+                pipe.zadd(staging + keys[2], {row['book_id']: bayesian_average(row['reviews'], row['total'], mean)})
+                for key in keys:
+                    expiries[key] = bucket_expiry(end) if end is not None else None
+            written += 1
+            if len(pipe) >= batch_size:
+                pipe.execute()
+    for key in expiries:  # Left behind by a rebuild that fails before the renames
+        pipe.expire(staging + key, 60 * 60)
+    pipe.execute()
+
+    stale = [key for key in client.scan_iter(match='leaderboard:*:*:*', count=batch_size)
+             if key.decode() not in expiries]
+    pipe = client.pipeline(transaction=True)
+    pipe.set(MEAN_KEY, mean)
+    for key, expiry in expiries.items():
+        pipe.rename(staging + key, key)
+        if expiry is None:
+            pipe.persist(key)
+        else:
+            pipe.expireat(key, expiry)
+    for keys in _batched(stale, batch_size):
+        pipe.delete(*keys)
+    pipe.execute()
+    return written
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from books.authors import BACKFILL_BATCH_SIZE, backfill_authors
+
+
+class Command(BaseCommand):
+    help = (
+        "Point books at deduplicated Author rows in batches, while the service runs. "
+        "Run it after `migrate books 0010` and before migrating further, so that the "
+        "last migration, run with the workers stopped, only has the books written in "
+        "between left to do."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help="Books per transaction.")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        # The models as migrated so far: the name column and the reference only coexist before 0012
+        loader = MigrationExecutor(connections[using]).loader
+        apps = loader.project_state(list(loader.applied_migrations)).apps
+        try:
+            Book, Author = apps.get_model('books', 'Book'), apps.get_model('books', 'Author')
+        except LookupError:
+            Book = Author = None
+        if Author is None or 'author_ref' not in {field.name for field in Book._meta.get_fields()}:
+            self.stdout.write("Books are not between migrations books.0010 and books.0012; nothing to do.")
+            return
+
+        started = time.perf_counter()
+        updated = backfill_authors(
+            Book, Author, batch_size=options['batch_size'], using=using,
+            progress=lambda count, last_id: self.stdout.write(f"{count} books done, up to id {last_id}"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {updated} books to {Author.objects.using(using).count()} authors "
+            f"in {time.perf_counter() - started:.1f}s. Stop the workers and run `migrate` to finish."
+        ))
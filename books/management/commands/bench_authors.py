@@ -0,0 +1,112 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from books.authors import normalize_author_name, resolve_authors
+from books.models import Author, Book
+
+LEGACY_TABLE = 'bench_legacy_books'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark books referencing Author rows against the former layout, "
+        "rebuilt as a table with the author name on every row: bytes spent on "
+        "author names, books of one author, and title-or-author search. "
+        "Data is written in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            names = self.create_data(options)
+            self.report_storage()
+            rng = random.Random(1)
+            authors = [rng.choice(names) for _ in range(options['requests'])]
+            ids = resolve_authors(Author, authors)
+            lookups = [(ids[normalize_author_name(name)], name) for name in authors]
+            terms = [name.split()[1][:5] for name in authors[:max(options['requests'] // 5, 1)]]
+
+            self.stdout.write(f"\n{'query':<40}{'p50 ms':>9}{'p99 ms':>9}")
+            self.run_case('by author, legacy (page + count)', lookups,
+                          lambda lookup: self.legacy("author = %s", [lookup[1]]))
+            self.run_case('by author, author_id (page + count)', lookups,
+                          lambda lookup: self.page(Book.objects.filter(author_id=lookup[0])))
+            self.run_case('search, legacy (page + count)', terms, lambda term: self.legacy(
+                "UPPER(title) LIKE UPPER(%s) OR UPPER(author) LIKE UPPER(%s)", [f'%{term}%'] * 2))
+            self.run_case('search, join (page + count)', terms, lambda term: self.page(
+                Book.objects.filter(Q(title__icontains=term) | Q(author__name__icontains=term))))
+            self.run_case('search, author subquery (page + count)', terms, lambda term: self.page(
+                Book.objects.filter(Q(title__icontains=term) | Q(
+                    author__in=Author.objects.filter(name__icontains=term).values('pk')))))
+            transaction.set_rollback(True)
+
+    def create_data(self, options):
+        rng = random.Random(0)
+
+        def word():
+            return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title()
+
+        names = list({f"{word()} {word()} {word()}" for _ in range(options['authors'])})
+        ids = resolve_authors(Author, names)
+        author_ids = [ids[normalize_author_name(name)] for name in names]
+        Book.objects.bulk_create([
+            # Skewed towards a few prolific authors
+            Book(title=f"{word()} {word()} {i}", author_id=author_ids[int(len(names) * rng.random() ** 2)],
+                 genre='Fiction')
+            for i in range(options['books'])
+        ], batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {LEGACY_TABLE} AS SELECT b.id, b.title, a.name AS author, b.genre "
+                           f"FROM books_book b JOIN books_author a ON a.id = b.author_id")
+            cursor.execute(f"CREATE UNIQUE INDEX {LEGACY_TABLE}_id ON {LEGACY_TABLE} (id)")
+            cursor.execute("ANALYZE")
+        return names
+
+    def report_storage(self):
+        books = Book.objects.count()
+        repeated = sum(Book.objects.annotate(length=Length('author__name'))
+                       .values_list('length', flat=True).iterator())
+        stored = sum(Author.objects.annotate(length=Length('name') + Length('normalized_name'))
+                     .values_list('length', flat=True).iterator())
+        referenced = books * 8 + stored  # A bigint per book, plus each author's name once, twice spelled
+        self.stdout.write(
+            f"{books} books, {Author.objects.count()} authors\n"
+            f"author names repeated per book: {repeated / 1024 / 1024:.2f} MiB "
+            f"({repeated / books:.1f} bytes a book)\n"
+            f"author_id + author table:       {referenced / 1024 / 1024:.2f} MiB "
+            f"({referenced / books:.1f} bytes a book, {1 - referenced / repeated:.0%} less)"
+        )
+
+    def legacy(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id, title, author, genre FROM {LEGACY_TABLE} WHERE {where} ORDER BY id LIMIT 10",
+                           params)
+            cursor.fetchall()
+            cursor.execute(f"SELECT count(*) FROM {LEGACY_TABLE} WHERE {where}", params)
+            cursor.fetchone()
+
+    def page(self, queryset):
+        list(queryset.order_by('id')[:10])
+        queryset.count()
+
+    def run_case(self, name, args, run):
+        samples = []
+        for arg in args:
+            started = time.perf_counter()
+            run(arg)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        self.stdout.write(
+            f"{name:<40}{statistics.median(samples) * 1000:>9.2f}{samples[int(len(samples) * 0.99)] * 1000:>9.2f}"
+        )
@@ -0,0 +1,82 @@
+import gc
+import itertools
+import random
+import statistics
+import string
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from books.autocomplete import AutocompleteIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the autocomplete index on synthetic titles (Zipf-distributed words): "
+        "build time, memory, and search latency for prefixes, phrases and typos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1_000_000)
+        parser.add_argument('--vocabulary', type=int, default=200_000)
+        parser.add_argument('--queries', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        vocabulary = list({
+            ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))) for _ in range(options['vocabulary'])
+        })
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        authors = [' '.join(rng.choices(vocabulary, cum_weights=weights, k=2)).title() for _ in range(options['books'] // 5)]
+
+        def title():
+            return ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(1, 6))).title()
+
+        rows = [(book_id, title(), rng.choice(authors)) for book_id in range(1, options['books'] + 1)]
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        index = AutocompleteIndex()
+        index.build(rows)
+        build_seconds = time.perf_counter() - started
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        gc.collect()
+        gc.freeze()  # As AutocompleteIndex.from_database does
+        self.stdout.write(f"{len(index.docs)} books, {len(index.vocab)} words: built in {build_seconds:.1f}s, "
+                          f"{size / 1024 / 1024:.0f} MiB (titles and authors included)")
+
+        samples = [rows[rng.randrange(len(rows))] for _ in range(options['queries'])]
+        cases = {
+            'prefix 1 char': [t.split()[-1][:1] for _, t, _ in samples],
+            'prefix 3 chars': [t.split()[-1][:3] for _, t, _ in samples],
+            'prefix 6 chars': [t.split()[-1][:6] for _, t, _ in samples],
+            'two words': [' '.join(t.split()[:2])[:-1] for _, t, _ in samples],
+            'typo': [self.typo(rng, t.split()[0]) for _, t, _ in samples],
+        }
+        self.stdout.write(f"{'query':<16}{'p50 us':>9}{'p99 us':>9}{'max us':>9}{'hits':>7}")
+        for name, queries in cases.items():
+            timings, hits = [], 0
+            for query in queries:
+                started = time.perf_counter()
+                results, _ = index.search(query)
+                timings.append(time.perf_counter() - started)
+                hits += bool(results)
+            timings.sort()
+            self.stdout.write(
+                f"{name:<16}{statistics.median(timings) * 1e6:>9.1f}{timings[int(len(timings) * 0.99)] * 1e6:>9.1f}"
+                f"{timings[-1] * 1e6:>9.1f}{hits / len(queries):>7.0%}"
+            )
+
+        started = time.perf_counter()
+        for book_id, title, author in rows[:1000]:
+            index.upsert(book_id, title + ' Revised', author)
+        self.stdout.write(f"patch 1000 titles: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def typo(self, rng, word):
+        if len(word) < 4:
+            return word
+        position = rng.randrange(1, len(word) - 1)
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]  # Swap two letters
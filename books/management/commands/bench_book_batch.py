@@ -0,0 +1,102 @@
+import functools
+import random
+import statistics
+import time
+
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from books.batch import MAX_BOOK_BATCH_SIZE
+from books.metadata import metadata_cache_key
+from books.models import Author, Book
+from books.views import BookBatchView, BookDetailView
+
+ROUND_TRIP_METHODS = ('get', 'get_many', 'set', 'set_many', 'add', 'incr', 'delete', 'delete_many')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a shelf of books loaded with one batch request against one "
+        "book-detail request per book. The local memory cache sleeps for "
+        "--cache-rtt-ms on every call to stand in for Redis round trips; "
+        "Google Books metadata is cached beforehand. Data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--shelf', type=int, default=50, help=f"Books per shelf (at most {MAX_BOOK_BATCH_SIZE}).")
+        parser.add_argument('--cache-rtt-ms', type=float, default=0.3)
+        parser.add_argument('--shelves', type=int, default=100)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'OPTIONS': {'MAX_ENTRIES': 100_000}}}):
+            with transaction.atomic():
+                authors = [Author.objects.for_name(f"Author {i}") for i in range(500)]
+                Book.objects.bulk_create([
+                    Book(title=f"Book {i}", author=authors[i % 500], genre='Fiction')
+                    for i in range(options['books'])
+                ], batch_size=1000)
+                ids = list(Book.objects.values_list('id', flat=True))
+                cache.set_many({metadata_cache_key(f"Book {i}", f"Author {i % 500}"): {'publisher': 'Bench'}
+                                for i in range(options['books'])}, None)
+                shelves = [rng.sample(ids, options['shelf']) for _ in range(options['shelves'])]
+
+                self.calls, self.nested = 0, False
+                self.slow_down_cache(options['cache_rtt_ms'] / 1000)
+                self.stdout.write(f"{options['shelf']} books per shelf, {options['cache_rtt_ms']}ms per cache call")
+                self.stdout.write(f"{'strategy':<28}{'queries':>9}{'cache calls':>13}{'p50 ms':>9}{'p99 ms':>9}")
+                self.run_case('detail x shelf', self.load_one_by_one, shelves)
+                self.run_case('batch, documents not cached', self.load_batch, shelves)
+                self.run_case('batch, documents cached', self.load_batch, shelves)
+                transaction.set_rollback(True)
+
+    def slow_down_cache(self, seconds):
+        backend = caches['default']
+        for name in ROUND_TRIP_METHODS:
+            setattr(backend, name, self.round_trip(getattr(backend, name), seconds))
+
+    def round_trip(self, method, seconds):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            # The local memory get_many/set_many loop over get/set; Redis sends one command
+            if self.nested:
+                return method(*args, **kwargs)
+            self.calls += 1
+            time.sleep(seconds)
+            self.nested = True
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.nested = False
+        return wrapper
+
+    def load_one_by_one(self, factory, shelf):
+        view = BookDetailView.as_view()
+        return [view(factory.get('/', HTTP_HOST='localhost'), id=book_id).render() for book_id in shelf]
+
+    def load_batch(self, factory, shelf):
+        return BookBatchView.as_view()(
+            factory.get('/', {'ids': ','.join(map(str, shelf))}, HTTP_HOST='localhost')
+        ).render()
+
+    def run_case(self, name, load, shelves):
+        factory = RequestFactory()
+        samples, queries, calls = [], 0, 0
+        for shelf in shelves:
+            self.calls = 0
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                load(factory, shelf)
+            samples.append(time.perf_counter() - started)
+            queries += len(captured)
+            calls += self.calls
+        samples.sort()
+        self.stdout.write(
+            f"{name:<28}{queries / len(shelves):>9.1f}{calls / len(shelves):>13.1f}"
+            f"{statistics.median(samples) * 1000:>9.2f}{samples[int(len(samples) * 0.99)] * 1000:>9.2f}"
+        )
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from books.documents import bump_document_versions
+from books.models import Author, Book, Review
+from books.views import BookDetailView, BookDocumentView, BookReviewsList
+
+PARTS = {'reviews', 'metadata', 'stats'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a book page loaded with one compound document request against "
+        "book-detail, then book-reviews-list, then one user lookup per reviewer. "
+        "Google Books is stubbed with --metadata-ms of latency per lookup, never cached. "
+        "Data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=200)
+        parser.add_argument('--reviews', type=int, default=20, help="Reviews per book.")
+        parser.add_argument('--metadata-ms', type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        latency = options['metadata_ms'] / 1000
+
+        def fetch(title, author, use_cache=True):
+            time.sleep(latency)
+            return {'publisher': 'Bench'}
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'OPTIONS': {'MAX_ENTRIES': 100_000}}}), \
+                mock.patch('books.views.fetch_google_books_metadata', fetch), \
+                mock.patch('books.documents.fetch_google_books_metadata', fetch):
+            with transaction.atomic():
+                author = Author.objects.for_name('Bench Author')
+                books = Book.objects.bulk_create([
+                    Book(title=f"Book {i}", author=author, genre='Fiction') for i in range(options['books'])
+                ])
+                User = get_user_model()
+                users = User.objects.bulk_create([
+                    User(username=f"bench_document_{i}", email=f"bench_document_{i}@example.com")
+                    for i in range(options['reviews'] * 5)
+                ])
+                Review.objects.bulk_create([
+                    Review(book=book, user=user, rating=rng.randint(1, 5), comment='Bench review')
+                    for book in books for user in rng.sample(users, options['reviews'])
+                ])
+                ids = [book.pk for book in books]
+
+                self.stdout.write(f"{options['reviews']} reviews per book, {options['metadata_ms']}ms per "
+                                  f"Google Books lookup")
+                self.stdout.write(f"{'strategy':<30}{'queries':>9}{'p50 ms':>9}{'p99 ms':>9}")
+                self.run_case('separate requests', self.load_separately, ids)
+                self.run_case('compound, not cached', self.load_compound, ids, clear=True)
+                self.run_case('compound, cached', self.load_compound, ids)
+                transaction.set_rollback(True)
+
+    def load_separately(self, factory, book_id):
+        BookDetailView.as_view()(factory.get('/', HTTP_HOST='localhost'), id=book_id).render()
+        reviews = BookReviewsList.as_view()(factory.get('/', HTTP_HOST='localhost'), book_id=book_id).render()
+        for review in reviews.data['results']:
+            get_user_model().objects.get(pk=review['user'])
+
+    def load_compound(self, factory, book_id):
+        BookDocumentView.as_view()(
+            factory.get('/', {'include': ','.join(PARTS)}, HTTP_HOST='localhost'), id=book_id
+        ).render()
+
+    def run_case(self, name, load, ids, clear=False):
+        factory = RequestFactory()
+        samples, queries = [], 0
+        for book_id in ids:
+            if clear:
+                bump_document_versions([book_id])
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                load(factory, book_id)
+            samples.append(time.perf_counter() - started)
+            queries += len(captured)
+        samples.sort()
+        self.stdout.write(
+            f"{name:<30}{queries / len(ids):>9.1f}"
+            f"{statistics.median(samples) * 1000:>9.2f}{samples[int(len(samples) * 0.99)] * 1000:>9.2f}"
+        )
@@ -0,0 +1,92 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from book_review_service.compression import COMPRESSORS, CompressionMiddleware
+from books.models import Author, Book
+from books.serializers import BookSerializer
+
+
+# (name, downlink bits/sec, round trip seconds)
+CLIENTS = [
+    ('2G', 250_000, 0.3),
+    ('slow 3G', 400_000, 0.4),
+    ('fast 3G', 1_600_000, 0.15),
+    ('4G', 9_000_000, 0.05),
+]
+HEADER_BYTES = 300  # Rough size of a response's status line and headers
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark API response compression on a list page: bytes on the wire, "
+        "server time per encoding (with and without the cached variant), and the "
+        "resulting latency for simulated slow clients, against a 304 revalidation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help="Books on the benchmarked page.")
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        def words(count):
+            return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count))
+
+        books = [
+            Book(id=i, title=words(rng.randint(2, 6)).title(), author=Author(name=words(2).title()), genre='Fiction',
+                 cover_image=f"book_covers/{rng.getrandbits(64):x}.jpg")
+            for i in range(options['page_size'])
+        ]
+        page = {'count': 5000, 'next': 'http://localhost:8000/api/books/2.2/list-books/?page=2',
+                'previous': None, 'results': BookSerializer(books, many=True).data}
+        content = JSONRenderer().render(page)
+        factory = RequestFactory()
+
+        rows = [('identity', len(content), 0.0, 0.0)]
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            for encoding in COMPRESSORS:
+                request = factory.get('/', HTTP_ACCEPT_ENCODING=encoding)
+                size = len(self.run_middleware(request, content, None).content)
+                cold = self.time_middleware(request, content, None, options['requests'])
+                warm = self.time_middleware(request, content, 'bench_page', options['requests'])
+                rows.append((encoding, size, cold, warm))
+
+        self.stdout.write(f"List page of {options['page_size']} books, {len(content) / 1024:.1f} KiB of JSON")
+        self.stdout.write(f"{'encoding':<10}{'bytes':>10}{'ratio':>8}{'compress ms':>13}{'cached ms':>11}")
+        for encoding, size, cold, warm in rows:
+            self.stdout.write(
+                f"{encoding:<10}{size:>10}{len(content) / size:>8.1f}{cold * 1000:>13.3f}{warm * 1000:>11.3f}"
+            )
+
+        self.stdout.write("\nTime to last byte (cached variant; RTT + transfer, TCP slow start ignored)")
+        self.stdout.write(f"{'client':<10}" + ''.join(f"{row[0]:>11}" for row in rows) + f"{'304':>11}")
+        for name, bits_per_second, rtt in CLIENTS:
+            cells = [rtt + warm + (size + HEADER_BYTES) * 8 / bits_per_second for _, size, _, warm in rows]
+            revalidation = rtt + HEADER_BYTES * 8 / bits_per_second
+            self.stdout.write(f"{name:<10}" + ''.join(f"{cell * 1000:>9.0f}ms" for cell in cells)
+                              + f"{revalidation * 1000:>9.0f}ms")
+
+    def run_middleware(self, request, content, variant_key):
+        def view(request):
+            response = HttpResponse(content, content_type='application/json')
+            if variant_key:
+                response.compression_cache_key = variant_key
+            return response
+        return CompressionMiddleware(view)(request)
+
+    def time_middleware(self, request, content, variant_key, count):
+        self.run_middleware(request, content, variant_key)  # Fill the variant cache
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            self.run_middleware(request, content, variant_key)
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples)
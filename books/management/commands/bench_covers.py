@@ -0,0 +1,51 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from books.images import COVER_FORMATS, COVER_SIZES, render_renditions
+
+
+def synthetic_cover(width, height):
+    # Noise keeps the encoders honest, a flat image compresses unrealistically fast
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Benchmark cover resize jobs per second and per core for increasing pool sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=48, help="Resize jobs per run.")
+        parser.add_argument('--width', type=int, default=1600)
+        parser.add_argument('--height', type=int, default=2400)
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        source = synthetic_cover(options['width'], options['height'])
+        renditions = len(COVER_SIZES) * len(COVER_FORMATS)
+        self.stdout.write(
+            f"{options['jobs']} jobs, {options['width']}x{options['height']} source "
+            f"({len(source) // 1024} KiB), {renditions} renditions per job"
+        )
+
+        workers = 1
+        while workers <= options['max_workers']:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(render_renditions, [source] * workers))  # Warm up the workers
+                started = time.perf_counter()
+                list(pool.map(render_renditions, [source] * options['jobs']))
+                elapsed = time.perf_counter() - started
+
+            jobs_per_second = options['jobs'] / elapsed
+            self.stdout.write(
+                f"workers={workers:<3} {jobs_per_second:8.2f} jobs/s  "
+                f"{jobs_per_second / workers:8.2f} jobs/s/core  "
+                f"{jobs_per_second * renditions:8.1f} renditions/s"
+            )
+            workers *= 2
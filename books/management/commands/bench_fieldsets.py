@@ -0,0 +1,93 @@
+import random
+import statistics
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from books.models import Author, Book, Review
+from books.views import BookListView, BookReviewsList
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark sparse fieldsets: payload bytes, columns selected and latency "
+        "of an id+title listing versus the full one, for books and reviews. Data "
+        "is written in a transaction that is rolled back, and the list cache is "
+        "cleared before every request so each one reads the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=100, help="Reviews of the benchmarked book.")
+        parser.add_argument('--comment-words', type=int, default=150, help="Words per review comment.")
+        parser.add_argument('--requests', type=int, default=300)
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with transaction.atomic():
+                book = self.create_data(options)
+                cases = [
+                    ('books, all fields', BookListView, {}, {}),
+                    ('books, id+title', BookListView, {}, {'fields': 'id,title'}),
+                    ('reviews, all fields', BookReviewsList, {'book_id': book.pk}, {'page_size': 100}),
+                    ('reviews, exclude comment', BookReviewsList, {'book_id': book.pk},
+                     {'page_size': 100, 'exclude': 'comment'}),
+                    ('reviews, id+rating', BookReviewsList, {'book_id': book.pk},
+                     {'page_size': 100, 'fields': 'id,rating'}),
+                ]
+                self.stdout.write(f"{'listing':<26}{'bytes':>9}{'columns':>9}{'p50 ms':>9}{'p99 ms':>9}")
+                for name, view, kwargs, params in cases:
+                    self.run_case(name, view.as_view(), kwargs, params, options['requests'])
+                transaction.set_rollback(True)
+
+    def create_data(self, options):
+        rng = random.Random(0)
+
+        def words(count):
+            return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count))
+
+        renditions = {fmt: {str(width): f"book_covers/renditions/{'0' * 64}-{width}.{fmt}" for width in (160, 320, 640)}
+                      for fmt in ('webp', 'jpg')}
+        Book.objects.bulk_create([
+            Book(title=f"{words(rng.randint(2, 5))} {i}", author=Author.objects.for_name(words(2)), genre='Fiction',
+                 cover_image=f"book_covers/{rng.getrandbits(64):x}.jpg", cover_renditions=renditions)
+            for i in range(options['books'])
+        ], batch_size=500)
+        book = Book.objects.first()
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f"bench_fieldsets_{i}", email=f"bench_fieldsets_{i}@example.com")
+            for i in range(options['reviews'])
+        ])
+        Review.objects.bulk_create([
+            Review(book=book, user=user, rating=rng.randint(1, 5), comment=words(options['comment_words']))
+            for user in users
+        ])
+        return book
+
+    def run_case(self, name, view, kwargs, params, count):
+        factory = RequestFactory()
+        samples = []
+        for _ in range(count):
+            cache.clear()
+            request = factory.get('/', params, HTTP_HOST='localhost')
+            started = time.perf_counter()
+            response = view(request, **kwargs).render()
+            samples.append(time.perf_counter() - started)
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            view(factory.get('/', params, HTTP_HOST='localhost'), **kwargs).render()
+        select = max((query['sql'] for query in queries), key=len)
+        columns = select.split(' FROM ')[0].count(',') + 1
+        samples.sort()
+        self.stdout.write(
+            f"{name:<26}{len(response.content):>9}{columns:>9}"
+            f"{statistics.median(samples) * 1000:>9.2f}{samples[int(len(samples) * 0.99)] * 1000:>9.2f}"
+        )
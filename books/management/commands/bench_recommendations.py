@@ -0,0 +1,80 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from books.recommendations import (
+    DEFAULT_MEMORY_BYTES, STORED_NEIGHBORS, CoRatingMatrix, compute_neighbors, similar_books,
+    similar_books_cache_key,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the recommendation build on synthetic ratings (Zipf-distributed "
+        "book popularity), reporting build time and peak memory, and the latency "
+        "of serving a precomputed similar-books entry from the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--books', type=int, default=20_000)
+        parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_BYTES // (1024 * 1024))
+        parser.add_argument('--lookups', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        user_ids = rng.integers(0, options['users'], options['reviews'])
+        book_ids = np.minimum(rng.zipf(1.3, options['reviews']), options['books']) - 1
+        ratings = rng.integers(1, 6, options['reviews']).astype(np.int8)
+        # One review per (user, book), as the unique constraint guarantees
+        _, first = np.unique(user_ids * options['books'] + book_ids, return_index=True)
+        user_ids, book_ids, ratings = user_ids[first], book_ids[first], ratings[first]
+        self.stdout.write(f"{len(ratings)} reviews, {len(np.unique(user_ids))} readers, "
+                          f"{len(np.unique(book_ids))} rated books")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        matrix = CoRatingMatrix(user_ids, book_ids, ratings)
+        matrix_seconds = time.perf_counter() - started
+        neighbors = compute_neighbors(matrix, STORED_NEIGHBORS, options['memory_mb'] * 1024 * 1024)
+        total_seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.stdout.write(f"matrices   {matrix_seconds:8.2f}s")
+        self.stdout.write(f"neighbours {total_seconds - matrix_seconds:8.2f}s  "
+                          f"({len(neighbors) / (total_seconds - matrix_seconds):.0f} books/s)")
+        self.stdout.write(f"peak memory {peak / 1024 / 1024:7.1f} MiB (budget for blocks: {options['memory_mb']} MiB)")
+
+        self.report_serving(neighbors, options['lookups'])
+
+    def report_serving(self, neighbors, lookups):
+        from django.core.cache import cache
+
+        from books.cache_keys import current_generation
+        from books.recommendations import recommendations_version
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            stamp = (current_generation(), recommendations_version())
+            book_ids = list(neighbors)[:200]  # Within the local memory cache's default MAX_ENTRIES
+            for book_id in book_ids:
+                payload = [{'id': other, 'title': f"Book {other}", 'score': score}
+                           for other, score in neighbors[book_id][:10]]
+                cache.set(similar_books_cache_key(book_id), (stamp, payload))
+
+            samples = []
+            for i in range(lookups):
+                started = time.perf_counter()
+                similar_books(book_ids[i % len(book_ids)])
+                samples.append(time.perf_counter() - started)
+        samples.sort()
+        self.stdout.write(
+            f"serve (local memory cache) p50 {statistics.median(samples) * 1e6:.1f}us  "
+            f"p99 {samples[int(len(samples) * 0.99)] * 1e6:.1f}us; Redis adds a round trip per cache read"
+        )
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from book_review_service.serving import compress_variants, serve_media, serve_static
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark bytes/sec served by the static/media views: full media files, "
+        "byte ranges, and precompressed versus identity static files. Runs in "
+        "process, so sendfile() gains under gunicorn come on top of these numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=8, help="Size of the media file.")
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with tempfile.TemporaryDirectory() as root:
+            media_root, static_root = os.path.join(root, 'media'), os.path.join(root, 'static')
+            os.makedirs(media_root)
+            os.makedirs(static_root)
+
+            media = os.path.join(media_root, 'media.bin')
+            with open(media, 'wb') as f:
+                f.write(os.urandom(options['size_mb'] * 1024 * 1024))
+
+            # A compressible static asset, roughly the size of swagger-ui-bundle.js
+            static = os.path.join(static_root, 'bundle.js')
+            source = b''.join(b'function f%d(a,b){return a+b+%d;}\n' % (i, i) for i in range(40000))
+            with open(static, 'wb') as f:
+                f.write(source)
+            for suffix, body in compress_variants(source).items():
+                with open(static + suffix, 'wb') as f:
+                    f.write(body)
+
+            with override_settings(MEDIA_ROOT=media_root, STATIC_ROOT=static_root):
+                cases = [
+                    ('media full', serve_media, 'media.bin', {}),
+                    ('media range 64KiB', serve_media, 'media.bin', {'HTTP_RANGE': 'bytes=1048576-1114111'}),
+                    ('static identity', serve_static, 'bundle.js', {}),
+                    ('static gzip', serve_static, 'bundle.js', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+                    ('static br', serve_static, 'bundle.js', {'HTTP_ACCEPT_ENCODING': 'br, gzip'}),
+                ]
+                for name, view, path, headers in cases:
+                    self.run_case(factory, name, view, path, headers, options['requests'])
+
+    def run_case(self, factory, name, view, path, headers, count):
+        sent = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            response = view(factory.get(f'/{path}', **headers), path)
+            sent += sum(len(chunk) for chunk in response.streaming_content)
+            response.close()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{name:<20} {sent / count / 1024:10.1f} KiB/response  "
+            f"{count / elapsed:9.1f} req/s  {sent / elapsed / 1024 / 1024:9.1f} MiB/s on the wire"
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.recommendations import (
+    DEFAULT_MEMORY_BYTES, DEFAULT_SHRINKAGE, STORED_NEIGHBORS, build_recommendations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the similar-book lists behind the recommendation endpoints. Only books "
+        "with review changes since the last run are recomputed unless --full is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every list (e.g. nightly).")
+        parser.add_argument('--neighbors', type=int, default=STORED_NEIGHBORS, help="Similar books kept per book.")
+        parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_BYTES // (1024 * 1024),
+                            help="Budget for the dense similarity blocks.")
+        parser.add_argument('--shrinkage', type=float, default=DEFAULT_SHRINKAGE,
+                            help="Co-raters at which a similarity keeps half its value; 0 disables.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        mode, written = build_recommendations(
+            full=options['full'],
+            count=options['neighbors'],
+            memory_bytes=options['memory_mb'] * 1024 * 1024,
+            shrinkage=options['shrinkage'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode.capitalize()} build wrote {written} lists in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from book_review_service.db_router import replica_aliases, replica_health
+
+
+class Command(BaseCommand):
+    help = "Check every read replica's health and replication lag."
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            self.stdout.write("No replicas configured (DATABASE_REPLICAS is empty).")
+            return
+
+        unhealthy = 0
+        for alias in aliases:
+            healthy, lag, error = replica_health.check(alias)
+            if healthy:
+                self.stdout.write(self.style.SUCCESS(f"{alias}: healthy, lag {lag:.2f}s"))
+            else:
+                unhealthy += 1
+                detail = error or f"lag {lag:.2f}s"
+                self.stdout.write(self.style.ERROR(f"{alias}: unhealthy, {detail}"))
+
+        if unhealthy:
+            raise CommandError(f"{unhealthy} of {len(aliases)} replicas unhealthy.")
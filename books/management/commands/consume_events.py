@@ -0,0 +1,32 @@
+import socket
+
+from django.core.management.base import BaseCommand
+
+from books.outbox import EVENT_HANDLERS, consume, ensure_group, get_stream_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Consume change events from the Redis stream as a consumer group. The group "
+        "keeps its offset, and messages are acknowledged only after they are handled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('group', choices=sorted(EVENT_HANDLERS))
+        parser.add_argument('--consumer', default=socket.gethostname(), help="Consumer name within the group.")
+        parser.add_argument('--count', type=int, default=100, help="Messages read per round.")
+        parser.add_argument('--claim-idle', type=int, default=60,
+                            help="Seconds after which another consumer's unacknowledged messages are taken over.")
+        parser.add_argument('--once', action='store_true', help="Handle one round and exit.")
+
+    def handle(self, *args, **options):
+        client = get_stream_client()
+        ensure_group(client, options['group'])
+        handler = EVENT_HANDLERS[options['group']]
+
+        while True:
+            handled = consume(client, options['group'], options['consumer'], handler,
+                              count=options['count'], claim_idle_ms=options['claim_idle'] * 1000)
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Handled {handled} events."))
+                break
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from books.outbox import dispatch_batch, get_stream_client, purge_dispatched
+
+
+class Command(BaseCommand):
+    help = "Stream pending Book/Review change events from the outbox table to Redis in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox and exit.")
+        parser.add_argument('--purge-days', type=int, default=7,
+                            help="Delete events dispatched more than this many days ago (0 keeps them).")
+
+    def handle(self, *args, **options):
+        client = get_stream_client()
+        if options['purge_days']:
+            purged = purge_dispatched(timezone.now() - timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {purged} dispatched events.")
+
+        total = 0
+        while True:
+            sent = dispatch_batch(client, options['batch_size'])
+            total += sent
+            if sent:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Dispatched {total} events."))
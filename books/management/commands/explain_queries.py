@@ -0,0 +1,77 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from books.models import Book
+from books.views import BookDetailView, BookFilterView, BookListView, BookReviewsList
+
+
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN (ANALYZE on Postgres) for the queries behind the book endpoints "
+        "and flag sequential scans. Small tables are often scanned on purpose, "
+        "so run this against production-sized data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, help="Book used for detail/review queries (default: first book).")
+        parser.add_argument('--search', default='the', help="Search term for the filter endpoint.")
+        parser.add_argument('--genre', default='Fiction', help="Genre for the filter endpoint.")
+
+    def handle(self, *args, **options):
+        book_id = options['book_id'] or Book.objects.values_list('pk', flat=True).first() or 0
+        endpoints = [
+            ('list-books', BookListView, {}, {}),
+            ('book-detail', BookDetailView, {'id': book_id}, {}),
+            ('book-filter (search)', BookFilterView, {}, {'search': options['search']}),
+            ('book-filter (genre)', BookFilterView, {}, {'genre': options['genre']}),
+            ('book-reviews-list', BookReviewsList, {'book_id': book_id}, {}),
+        ]
+
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        flagged = 0
+        for name, view_class, kwargs, params in endpoints:
+            plan = self.explain(self.endpoint_queryset(view_class, kwargs, params))
+            scans = pattern.findall(plan) if pattern else []
+
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"Sequential scan on: {', '.join(sorted(set(scans)))}"))
+            self.stdout.write("")
+
+        if flagged:
+            self.stdout.write(self.style.WARNING(f"{flagged} of {len(endpoints)} queries use a sequential scan."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No sequential scans found."))
+
+    def endpoint_queryset(self, view_class, kwargs, params):
+        """
+        Build the queryset exactly as the view would, filters and first page included.
+        """
+        view = view_class()
+        view.request = Request(APIRequestFactory().get('/', params))
+        view.kwargs = kwargs
+        view.format_kwarg = None
+        queryset = view.filter_queryset(view.get_queryset())
+
+        if view.lookup_field in kwargs:
+            return queryset.filter(**{view.lookup_field: kwargs[view.lookup_field]})
+        if view.paginator is not None:
+            return queryset[:view.paginator.get_page_size(view.request)]
+        return queryset
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from book_review_service.schema import write_schemas
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI schema (JSON and YAML) to OPENAPI_SCHEMA_DIR. "
+        "Run at build/deploy time; /swagger.json serves these files as-is."
+    )
+
+    def handle(self, *args, **options):
+        for path in write_schemas():
+            self.stdout.write(f"Wrote {path} ({path.stat().st_size} bytes)")
@@ -0,0 +1,94 @@
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from books import partitioning
+from books.leaderboards import WINDOWS, window_counts
+from books.models import Book
+from books.views import BookReviewsList
+
+from .explain_queries import Command as ExplainQueries
+
+PARTITION = re.compile(r'on (books_review_p\d{6})\b')
+NEVER_EXECUTED = re.compile(r'on (books_review_p\d{6})\b[^\n]*\(never executed\)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Partition the reviews table by month on Postgres: `setup`, then `copy`, then "
+        "`swap`, then `ensure` daily to create the coming months' partitions. `check` "
+        "shows which partitions the review list and leaderboard queries read. See "
+        "books/partitioning.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['setup', 'copy', 'swap', 'ensure', 'check'])
+        parser.add_argument('--batch-size', type=int, default=10000, help="Review ids copied per transaction.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between copy batches.")
+        parser.add_argument('--book-id', type=int, help="Book used by `check` (default: first book).")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'postgresql':
+            self.stdout.write(f"{connections[using].vendor} has no table partitioning; nothing to do.")
+            return
+        try:
+            getattr(self, options['action'])(using, options)
+        except ValueError as exc:
+            raise CommandError(exc)
+
+    def setup(self, using, options):
+        created = partitioning.setup(using)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {partitioning.STAGING} with {len(created)} monthly partitions; "
+            f"writes to {partitioning.TABLE} are mirrored into it. Run `copy` next."
+        ))
+
+    def copy(self, using, options):
+        first, last = partitioning.id_range(using)
+        copied, after = 0, first - 1
+        started = time.perf_counter()
+        while after < last:
+            copied += partitioning.copy_batch(after, options['batch_size'], using)
+            after += options['batch_size']
+            self.stdout.write(f"Copied up to id {min(after, last)} of {last} ({copied} rows)")
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {copied} reviews in {time.perf_counter() - started:.1f}s. Run `swap` next."
+        ))
+
+    def swap(self, using, options):
+        fixed = partitioning.swap(using)
+        self.stdout.write(self.style.SUCCESS(
+            f"{partitioning.TABLE} is now partitioned ({fixed} rows reconciled). Run `check`; "
+            f"drop {partitioning.RETIRED} once satisfied."
+        ))
+
+    def ensure(self, using, options):
+        created = partitioning.ensure(using)
+        self.stdout.write(self.style.SUCCESS(f"Created {', '.join(created) or 'no'} partitions."))
+
+    def check(self, using, options):
+        book_id = options['book_id'] or Book.objects.using(using).values_list('pk', flat=True).first() or 0
+        queries = [
+            ('book-reviews-list', ExplainQueries().endpoint_queryset(BookReviewsList, {'book_id': book_id}, {})),
+            ('leaderboard rebuild, month window', window_counts(timezone.now() - timedelta(days=WINDOWS['month']))),
+        ]
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass(%s)", [partitioning.TABLE])
+            total = cursor.fetchone()[0]
+        for name, queryset in queries:
+            plan = queryset.using(using).explain(analyze=True)
+            partitions = set(PARTITION.findall(plan))
+            skipped = set(NEVER_EXECUTED.findall(plan))
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            self.stdout.write(
+                f"Partitions: {total}, planned: {len(partitions)}, read: {len(partitions - skipped)}, "
+                f"never executed: {len(skipped)}\n"
+            )
@@ -0,0 +1,81 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# What a WSGI worker does before serving its first request
+BOOT_SCRIPT = """
+import resource, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+import book_review_service.wsgi
+print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile worker boot: the slowest imports (python -X importtime) grouped by "
+        "top-level package/app, then median boot time and peak RSS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to list.")
+        parser.add_argument('--runs', type=int, default=5, help="Boots to time.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.MIGRATE_HEADING("Imports"))
+        self.report_imports(options['top'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Boot time and peak RSS"))
+        samples = [self.boot() for _ in range(options['runs'])]
+        seconds = statistics.median(sample[0] for sample in samples)
+        rss_mb = statistics.median(sample[1] for sample in samples) / 1024
+        self.stdout.write(f"boot {seconds * 1000:8.1f} ms   peak RSS {rss_mb:7.1f} MiB")
+
+    def run_boot(self, extra_args=()):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'book_review_service.settings'))
+        return subprocess.run(
+            [sys.executable, *extra_args, '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+
+    def boot(self):
+        seconds, rss = self.run_boot().stdout.split()
+        return float(seconds), int(rss)
+
+    def report_imports(self, top):
+        entries = []
+        for line in self.run_boot(['-X', 'importtime']).stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, module = match.groups()
+                entries.append((module, int(self_us), int(cumulative_us), len(indent)))
+
+        per_package = defaultdict(int)
+        for module, self_us, _, _ in entries:
+            per_package[module.split('.')[0]] += self_us
+
+        self.stdout.write("Self time per top-level package:")
+        for package, self_us in sorted(per_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {package}")
+
+        # Top-level imports only (least indented), so nested modules are not double counted
+        shallowest = min((entry[3] for entry in entries), default=0)
+        roots = [entry for entry in entries if entry[3] <= shallowest + 2]
+        self.stdout.write("Slowest imports (cumulative):")
+        for module, _, cumulative_us, _ in sorted(roots, key=lambda entry: -entry[2])[:top]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+        self.stdout.write("")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from books.facets import genre_counts, rating_counts, rebuild_genre_facets, rebuild_rating_facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized per-genre book counts and per-rating review counts."
+
+    def handle(self, *args, **options):
+        rebuild_genre_facets()
+        rebuild_rating_facets()
+        for genre, count in genre_counts().items():
+            self.stdout.write(f"{genre}: {count}")
+        for rating, count in rating_counts().items():
+            self.stdout.write(f"{rating} stars: {count}")
+        self.stdout.write(self.style.SUCCESS("Facets rebuilt."))
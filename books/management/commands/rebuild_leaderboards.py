@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the review leaderboards in Redis from the reviews table, e.g. after "
+        "Redis lost data, the leaderboards consumer failed, or books changed genre."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows and Redis commands per round trip.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_leaderboards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} leaderboard rows in {time.perf_counter() - started:.2f}s."
+        ))
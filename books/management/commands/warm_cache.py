@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books.warming import CacheWarmer
+
+
+class Command(BaseCommand):
+    help = (
+        "Prefill the most requested book list pages, filter combinations and detail "
+        "metadata, again whenever a book write invalidates them or they near expiry."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help="Number of hottest entries to keep warm.")
+        parser.add_argument('--concurrency', type=int, default=settings.CACHE_WARMER_CONCURRENCY,
+                            help="Views rendered at once, each holding a database connection.")
+        parser.add_argument('--rate', type=float, default=settings.CACHE_WARMER_RATE,
+                            help="Maximum renders per second, bounding the load on the database.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds between checks for invalidated or expiring entries.")
+        parser.add_argument('--once', action='store_true', help="Warm once and exit.")
+
+    def handle(self, *args, **options):
+        warmer = CacheWarmer(top=options['top'], concurrency=options['concurrency'], rate=options['rate'])
+        while True:
+            started = time.perf_counter()
+            warmed, failed = warmer.run_once()
+            if warmed or failed or options['once']:
+                self.stdout.write(
+                    f"Warmed {warmed} entries ({failed} failed) in {time.perf_counter() - started:.2f}s."
+                )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,69 @@
+"""
+Google Books metadata shown with book details, cached for a day per
+title and author. Books Google has no match for are cached as long;
+failed lookups only for METADATA_FAILURE_TIMEOUT, so an outage is not
+retried on every request but ends soon after Google recovers.
+"""
+from django.core.cache import cache
+
+from .cache_keys import METADATA_CACHE_TIMEOUT
+
+METADATA_FETCH_TIMEOUT = (3.05, 5)  # Connect, read: a hung lookup must not hold the request
+METADATA_FAILURE_TIMEOUT = 60
+NO_MATCH = {"error": "No matching book found in Google Books"}
+
+
+def metadata_cache_key(title, author):
+    return f"google_books:{title}:{author}"
+
+
+def metadata_failed(data):
+    """Whether `data` is a failed lookup, as opposed to metadata or a known miss."""
+    return 'error' in data and data != NO_MATCH
+
+
+def fetch_google_books_metadata(title, author, use_cache=True):
+    """
+    Fetch metadata from Google Books API with caching. Failures are
+    returned as `{'error': ...}` and cached briefly.
+    """
+    import requests  # Deferred: only needed on a metadata cache miss
+
+    cache_key = metadata_cache_key(title, author)
+    cached_data = cache.get(cache_key) if use_cache else None
+
+    if cached_data is not None:
+        return cached_data
+
+    base_url = "https://www.googleapis.com/books/v1/volumes"
+    query = f"intitle:{title}+inauthor:{author}"
+    params = {
+        'q': query,
+        'maxResults': 1
+    }
+
+    try:
+        response = requests.get(base_url, params=params, timeout=METADATA_FETCH_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get('totalItems', 0) > 0:
+            book_info = data['items'][0]['volumeInfo']
+            api_data = {
+                'description': book_info.get('description', 'No description available'),
+                'published_date': book_info.get('publishedDate', 'Unknown'),
+                'publisher': book_info.get('publisher', 'Unknown'),
+                'average_rating': book_info.get('averageRating', 'Not rated'),
+                'ratings_count': book_info.get('ratingsCount', 0),
+                'thumbnail': book_info.get('imageLinks', {}).get('thumbnail', 'No thumbnail available')
+            }
+            cache.set(cache_key, api_data, METADATA_CACHE_TIMEOUT)
+            return api_data
+        else:
+            cache.set(cache_key, NO_MATCH, METADATA_CACHE_TIMEOUT)
+            return dict(NO_MATCH)
+
+    except requests.RequestException as e:
+        failure = {"error": f"Failed to fetch metadata from Google Books: {str(e)}"}
+        cache.set(cache_key, failure, METADATA_FAILURE_TIMEOUT)
+        return failure
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 22:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_genre_facets(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    GenreFacet = apps.get_model('books', 'GenreFacet')
+    counts = Book.objects.exclude(genre='').values('genre').annotate(count=Count('id'))
+    GenreFacet.objects.bulk_create(
+        GenreFacet(genre=row['genre'], book_count=row['count']) for row in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreFacet',
+            fields=[
+                ('genre', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('book_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_genre_facets, migrations.RunPython.noop),
+    ]
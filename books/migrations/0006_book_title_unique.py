@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+
+def check_duplicate_titles(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    duplicates = list(
+        Book.objects.annotate(normalized=Lower(Trim('title')))
+        .values('normalized')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('normalized', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Cannot enforce unique book titles, these titles are used more than once "
+            f"(case-insensitive): {duplicates}. Rename or merge them and re-run migrate."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_titles, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(Lower(Trim('title')), name='books_book_title_normalized_unique'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# First of three steps from the author name column to the Author table:
+# add the table and a nullable reference, then `0011` (or, ahead of it and
+# online, `manage.py backfill_authors`) fills the reference, and `0012`
+# swaps it in for the name column. The previous release runs fine up to
+# `0011`; `0012` needs the workers stopped, as that release reads the name
+# column and this one the reference.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_bookneighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized_name', models.TextField(unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='author_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='+', to='books.author'),
+        ),
+    ]
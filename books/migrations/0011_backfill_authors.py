@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+from books.authors import backfill_authors
+
+
+def fill_author_refs(apps, schema_editor):
+    # Only books written since `manage.py backfill_authors` last ran, if it did
+    backfill_authors(apps.get_model('books', 'Book'), apps.get_model('books', 'Author'),
+                     using=schema_editor.connection.alias)
+
+
+def restore_author_names(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Author = apps.get_model('books', 'Author')
+    Book.objects.using(schema_editor.connection.alias).update(
+        author=Subquery(Author.objects.filter(pk=OuterRef('author_ref')).values('name')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_author'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_author_refs, restore_author_names),
+    ]
@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Author search matches `UPPER(books_author.name) LIKE UPPER('%term%')`, so
+# the trigram index dropped with the name column moves to the author table.
+def create_author_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS books_author_name_trgm ON books_author USING gin (UPPER(name) gin_trgm_ops)'
+    )
+
+
+def drop_author_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS books_author_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_backfill_authors'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='book',
+            name='author',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='author_ref',
+            new_name='author',
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='books', to='books.author'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'id'], name='books_book_author_idx'),
+        ),
+        migrations.RunPython(create_author_trigram_index, drop_author_trigram_index),
+    ]
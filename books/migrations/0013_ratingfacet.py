@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-19 09:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_facets(apps, schema_editor):
+    Review = apps.get_model('books', 'Review')
+    RatingFacet = apps.get_model('books', 'RatingFacet')
+    db_alias = schema_editor.connection.alias
+    counts = dict(Review.objects.using(db_alias).values_list('rating').annotate(count=Count('id')).order_by())
+    # A row for every rating, so review writes only ever update
+    RatingFacet.objects.using(db_alias).bulk_create(
+        RatingFacet(rating=rating, review_count=counts.get(rating, 0)) for rating in range(1, 6)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_book_author_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingFacet',
+            fields=[
+                ('rating', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_facets, migrations.RunPython.noop),
+    ]
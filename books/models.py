@@ -1,17 +1,72 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings 
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower, Trim
+
+from .authors import clean_author_name, normalize_author_name
+
+ALLOWED_GENRES = ['Fiction', 'Non-Fiction', 'Mystery', 'Sci-Fi', 'Fantasy', 'Dystopian']
+
+
+class AuthorManager(models.Manager):
+    def for_name(self, name):
+        """
+        The author called `name`, ignoring case and spacing; created if new.
+        """
+        author, _ = self.get_or_create(
+            normalized_name=normalize_author_name(name), defaults={'name': clean_author_name(name)}
+        )
+        return author
+
+
+class Author(models.Model):
+    """
+    A book author, stored once however many books name them.
+    """
+    name = models.CharField(max_length=255)
+    normalized_name = models.TextField(unique=True)  # See authors.normalize_author_name
+
+    objects = AuthorManager()
+
+    def __str__(self):
+        return self.name
+
 
 class Book(models.Model):
     title = models.CharField(max_length=255)
-    author = models.CharField(max_length=255)
+    author = models.ForeignKey(Author, on_delete=models.PROTECT, related_name='books', db_index=False)
     genre = models.CharField(max_length=100)
     cover_image = models.ImageField(upload_to='book_covers/', blank=True, null=True)
+    cover_hash = models.CharField(max_length=64, blank=True, default='')
+    cover_renditions = models.JSONField(default=dict, blank=True)  # {format: {width: storage path}}
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['genre'], name='books_book_genre_idx'),
+            # Serves the FK and the author-books listing, in id order without a sort
+            models.Index(fields=['author', 'id'], name='books_book_author_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(Lower(Trim('title')), name='books_book_title_normalized_unique'),
+        ]
+
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored genre so facet counts can be moved on update
+        if 'genre' in field_names:
+            instance._loaded_genre = instance.genre
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save outbox event commits or rolls back with the row
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
     
 class Review(models.Model):
     book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='reviews')  
@@ -21,4 +76,83 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  
 
     class Meta:
-        unique_together = ['book', 'user'] 
\ No newline at end of file
+        unique_together = ['book', 'user']
+        indexes = [
+            models.Index(fields=['book', 'created_at'], name='books_review_book_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so leaderboards can apply the difference on update
+        if 'rating' in field_names:
+            instance._loaded_rating = instance.rating
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The post_save outbox event commits or rolls back with the row
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class GenreFacet(models.Model):
+    """
+    Materialized number of books per genre, kept in step with Book writes.
+    """
+    genre = models.CharField(max_length=100, primary_key=True)
+    book_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.genre}: {self.book_count}"
+
+
+class RatingFacet(models.Model):
+    """
+    Materialized number of reviews per star rating, kept in step with Review writes.
+    """
+    rating = models.PositiveSmallIntegerField(primary_key=True)
+    review_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.rating}: {self.review_count}"
+
+
+class ChangeEvent(models.Model):
+    """
+    Transactional outbox: one row per Book/Review write, written in the same
+    transaction as the write and streamed to consumers by `dispatch_outbox`.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    topic = models.CharField(max_length=50)  # 'book' or 'review'
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(dispatched_at__isnull=True),
+                name='books_changeevent_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic}:{self.object_id} {self.action}"
+
+
+class BookNeighbors(models.Model):
+    """
+    Precomputed most similar books by co-rating, written by `build_recommendations`.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='neighbors')
+    neighbors = models.JSONField(default=list, blank=True)  # [[book id, similarity], ...], most similar first
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbors of book {self.book_id}"
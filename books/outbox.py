@@ -0,0 +1,161 @@
+"""
+Transactional outbox for Book and Review changes.
+
+Signals write a ChangeEvent in the same transaction as the row they describe,
+so an event exists if and only if the write committed. `dispatch_outbox`
+streams pending events in batches to a Redis stream and marks them
+dispatched afterwards; a crash in between sends the batch again, so delivery
+is at-least-once and consumers must be idempotent (`event_id` identifies
+duplicates). Consumers read through consumer groups, which keep each group's
+offset and re-deliver messages that were never acknowledged.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .invalidation import apply_change
+from .leaderboards import apply_event as apply_leaderboard_event
+from .models import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+def book_payload(book):
+    return {'title': book.title, 'author': book.author.name, 'genre': book.genre}
+
+
+def review_payload(review):
+    return {
+        'book_id': review.book_id,
+        'user_id': review.user_id,
+        'rating': review.rating,
+        'previous_rating': getattr(review, '_loaded_rating', None),
+        'created_at': review.created_at.isoformat(),
+    }
+
+
+PAYLOADS = {
+    'book': book_payload,
+    'review': review_payload,
+}
+
+
+def record(topic, action, instance):
+    return ChangeEvent.objects.create(
+        topic=topic, object_id=instance.pk, action=action, payload=PAYLOADS[topic](instance)
+    )
+
+
+def record_many(topic, changes):
+    """
+    Outbox rows for `(action, instance)` writes that send no model signals,
+    such as bulk_create, in one query.
+    """
+    return ChangeEvent.objects.bulk_create([
+        ChangeEvent(topic=topic, object_id=instance.pk, action=action, payload=PAYLOADS[topic](instance))
+        for action, instance in changes
+    ])
+
+
+def event_data(event):
+    return {
+        'event_id': event.pk,
+        'topic': event.topic,
+        'object_id': event.object_id,
+        'action': event.action,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def encode_message(event):
+    return {'event': json.dumps(event_data(event))}
+
+
+def decode_message(fields):
+    return json.loads(fields.get(b'event') or fields['event'])
+
+
+def get_stream_client():
+    import redis  # Only dispatchers and consumers talk to the stream
+
+    return redis.Redis.from_url(settings.OUTBOX_REDIS_URL)
+
+
+def dispatch_batch(client, batch_size=500):
+    """
+    Stream one batch of pending events in id order, returning how many were sent.
+    Concurrent dispatchers skip each other's locked rows instead of waiting.
+    """
+    with transaction.atomic():
+        events = list(
+            ChangeEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(settings.OUTBOX_STREAM, encode_message(event),
+                      maxlen=settings.OUTBOX_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+        ChangeEvent.objects.filter(pk__in=[event.pk for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
+
+
+def purge_dispatched(older_than):
+    """
+    Delete events dispatched before `older_than`, returning how many were deleted.
+    """
+    deleted, _ = ChangeEvent.objects.filter(dispatched_at__lt=older_than).delete()
+    return deleted
+
+
+# Consumer group name -> handler called with each event dict
+EVENT_HANDLERS = {
+    'cache-invalidation': apply_change,
+    'leaderboards': apply_leaderboard_event,
+}
+
+
+def ensure_group(client, group):
+    import redis
+
+    try:
+        client.xgroup_create(settings.OUTBOX_STREAM, group, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def consume(client, group, consumer, handler, count=100, block_ms=5000, claim_idle_ms=60000):
+    """
+    Handle one round of messages for a consumer group: first messages another
+    consumer left unacknowledged for `claim_idle_ms`, then new ones. A message
+    is acknowledged only once its handler returns, so failures are retried.
+    Returns the number of messages handled.
+    """
+    stream = settings.OUTBOX_STREAM
+    _, messages, *_ = client.xautoclaim(stream, group, consumer, min_idle_time=claim_idle_ms,
+                                        start_id='0-0', count=count)
+    if not messages:
+        for _, entries in client.xreadgroup(group, consumer, {stream: '>'}, count=count, block=block_ms) or []:
+            messages.extend(entries)
+
+    handled = 0
+    for message_id, fields in messages:
+        if not fields:  # Trimmed from the stream before it could be handled
+            client.xack(stream, group, message_id)
+            continue
+        try:
+            handler(decode_message(fields))
+        except Exception:
+            logger.exception(f"Consumer group {group} failed on message {message_id}, will retry")
+            continue
+        client.xack(stream, group, message_id)
+        handled += 1
+    return handled
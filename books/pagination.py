@@ -0,0 +1,56 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from book_review_service.pagination import EstimatedCountPagination, EstimatedCountPaginator
+
+
+REVIEW_COUNT_TIMEOUT = 60 * 60  # Safety net, counts are invalidated on review writes
+
+
+def review_count_cache_key(book_id):
+    return f"book_review_count_{book_id}"
+
+
+def invalidate_review_counts(book_ids):
+    keys = [review_count_cache_key(book_id) for book_id in book_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedCountPaginator(EstimatedCountPaginator):
+    """
+    Paginator that reads the exact count from the cache when a key is given,
+    before anything else, so a cached count costs neither an estimate nor
+    the COUNT(*) query. Estimates are not cached: they cost no more than
+    the cache read.
+    """
+    def __init__(self, object_list, per_page, count_cache_key=None, count_timeout=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    def cached_count(self):
+        return cache.get(self.count_cache_key) if self.count_cache_key is not None else None
+
+    def exact_count(self):
+        count = super().exact_count()
+        if self.count_cache_key is not None:
+            cache.set(self.count_cache_key, count, timeout=self.count_timeout)
+        return count
+
+
+class BookReviewsPagination(EstimatedCountPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        book_id = view.kwargs.get('book_id') if view is not None else None
+        if book_id is not None:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                count_cache_key=review_count_cache_key(book_id),
+                count_timeout=REVIEW_COUNT_TIMEOUT,
+            )
+        return super().paginate_queryset(queryset, request, view)
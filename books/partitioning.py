@@ -0,0 +1,256 @@
+"""
+Optional monthly range partitioning of `books_review` on Postgres.
+
+`manage.py partition_reviews` moves the table online:
+
+1. `setup` creates `books_review_partitioned`, partitioned by `created_at`,
+   with one partition per month from the oldest review up to
+   PARTITION_MONTHS_AHEAD months ahead. A trigger on `books_review`
+   mirrors every write into it from then on.
+2. `copy` copies existing rows in batches of ids, each in its own
+   transaction, while the application keeps writing to `books_review`.
+3. `swap` locks `books_review`, reconciles the two tables, and renames
+   the partitioned table into place. The old table is kept as
+   `books_review_unpartitioned` until dropped by hand.
+4. `ensure`, run daily, creates the coming months' partitions.
+
+There is deliberately no default partition. With one, Postgres cannot
+read the partitions in `created_at` order, so a page of a book's newest
+reviews would probe the index of every month; without it, the newest
+partitions are read first and the LIMIT leaves the older ones never
+executed (`partition_reviews check` shows the plan). The price is that a
+review dated past the last partition is rejected: `ensure` keeps
+PARTITION_MONTHS_AHEAD months of margin.
+
+A partitioned table's unique indexes must include the partition key, so
+the primary key becomes (id, created_at). (book, user) uniqueness is kept
+by `books_review_key`, maintained by a trigger. ON CONFLICT cannot name
+(book, user) any more, so `upsert_reviews` replaces the batch upsert.
+
+Workers remember whether the table is partitioned. One that has not
+noticed a `swap` gets an error from ON CONFLICT, looks again with
+`reviews_partitioned(refresh=True)` and retries. On SQLite, or before the
+swap, everything uses the plain table.
+"""
+from datetime import date, datetime, time
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Review
+
+TABLE = 'books_review'
+STAGING = 'books_review_partitioned'
+RETIRED = 'books_review_unpartitioned'
+GUARD = 'books_review_key'
+SEQUENCE = 'books_review_partitioned_id_seq'
+PARTITION_MONTHS_AHEAD = 3
+BOOK_CREATED_INDEX = 'books_review_book_created_idx'  # Named in Review.Meta, moved across on swap
+
+_partitioned = {}
+
+
+def reviews_partitioned(using='default', refresh=False):
+    """
+    Whether `books_review` is the partitioned table, checked once per process
+    unless `refresh` is set.
+    """
+    if refresh or using not in _partitioned:
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            _partitioned[using] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLE]
+                )
+                _partitioned[using] = cursor.fetchone()[0]
+    return _partitioned[using]
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"books_review_p{month:%Y%m}"
+
+
+def month_bounds(month):
+    """
+    Aware datetimes `[start, end)` of a month in the current time zone.
+    """
+    return (timezone.make_aware(datetime.combine(month, time.min)),
+            timezone.make_aware(datetime.combine(add_months(month, 1), time.min)))
+
+
+def upsert_reviews(reviews, update_fields):
+    """
+    `bulk_create(update_conflicts=True, unique_fields=['book', 'user'])` for
+    the partitioned table: reviews already stored for their (book, user)
+    are updated in one statement and the others inserted in another. Run
+    it in a transaction; a concurrent insert of the same (book, user) is
+    rejected by the guard table as an IntegrityError.
+    """
+    stored = {
+        (book_id, user_id): pk for pk, book_id, user_id in Review.objects.filter(
+            book_id__in={review.book_id for review in reviews}, user_id__in={review.user_id for review in reviews}
+        ).values_list('pk', 'book_id', 'user_id')
+    }
+    existing, new = [], []
+    for review in reviews:
+        review.pk = stored.get((review.book_id, review.user_id))
+        (existing if review.pk else new).append(review)
+    Review.objects.bulk_update(existing, update_fields)
+    Review.objects.bulk_create(new)
+    return reviews
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def _partition_table(cursor):
+    """
+    The partitioned reviews table: `books_review` once swapped, else the staging table.
+    """
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLE])
+    return TABLE if cursor.fetchone()[0] else STAGING
+
+
+def setup(using='default'):
+    """
+    Create the partitioned staging table, its partitions, the (book, user)
+    guard and the mirroring trigger. Returns the partitions created.
+    """
+    user_table = Review._meta.get_field('user').related_model._meta.db_table
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        if _table_exists(cursor, STAGING):
+            raise ValueError(f"{STAGING} already exists; run `copy`, or drop it to start over.")
+        cursor.execute(f"""
+            CREATE TABLE {STAGING} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY RANGE (created_at);
+            CREATE SEQUENCE {SEQUENCE} OWNED BY {STAGING}.id;
+            ALTER TABLE {STAGING} ADD PRIMARY KEY (id, created_at);
+            ALTER TABLE {STAGING} ADD CONSTRAINT {STAGING}_book_fk FOREIGN KEY (book_id)
+                REFERENCES books_book (id) DEFERRABLE INITIALLY DEFERRED;
+            ALTER TABLE {STAGING} ADD CONSTRAINT {STAGING}_user_fk FOREIGN KEY (user_id)
+                REFERENCES {user_table} (id) DEFERRABLE INITIALLY DEFERRED;
+
+            CREATE TABLE {GUARD} (book_id bigint NOT NULL, user_id bigint NOT NULL, PRIMARY KEY (book_id, user_id));
+            CREATE FUNCTION {GUARD}_sync() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {GUARD} WHERE book_id = OLD.book_id AND user_id = OLD.user_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {GUARD} (book_id, user_id) VALUES (NEW.book_id, NEW.user_id);
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql;
+            CREATE TRIGGER {GUARD}_sync AFTER INSERT OR DELETE OR UPDATE OF book_id, user_id ON {STAGING}
+                FOR EACH ROW EXECUTE FUNCTION {GUARD}_sync();
+
+            CREATE FUNCTION {STAGING}_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {STAGING} WHERE id = OLD.id AND created_at = OLD.created_at;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {STAGING} SELECT NEW.*;
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute(f"CREATE INDEX {BOOK_CREATED_INDEX}_partitioned ON {STAGING} (book_id, created_at)")
+        cursor.execute(f"CREATE INDEX books_review_partitioned_user_idx ON {STAGING} (user_id)")
+
+        cursor.execute(f"SELECT min(created_at) FROM {TABLE}")
+        oldest = cursor.fetchone()[0] or timezone.now()
+        created = ensure_partitions(cursor, STAGING, month_start(timezone.localtime(oldest).date()))
+        cursor.execute(f"CREATE TRIGGER {STAGING}_mirror AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+                       f"FOR EACH ROW EXECUTE FUNCTION {STAGING}_mirror()")
+    return created
+
+
+def copy_batch(after_id, batch_size, using='default'):
+    """
+    Copy the reviews with ids in `(after_id, after_id + batch_size]` that the
+    mirror trigger has not written yet. Returns the rows inserted.
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {STAGING} SELECT * FROM {TABLE} WHERE id > %s AND id <= %s ON CONFLICT DO NOTHING",
+            [after_id, after_id + batch_size],
+        )
+        return cursor.rowcount
+
+
+def id_range(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT coalesce(min(id), 0), coalesce(max(id), 0) FROM {TABLE}")
+        return cursor.fetchone()
+
+
+def swap(using='default'):
+    """
+    Reconcile and rename the partitioned table into place, under an
+    exclusive lock held for the reconciliation only. Returns the rows fixed.
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        # A row deleted while a copy batch was reading it can have been copied after the mirror deleted it
+        cursor.execute(f"DELETE FROM {STAGING} p WHERE NOT EXISTS (SELECT 1 FROM {TABLE} r WHERE r.id = p.id)")
+        fixed = cursor.rowcount
+        cursor.execute(f"INSERT INTO {STAGING} SELECT * FROM {TABLE} r "
+                       f"WHERE NOT EXISTS (SELECT 1 FROM {STAGING} p WHERE p.id = r.id)")
+        fixed += cursor.rowcount
+        cursor.execute(f"""
+            SELECT setval('{SEQUENCE}', greatest(
+                (SELECT coalesce(max(id), 0) FROM {TABLE}),
+                (SELECT last_value FROM {SEQUENCE}),
+                1
+            ));
+            ALTER TABLE {STAGING} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}');
+            DROP TRIGGER {STAGING}_mirror ON {TABLE};
+            DROP FUNCTION {STAGING}_mirror();
+            ALTER TABLE {TABLE} RENAME TO {RETIRED};
+            ALTER TABLE {STAGING} RENAME TO {TABLE};
+        """)
+        cursor.execute(f"ALTER INDEX IF EXISTS {BOOK_CREATED_INDEX} RENAME TO {BOOK_CREATED_INDEX}_unpartitioned")
+        cursor.execute(f"ALTER INDEX {BOOK_CREATED_INDEX}_partitioned RENAME TO {BOOK_CREATED_INDEX}")
+    _partitioned.pop(using, None)
+    return fixed
+
+
+def ensure_partitions(cursor, table=None, first_month=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create the missing monthly partitions from `first_month` (default: this
+    month) to `months_ahead` months ahead. Returns their names.
+    """
+    table = table or _partition_table(cursor)
+    this_month = month_start(timezone.localdate())
+    month, last = first_month or this_month, add_months(this_month, months_ahead)
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        if not _table_exists(cursor, name):
+            _create_partition(cursor, table, name, *month_bounds(month))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def _create_partition(cursor, table, name, start, end):
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", [start, end])
+
+
+def ensure(using='default'):
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        return ensure_partitions(cursor)
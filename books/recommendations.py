@@ -0,0 +1,356 @@
+"""
+Item-item recommendations from co-ratings.
+
+Ratings are centred on each reader's mean, so a book counts as liked
+relative to how its reader usually rates (adjusted cosine). The similarity
+of two books is the cosine of their centred rating columns, shrunk towards
+zero when few readers rated both. `build_recommendations` computes every
+book's nearest neighbours with sparse matrix products over column blocks
+sized to a memory budget, and stores them in BookNeighbors. Requests only
+read those lists, through a per-book or per-user cache entry of scores
+that rebuilds replace. The books named are read through a per-book
+summary cached under the generation, which book writes replace.
+
+NumPy and SciPy are imported by the batch job only.
+"""
+import logging
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_keys import current_generation
+from .models import Book, BookNeighbors, ChangeEvent, Review
+
+logger = logging.getLogger(__name__)
+
+
+STORED_NEIGHBORS = 50
+MAX_RESULTS = 50
+DEFAULT_SHRINKAGE = 10.0  # Co-raters at which a similarity keeps half its value
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+MAX_PROFILE_REVIEWS = 100  # Most recent reviews a user's recommendations are based on
+RECOMMENDATION_CACHE_TIMEOUT = 60 * 60
+WATERMARK_DELAY = timedelta(seconds=60)  # Leaves time for slower transactions to commit their events
+VERSION_CACHE_KEY = 'recommendations_version'
+WATERMARK_CACHE_KEY = 'recommendations_event_watermark'
+
+
+def load_ratings(chunk_size=100_000):
+    """
+    All `(user ids, book ids, ratings)` as NumPy arrays, streamed from the
+    database so memory stays at 17 bytes per review.
+    """
+    import numpy as np
+
+    users, books, ratings = array('q'), array('q'), array('b')
+    rows = Review.objects.order_by().values_list('user_id', 'book_id', 'rating').iterator(chunk_size=chunk_size)
+    for user_id, book_id, rating in rows:
+        users.append(user_id)
+        books.append(book_id)
+        ratings.append(rating)
+    return (np.frombuffer(users, dtype=np.int64), np.frombuffer(books, dtype=np.int64),
+            np.frombuffer(ratings, dtype=np.int8))
+
+
+class CoRatingMatrix:
+    def __init__(self, user_ids, book_ids, ratings, shrinkage=DEFAULT_SHRINKAGE):
+        import numpy as np
+        from scipy import sparse
+
+        self.shrinkage = shrinkage
+        self.book_ids, book_index = np.unique(book_ids, return_inverse=True)
+        users, user_index = np.unique(user_ids, return_inverse=True)
+        shape = (len(users), len(self.book_ids))
+
+        ratings = ratings.astype(np.float64)
+        means = np.bincount(user_index, weights=ratings) / np.bincount(user_index)
+        centred = ratings - means[user_index]
+        norms = np.sqrt(np.bincount(book_index, weights=centred ** 2, minlength=shape[1]))
+        norms[norms == 0] = 1
+        centred = (centred / norms[book_index]).astype(np.float32)
+
+        # users x books, and its transpose whose row blocks start each product
+        self.ratings = sparse.csr_matrix((centred, (user_index, book_index)), shape=shape)
+        self.ratings_t = self.ratings.T.tocsr()
+        if shrinkage:
+            self.rated = sparse.csr_matrix((np.ones_like(centred), (user_index, book_index)), shape=shape)
+            self.rated_t = self.rated.T.tocsr()
+
+    @property
+    def book_count(self):
+        return len(self.book_ids)
+
+    def indices(self, book_ids):
+        """
+        Matrix indices of the given books, skipping books nobody rated.
+        """
+        import numpy as np
+
+        book_ids = np.asarray(sorted(book_id for book_id in book_ids if book_id is not None), dtype=np.int64)
+        positions = np.searchsorted(self.book_ids, book_ids)
+        positions = positions[positions < self.book_count]
+        return positions[np.isin(self.book_ids[positions], book_ids)]
+
+    def similarities(self, indices, memory_bytes=DEFAULT_MEMORY_BYTES):
+        """
+        Yield `(indices, similarities)` blocks: a sparse CSR matrix with one
+        row per book of the block, holding its positive similarities to every
+        other book. A row takes at most 8 bytes per book and about four such
+        matrices are alive at once, which sets the block size.
+        """
+        block = max(1, memory_bytes // (4 * 8 * max(self.book_count, 1)))
+        for start in range(0, len(indices), block):
+            chunk = indices[start:start + block]
+            sims = self.ratings_t[chunk] @ self.ratings
+            if self.shrinkage:
+                co_rated = self.rated_t[chunk] @ self.rated
+                co_rated.data /= co_rated.data + self.shrinkage
+                sims = sims.multiply(co_rated).tocsr()
+                del co_rated
+            sims = sims.tocoo()
+            keep = (sims.data > 0) & (chunk[sims.row] != sims.col)  # Positive, and not the book itself
+            sims.data, sims.row, sims.col = sims.data[keep], sims.row[keep], sims.col[keep]
+            yield chunk, sims.tocsr()
+
+    def top_neighbors(self, indices, sims, count):
+        """
+        `{book id: [[book id, similarity], ...]}` of each row's most similar books.
+        """
+        import numpy as np
+
+        lengths = np.diff(sims.indptr)
+        rows = np.repeat(np.arange(len(indices)), lengths)
+        order = np.lexsort((sims.indices, -sims.data, rows))  # By row, most similar (then lowest id) first
+        rank = np.arange(len(order)) - sims.indptr[rows[order]]
+        order = order[rank < count]
+
+        result = {int(self.book_ids[index]): [] for index in indices}
+        for row, col, score in zip(rows[order], sims.indices[order], sims.data[order]):
+            result[int(self.book_ids[indices[row]])].append([int(self.book_ids[col]), round(float(score), 4)])
+        return result
+
+
+def compute_neighbors(matrix, count=STORED_NEIGHBORS, memory_bytes=DEFAULT_MEMORY_BYTES):
+    import numpy as np
+
+    neighbors = {}
+    for indices, sims in matrix.similarities(np.arange(matrix.book_count), memory_bytes):
+        neighbors.update(matrix.top_neighbors(indices, sims, count))
+    return neighbors
+
+
+def update_neighbors(matrix, dirty, load_stored, count=STORED_NEIGHBORS, memory_bytes=DEFAULT_MEMORY_BYTES):
+    """
+    Lists changed since the stored ones were computed, given the `dirty`
+    books whose rating columns changed. Dirty books get fresh lists; in
+    every other list their entries are replaced by their new similarity. A
+    list that lost entries is not refilled from books outside it, which the
+    next full build corrects.
+
+    `load_stored(book_ids)` returns `{book id: stored list}`, and is only
+    asked for the books a block of dirty rows has a similarity with. No
+    other list can hold a dirty book: a book sharing no reader with it had
+    no similarity to it, and a book whose co-readers changed a rating is
+    dirty itself, so a clean book keeps the sign of its similarity to it.
+    """
+    import numpy as np
+
+    dirty = set(dirty)
+    changed = {}
+    for indices, sims in matrix.similarities(matrix.indices(dirty), memory_bytes):
+        changed.update(matrix.top_neighbors(indices, sims, count))
+        # Similarity is symmetric: row d, column j is also book j's similarity to d
+        sims = sims.tocoo()
+        touched = {int(book_id) for book_id in matrix.book_ids[np.unique(sims.col)]} - dirty - changed.keys()
+        stored = load_stored(touched) if touched else {}
+        for book_id in touched:
+            changed[book_id] = [item for item in stored.get(book_id, []) if item[0] not in dirty]
+        for row, col, score in zip(sims.row, sims.col, sims.data):
+            book_id = int(matrix.book_ids[col])
+            if book_id not in dirty:
+                changed[book_id].append([int(matrix.book_ids[indices[row]]), round(float(score), 4)])
+
+    for book_id, items in changed.items():
+        if book_id not in dirty:
+            items.sort(key=lambda item: (-item[1], item[0]))
+            del items[count:]
+    # Books whose reviews were all deleted have no row left
+    changed.update({book_id: [] for book_id in dirty if book_id not in changed})
+    return changed
+
+
+def load_neighbors(book_ids, batch_size=1000):
+    """
+    The stored lists of `book_ids`, read `batch_size` books at a time.
+    """
+    book_ids = list(book_ids)
+    stored = {}
+    for start in range(0, len(book_ids), batch_size):
+        stored.update(BookNeighbors.objects.filter(book_id__in=book_ids[start:start + batch_size])
+                      .values_list('book_id', 'neighbors'))
+    return stored
+
+
+def save_neighbors(neighbors, batch_size=1000):
+    book_ids = list(neighbors)
+    for start in range(0, len(book_ids), batch_size):
+        batch = book_ids[start:start + batch_size]
+        existing = set(Book.objects.filter(pk__in=batch).values_list('pk', flat=True))
+        BookNeighbors.objects.bulk_create(
+            [BookNeighbors(book_id=book_id, neighbors=neighbors[book_id]) for book_id in batch if book_id in existing],
+            update_conflicts=True,
+            unique_fields=['book'],
+            update_fields=['neighbors', 'computed_at'],
+        )
+
+
+def build_recommendations(full=False, count=STORED_NEIGHBORS, memory_bytes=DEFAULT_MEMORY_BYTES,
+                          shrinkage=DEFAULT_SHRINKAGE):
+    """
+    Rebuild the stored neighbour lists, only for books whose rating columns
+    changed since the last build unless `full` or no build is known. Returns
+    `(mode, lists written)`.
+    """
+    import numpy as np
+
+    watermark = cache.get(WATERMARK_CACHE_KEY)
+    last_event = ChangeEvent.objects.filter(
+        created_at__lte=timezone.now() - WATERMARK_DELAY
+    ).order_by('-id').values_list('id', flat=True).first() or 0
+
+    started = timezone.now()
+    user_ids, book_ids, ratings = load_ratings()
+    matrix = CoRatingMatrix(user_ids, book_ids, ratings, shrinkage=shrinkage)
+    if full or watermark is None:
+        mode = 'full'
+        neighbors = compute_neighbors(matrix, count, memory_bytes)
+        save_neighbors(neighbors)
+        BookNeighbors.objects.filter(computed_at__lt=started).delete()  # Books no longer reviewed
+    else:
+        mode = 'incremental'
+        dirty, reviewers = set(), set()
+        events = ChangeEvent.objects.filter(topic='review', id__gt=watermark)
+        for book_id, user_id in events.values_list('payload__book_id', 'payload__user_id'):
+            dirty.add(book_id)
+            reviewers.add(user_id)
+        # A new rating moves its reader's mean, and so every book that reader rated
+        dirty.update(book_ids[np.isin(user_ids, list(reviewers))].tolist())
+        neighbors = update_neighbors(matrix, dirty, load_neighbors, count, memory_bytes)
+        save_neighbors(neighbors)
+
+    cache.set(WATERMARK_CACHE_KEY, max(last_event, watermark or 0), timeout=None)
+    bump_version()
+    logger.info(f"Recommendations {mode} build: {len(neighbors)} neighbour lists written")
+    return mode, len(neighbors)
+
+
+def recommendations_version():
+    return cache.get_or_set(VERSION_CACHE_KEY, 1, timeout=None)
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 2, timeout=None)
+
+
+def similar_books_cache_key(book_id):
+    return f"book_similar_{book_id}"
+
+
+def user_recommendations_cache_key(user_id):
+    return f"user_recommendations_{user_id}"
+
+
+def invalidate_user_recommendations(user_ids):
+    keys = [user_recommendations_cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def book_summary_cache_key(book_id, generation):
+    return f"book_summary_g{generation}_{book_id}"
+
+
+def _cached(key, compute):
+    """
+    A list of `(book id, score)` cached with the recommendations version it
+    was computed for, so rebuilds replace it without deletes. Book writes
+    leave it alone: the books are read with `_book_summaries`.
+    """
+    version = recommendations_version()
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    value = compute()
+    cache.set(key, (version, value), RECOMMENDATION_CACHE_TIMEOUT)
+    return value
+
+
+def _book_summaries(book_ids):
+    """
+    `{book id: serialized book}` of the books in `book_ids` that exist,
+    cached per book under the generation, so a book write refreshes books
+    without recomputing anyone's scores.
+    """
+    from .serializers import BookSerializer
+
+    generation = current_generation()
+    keys = {book_id: book_summary_cache_key(book_id, generation) for book_id in book_ids}
+    cached = cache.get_many(list(keys.values()))
+    summaries = {book_id: cached[key] for book_id, key in keys.items() if key in cached}
+    missing = [book_id for book_id in book_ids if book_id not in summaries]
+    if missing:
+        books = Book.objects.select_related('author').in_bulk(missing)
+        fetched = {book_id: BookSerializer(books[book_id]).data if book_id in books else False for book_id in missing}
+        cache.set_many({keys[book_id]: summary for book_id, summary in fetched.items()}, RECOMMENDATION_CACHE_TIMEOUT)
+        summaries.update(fetched)
+    return {book_id: summary for book_id, summary in summaries.items() if summary is not False}
+
+
+def _with_books(scored, summaries):
+    return [{**summaries[book_id], 'score': score} for book_id, score in scored if book_id in summaries]
+
+
+def similar_books(book_id):
+    """
+    The books most similar to a book, or None when the book does not exist.
+    """
+    def compute():
+        neighbors = BookNeighbors.objects.filter(book_id=book_id).values_list('neighbors', flat=True).first()
+        return [tuple(neighbor) for neighbor in (neighbors or [])[:MAX_RESULTS]]
+
+    scored = _cached(similar_books_cache_key(book_id), compute)
+    summaries = _book_summaries([book_id, *(other for other, _ in scored)])
+    if book_id not in summaries:
+        return None
+    return _with_books(scored, summaries)
+
+
+def user_recommendations(user_id):
+    """
+    Books a user has not reviewed, scored by the neighbours of the books they
+    rated above (or below) the scale's midpoint.
+    """
+    def compute():
+        profile = dict(
+            Review.objects.filter(user_id=user_id).order_by('-created_at')
+            .values_list('book_id', 'rating')[:MAX_PROFILE_REVIEWS]
+        )
+        reviewed = set(Review.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+        scores = defaultdict(float)
+        for book_id, neighbors in BookNeighbors.objects.filter(book_id__in=profile).values_list('book_id', 'neighbors'):
+            weight = profile[book_id] - 3
+            for other, similarity in neighbors:
+                if other not in reviewed:
+                    scores[other] += weight * similarity
+        ranked = sorted(((book_id, round(score, 4)) for book_id, score in scores.items() if score > 0),
+                        key=lambda item: -item[1])
+        return ranked[:MAX_RESULTS]
+
+    scored = _cached(user_recommendations_cache_key(user_id), compute)
+    return _with_books(scored, _book_summaries([book_id for book_id, _ in scored]))
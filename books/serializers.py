@@ -1,15 +1,46 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Book, Review
+from .images import process_cover, rendition_urls
+from .models import Author, Book, Review, ALLOWED_GENRES
 
-class BookSerializer(serializers.ModelSerializer):
+DUPLICATE_TITLE_MESSAGE = "A book with this title already exists."
+
+
+class SparseFieldsMixin:
+    """
+    Serializes only the fields named in `context['fields']`, when given.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get('fields')
+        if fieldset is not None:
+            for name in list(self.fields):
+                if name not in fieldset and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+
+class AuthorNameField(serializers.CharField):
+    """
+    A book's author as their name, as when it was a column of the book.
+    Written names are resolved to an Author by BookSerializer.
+    """
+    def to_representation(self, value):
+        return value.name
+
+
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     title = serializers.CharField(
         max_length=255,
         help_text="The title of the book. Must be unique and between 1-255 characters."
     )
-    author = serializers.CharField(
+    author = AuthorNameField(
         max_length=255,
         help_text="The author of the book. Must be between 1-255 characters."
     )
+    author_id = serializers.IntegerField(
+        read_only=True,
+        help_text="The author's ID, for listing their books."
+    )
     genre = serializers.CharField(
         max_length=100,
         required=False,
@@ -21,19 +52,94 @@ class BookSerializer(serializers.ModelSerializer):
         allow_blank=True,
         help_text="The URL of the book's cover image. Optional."
     )
+    cover_upload = serializers.ImageField(
+        write_only=True,
+        required=False,
+        help_text="An uploaded cover image. Takes precedence over cover_image. Optional."
+    )
+    cover_renditions = serializers.SerializerMethodField(
+        help_text="Resized cover URLs by format and width, e.g. {'webp': {'160': url}}. Filled in asynchronously."
+    )
 
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'genre', 'cover_image']
+        fields = ['id', 'title', 'author', 'author_id', 'genre', 'cover_image', 'cover_upload', 'cover_renditions']
+
+    def get_cover_renditions(self, obj):
+        return rendition_urls(obj.cover_renditions)
+
+    def create(self, validated_data):
+        upload = validated_data.pop('cover_upload', None)
+        self.resolve_author(validated_data)
+        book = super().create(validated_data)
+        self.schedule_cover(book, upload, new_url=bool(book.cover_image))
+        return book
+
+    def update(self, instance, validated_data):
+        upload = validated_data.pop('cover_upload', None)
+        previous_url = str(instance.cover_image or '')
+        self.resolve_author(validated_data)
+        book = super().update(instance, validated_data)
+        self.schedule_cover(book, upload, new_url=str(book.cover_image or '') != previous_url)
+        return book
+
+    def resolve_author(self, validated_data):
+        if 'author' in validated_data:
+            validated_data['author'] = Author.objects.for_name(validated_data['author'])
+
+    def schedule_cover(self, book, upload, new_url):
+        # Renditions are generated off the request path, once the book is committed
+        if upload is not None:
+            source = upload.read()
+        elif new_url and book.cover_image:
+            source = str(book.cover_image)
+        else:
+            return
+        transaction.on_commit(lambda: process_cover(book.pk, source))
+
+    def validate_title(self, value):
+        # Mirrors the books_book_title_normalized_unique constraint
+        duplicates = Book.objects.filter(title__iexact=value.strip())
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(DUPLICATE_TITLE_MESSAGE)
+        return value
 
     def validate_genre(self, value):
-        allowed_genres = ['Fiction', 'Non-Fiction', 'Mystery', 'Sci-Fi', 'Fantasy', 'Dystopian']
-        if value and value not in allowed_genres:
+        if value and value not in ALLOWED_GENRES:
             raise serializers.ValidationError(f"Genre '{value}' is not allowed.")
         return value
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    username = serializers.CharField(
+        source='user.username',
+        read_only=True,
+        help_text="The reviewer's username. Only returned when requested with include=username."
+    )
+
     class Meta:
         model = Review
-        fields = ['id', 'book', 'user', 'rating', 'comment', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
\ No newline at end of file
+        fields = ['id', 'book', 'user', 'username', 'rating', 'comment', 'created_at']
+        read_only_fields = ['id', 'user', 'created_at']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_username'):
+            self.fields.pop('username', None)
+
+
+MAX_REVIEW_BATCH_SIZE = 500
+
+class ReviewBatchItemSerializer(serializers.Serializer):
+    book = serializers.IntegerField(min_value=1, help_text="The ID of the book being reviewed.")
+    rating = serializers.IntegerField(min_value=1, max_value=5, help_text="Rating between 1 and 5.")
+    comment = serializers.CharField(help_text="The review text.")
+
+class ReviewBatchSerializer(serializers.Serializer):
+    reviews = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_REVIEW_BATCH_SIZE,
+        help_text=f"Up to {MAX_REVIEW_BATCH_SIZE} reviews, each with book, rating and comment."
+    )
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .facets import adjust_genre_count, adjust_rating_counts
+from .invalidation import apply_change
+from .models import Book, ChangeEvent, Review
+from .outbox import event_data, record
+
+
+@receiver(post_save, sender=Book)
+def update_genre_facets_on_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_genre_count(instance.genre, 1)
+    else:
+        # Instances never loaded from the DB have no known previous genre;
+        # `rebuild_facets` corrects any drift from those
+        previous = getattr(instance, '_loaded_genre', None)
+        if previous is not None and previous != instance.genre:
+            adjust_genre_count(previous, -1)
+            adjust_genre_count(instance.genre, 1)
+    instance._loaded_genre = instance.genre
+
+
+@receiver(post_delete, sender=Book)
+def update_genre_facets_on_delete(sender, instance, **kwargs):
+    adjust_genre_count(getattr(instance, '_loaded_genre', instance.genre), -1)
+
+
+TOPICS = {Book: 'book', Review: 'review'}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Review)
+def record_change_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:  # Fixture loading
+        return
+    event = record(TOPICS[sender], ChangeEvent.CREATED if created else ChangeEvent.UPDATED, instance)
+    apply_change(event_data(event))
+    if sender is Review:
+        adjust_rating_counts([event_data(event)])
+        instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Review)
+def record_change_on_delete(sender, instance, **kwargs):
+    event = record(TOPICS[sender], ChangeEvent.DELETED, instance)
+    apply_change(event_data(event))
+    if sender is Review:
+        adjust_rating_counts([event_data(event)])
@@ -1,3 +1,1137 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+import unittest
+from django.core.cache import cache
+from django.db import ProgrammingError, connections, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from book_review_service import schema
+from book_review_service.db_router import replica_aliases, replica_health
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache_keys import (
+    build_cache_key, bump_generation, current_generation, key_cardinality, FILTER_PARAMS,
+    GENERATION_MODIFIED_CACHE_KEY, LIST_PARAMS,
+)
+from . import autocomplete
+from .authors import resolve_authors
+from .batch import book_document_key
+from .documents import compound_document_key, document_versions
+from .facets import genre_counts, rating_counts
+from .images import CoverImageError, fetch_cover
+from . import leaderboards
+from .leaderboards import apply_event as apply_leaderboard_event, rebuild_leaderboards
+from .metadata import metadata_cache_key
+from .outbox import consume, decode_message, dispatch_batch, event_data
+from .models import Author, Book, BookNeighbors, ChangeEvent, GenreFacet, Review
+from .pagination import review_count_cache_key
+from .partitioning import add_months, month_bounds, partition_name, reviews_partitioned
+from .recommendations import CoRatingMatrix, build_recommendations, compute_neighbors, load_ratings
+from .serializers import BookSerializer
+from . import warming
+from .warming import CacheWarmer, HotKeySketch, hot_keys
+
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class CacheKeyTests(SimpleTestCase):
+    def test_equivalent_filter_queries_share_a_key(self):
+        a = build_cache_key('book_filter', {'search': '  Dune   Messiah ', 'genre': 'Sci-Fi', 'limit': '50'}, FILTER_PARAMS)
+        b = build_cache_key('book_filter', {'search': 'dune messiah', 'genre': ' Sci-Fi', 'page': '1'}, FILTER_PARAMS)
+        self.assertEqual(a, b)
+
+    def test_genre_stays_case_sensitive(self):
+        a = build_cache_key('book_filter', {'genre': 'Fiction'}, FILTER_PARAMS)
+        b = build_cache_key('book_filter', {'genre': 'fiction'}, FILTER_PARAMS)
+        self.assertNotEqual(a, b)
+
+    def test_ignored_params_and_page_format(self):
+        a = build_cache_key('book_list', {'page': '02', 'limit': '10'}, LIST_PARAMS)
+        b = build_cache_key('book_list', {'page': '2', 'limit': '99'}, LIST_PARAMS)
+        self.assertEqual(a, b)
+
+    def test_key_is_bounded_and_keeps_family_prefix(self):
+        key = build_cache_key('book_filter', {'search': 'x' * 10000}, FILTER_PARAMS)
+        self.assertTrue(key.startswith('book_filter_'))
+        self.assertLessEqual(len(key), 64)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BookFilterCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+
+    def test_equivalent_requests_hit_the_same_entry(self):
+        url = reverse('book-filter')
+        self.client.get(url, {'search': 'Dune ', 'limit': '5'})
+        self.client.get(url, {'search': 'dune', 'page': '1'})
+        self.assertEqual(key_cardinality('book_filter'), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GenreFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_book_writes(self):
+        dune = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        self.assertEqual(genre_counts()['Sci-Fi'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dune = Book.objects.get(pk=dune.pk)
+            dune.genre = 'Fantasy'
+            dune.save()
+            dune.delete()
+
+        response = self.client.get(reverse('book-facets'), {'include': 'ratings'})
+        self.assertEqual(response.data['genres']['Sci-Fi'], 0)
+        self.assertEqual(response.data['genres']['Fantasy'], 0)
+        self.assertEqual(response.data['genres']['Fiction'], 1)
+        self.assertEqual(response.data['ratings']['5'], 0)
+
+    def test_counts_never_drop_below_zero(self):
+        # Imported without signals, so the facet table never counted it
+        GenreFacet.objects.create(genre='Fiction', book_count=0)
+        Book.objects.bulk_create([Book(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')])
+        Book.objects.get(title='Emma').delete()
+        self.assertEqual(GenreFacet.objects.get(genre='Fiction').book_count, 0)
+
+    def test_rating_counts_follow_review_writes(self):
+        book = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        alice = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        review = Review.objects.create(book=book, user=alice, rating=4, comment='Good')
+        self.assertEqual(rating_counts()['4'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.get(pk=review.pk)
+            review.rating = 5
+            review.save()
+        with CaptureQueriesContext(connections['default']) as queries:
+            counts = rating_counts()
+        self.assertEqual((counts['4'], counts['5']), (0, 1))
+        self.assertFalse(any('books_review' in query['sql'] for query in queries))
+
+
+class BookTitleUniquenessTests(TestCase):
+    def test_serializer_rejects_title_differing_only_in_case(self):
+        Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        serializer = BookSerializer(data={'title': ' dune ', 'author': 'Someone Else'})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('title', serializer.errors)
+
+    def test_concurrent_duplicate_title_is_a_bad_request(self):
+        Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        emma = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        # The other writer commits between validation and insert
+        with mock.patch.object(BookSerializer, 'validate_title', lambda serializer, value: value):
+            created = self.client.post(reverse('create_book'), {'title': 'DUNE', 'author': 'Someone Else'})
+            updated = self.client.patch(reverse('book-update', kwargs={'id': emma.pk}), {'title': 'dune'},
+                                        content_type='application/json')
+        self.assertEqual((created.status_code, updated.status_code), (400, 400))
+        self.assertIn('title', created.data)
+        self.assertIn('title', updated.data)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BookReviewsListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.first = Review.objects.create(book=self.book, user=self.alice, rating=4, comment='Good')
+        self.second = Review.objects.create(book=self.book, user=self.bob, rating=5, comment='Great')
+        self.url = reverse('book-reviews-list', kwargs={'book_id': self.book.pk})
+
+    def test_newest_first_with_optional_username(self):
+        response = self.client.get(self.url, {'include': 'username'})
+        self.assertEqual([r['id'] for r in response.data['results']], [self.second.pk, self.first.pk])
+        self.assertEqual(response.data['results'][0]['username'], 'bob')
+        self.assertNotIn('username', self.client.get(self.url).data['results'][0])
+
+    def test_count_is_cached_and_invalidated_on_review_writes(self):
+        self.client.get(self.url)
+        self.assertEqual(cache.get(review_count_cache_key(self.book.pk)), 2)
+        with self.assertNumQueries(1), mock.patch('book_review_service.pagination.estimated_count') as estimate:
+            self.client.get(self.url)
+        estimate.assert_not_called()  # A cached count needs no EXPLAIN either
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertIsNone(cache.get(review_count_cache_key(self.book.pk)))
+        self.assertEqual(self.client.get(self.url).data['count'], 1)
+
+    def test_missing_book_returns_empty_page(self):
+        response = self.client.get(reverse('book-reviews-list', kwargs={'book_id': 999}))
+        self.assertEqual(response.data['count'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReviewBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.dune = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        self.emma = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        Review.objects.create(book=self.dune, user=self.user, rating=2, comment='Meh')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upserts_valid_items_and_reports_each_one(self):
+        payload = {'reviews': [
+            {'book': self.dune.pk, 'rating': 5, 'comment': 'Better on re-read'},
+            {'book': self.emma.pk, 'rating': 4, 'comment': 'Charming'},
+            {'book': 999, 'rating': 3, 'comment': 'Lost'},
+            {'book': self.emma.pk, 'rating': 9, 'comment': 'Too high'},
+        ]}
+        with self.assertNumQueries(7):  # books IN, savepoint, existing reviews, upsert, outbox, rating facets, release
+            response = self.client.post(reverse('review-batch'), payload, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'created', 'error', 'error'])
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (1, 1, 2))
+        self.assertGreater(response.data['reviews_per_second'], 0)
+        self.assertEqual(Review.objects.get(book=self.dune, user=self.user).rating, 5)
+        self.assertEqual(Review.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            sorted(ChangeEvent.objects.filter(topic='review').values_list('action', flat=True)),
+            ['created', 'created', 'updated'],  # setUp's review, then the batch
+        )
+
+    def test_partitioned_table_upserts_without_on_conflict(self):
+        payload = {'reviews': [
+            {'book': self.dune.pk, 'rating': 5, 'comment': 'Better on re-read'},
+            {'book': self.emma.pk, 'rating': 4, 'comment': 'Charming'},
+        ]}
+        with mock.patch('books.views.reviews_partitioned', return_value=True), \
+                CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.post(reverse('review-batch'), payload, format='json')
+
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'created'])
+        self.assertFalse(any('ON CONFLICT' in query['sql'] for query in queries))
+        self.assertEqual(Review.objects.get(book=self.dune, user=self.user).comment, 'Better on re-read')
+        self.assertEqual(Review.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            sorted(ChangeEvent.objects.filter(topic='review').values_list('action', flat=True)),
+            ['created', 'created', 'updated'],
+        )
+
+    def test_worker_that_missed_the_swap_retries_without_on_conflict(self):
+        bulk_create = QuerySet.bulk_create
+
+        def partitioned_bulk_create(queryset, objs, *args, **kwargs):
+            if kwargs.get('update_conflicts'):
+                raise ProgrammingError("there is no unique or exclusion constraint matching the ON CONFLICT "
+                                       "specification")
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        payload = {'reviews': [{'book': self.emma.pk, 'rating': 4, 'comment': 'Charming'}]}
+        with mock.patch.object(QuerySet, 'bulk_create', partitioned_bulk_create), \
+                mock.patch('books.views.reviews_partitioned', side_effect=[False, False, True, True]) as partitioned:
+            response = self.client.post(reverse('review-batch'), payload, format='json')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertIn(mock.call(refresh=True), partitioned.call_args_list)
+        self.assertEqual(ChangeEvent.objects.filter(topic='review', action='created').count(), 2)
+
+
+class ReviewPartitioningTests(TestCase):
+    def test_month_helpers(self):
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(partition_name(date(2025, 2, 1)), 'books_review_p202502')
+        start, end = month_bounds(date(2024, 12, 1))
+        self.assertEqual((start.date(), end.date()), (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_sqlite_is_left_unpartitioned(self):
+        self.assertFalse(reviews_partitioned())
+        out = io.StringIO()
+        call_command('partition_reviews', 'setup', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHE, COVER_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class CoverRenditionTests(TestCase):
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 1800), 'navy').save(buffer, 'PNG')
+        return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+    def test_uploaded_cover_gets_content_addressed_renditions(self):
+        data = {'title': 'Dune', 'author': 'Frank Herbert', 'cover_upload': self.upload()}
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer = BookSerializer(data=data)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            book = serializer.save()
+
+        book.refresh_from_db()
+        self.assertEqual(len(book.cover_hash), 64)
+        # Attached through the model, so cached documents and ETags move on
+        self.assertTrue(ChangeEvent.objects.filter(topic='book', object_id=book.pk, action=ChangeEvent.UPDATED).exists())
+        self.assertEqual(book.cover_renditions['webp']['160'], f"book_covers/{book.cover_hash[:2]}/{book.cover_hash}/160.webp")
+
+        renditions = BookSerializer(book).data['cover_renditions']
+        response = self.client.get(renditions['jpeg']['480'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).width, 480)
+
+    def test_cover_urls_on_internal_addresses_are_refused(self):
+        for url in ['http://169.254.169.254/latest/meta-data/', 'http://127.0.0.1:6379/', 'http://[::1]/',
+                    'http://10.0.0.5/cover.png', 'file:///etc/passwd']:
+            with self.assertRaises(CoverImageError):
+                fetch_cover(url)
+
+
+class FileServingTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.media_root = os.path.join(self.root, 'media')
+        self.static_root = os.path.join(self.root, 'static')
+        os.makedirs(self.media_root)
+        os.makedirs(self.static_root)
+        with open(os.path.join(self.media_root, 'data.bin'), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        with open(os.path.join(self.static_root, 'app.js'), 'wb') as f:
+            f.write(b'console.log(1);' * 100)
+        with open(os.path.join(self.static_root, 'app.js.gz'), 'wb') as f:
+            f.write(gzip.compress(b'console.log(1);' * 100))
+
+    def test_media_byte_ranges(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get('/media/data.bin', HTTP_RANGE='bytes=10-19')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+            self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+            self.assertEqual(self.client.get('/media/data.bin', HTTP_RANGE='bytes=5000-').status_code, 416)
+            self.assertEqual(self.client.get('/media/../secret').status_code, 404)
+
+    def test_static_prefers_precompressed_variant(self):
+        with self.settings(STATIC_ROOT=self.static_root):
+            response = self.client.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'console.log(1);' * 100)
+
+            identity = self.client.get('/static/app.js')
+            self.assertFalse(identity.has_header('Content-Encoding'))
+            self.assertEqual(self.client.get('/static/app.js', HTTP_IF_NONE_MATCH=identity['ETag']).status_code, 304)
+
+
+class PrecomputedSchemaTests(TestCase):
+    def setUp(self):
+        settings_override = override_settings(OPENAPI_SCHEMA_DIR=tempfile.mkdtemp())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.reset_schemas()
+        self.addCleanup(schema.reset_schemas)
+
+    def test_schema_is_generated_once_and_revalidated_by_etag(self):
+        with mock.patch.object(schema, 'render_schema', wraps=schema.render_schema) as render:
+            first = self.client.get('/swagger.json')
+            second = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.json()['swagger'], '2.0')
+        self.assertEqual(second.status_code, 304)
+
+    def test_build_time_file_is_served_as_is(self):
+        schema.write_schemas()
+        with mock.patch.object(schema, 'render_schema') as render:
+            response = self.client.get('/swagger.yaml')
+        render.assert_not_called()
+        self.assertEqual(response.content, schema.schema_path('.yaml').read_bytes())
+
+
+@unittest.skipUnless(replica_aliases(), "Run with DATABASE_REPLICAS=/tmp/replica.db (SQLite) to test replica routing")
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReplicaRoutingTests(TestCase):
+    """
+    The replica is a second, separate SQLite database that never receives the
+    primary's rows, so which alias served a read is visible in the results.
+    """
+    databases = {'default', *replica_aliases()}
+
+    def setUp(self):
+        cache.clear()
+        replica_health.reset()
+        self.addCleanup(replica_health.reset)
+        self.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        cache.set(GENERATION_MODIFIED_CACHE_KEY, time.time() - 60, timeout=None)  # Replicas have caught up
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def list_count(self):
+        cache.delete(build_cache_key('book_list', {}, LIST_PARAMS, current_generation()))  # Make the list query really run
+        return self.client.get(reverse('list-books')).data['count']
+
+    def test_reads_use_replica_until_the_user_writes(self):
+        self.assertEqual(self.list_count(), 0)  # Served by the (empty) replica
+
+        response = self.client.post(reverse('create_book'), {'title': 'Emma', 'author': 'Jane Austen'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        with CaptureQueriesContext(connections['replica_1']) as replica:
+            self.assertEqual(self.list_count(), 2)  # Pinned to the primary
+        self.assertEqual(len(replica), 0)
+
+    def test_cache_fills_just_after_a_write_read_the_primary(self):
+        bump_generation()  # Another user's write, which this one is not pinned by
+        with CaptureQueriesContext(connections['replica_1']) as replica:
+            self.assertEqual(self.list_count(), 1)
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(self.client.get(reverse('book-document', kwargs={'id': Book.objects.get().pk})).status_code,
+                         200)  # Versions seeded just now: the replica may not have the book yet
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with mock.patch.object(replica_health, 'check', return_value=(False, 60.0, None)):
+            self.assertEqual(self.list_count(), 1)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(Book.objects.all().db, 'default')
+
+    def test_slow_health_check_does_not_block_other_threads(self):
+        started, release = threading.Event(), threading.Event()
+
+        def hanging_check(alias):
+            started.set()
+            release.wait(5)
+            return False, None, 'timeout'
+
+        with mock.patch.object(replica_health, 'check', hanging_check):
+            checker = threading.Thread(target=replica_health.is_healthy, args=['replica_1'])
+            checker.start()
+            started.wait(5)
+            began = time.monotonic()
+            self.assertTrue(replica_health.is_healthy('replica_1'))  # Last known result while checking
+            self.assertLess(time.monotonic() - began, 1)
+            release.set()
+            checker.join()
+        self.assertFalse(replica_health.is_healthy('replica_1'))
+
+
+class FakeStream:
+    """
+    The slice of the Redis stream commands the outbox uses, for one consumer group.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.delivered = 0
+        self.pending = {}
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def execute(self):
+        pass
+
+    def xadd(self, stream, fields, **kwargs):
+        message_id = f"{len(self.entries) + 1}-0"
+        self.entries.append((message_id, {key.encode(): value.encode() for key, value in fields.items()}))
+        return message_id
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id, count):
+        return ['0-0', list(self.pending.items())[:count], []]
+
+    def xreadgroup(self, group, consumer, streams, count, block):
+        new = self.entries[self.delivered:self.delivered + count]
+        self.delivered += len(new)
+        self.pending.update(new)
+        return [(b'stream', new)] if new else []
+
+    def xack(self, stream, group, message_id):
+        self.pending.pop(message_id, None)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ChangeEventOutboxTests(TestCase):
+    def test_events_commit_and_roll_back_with_the_write(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+            raise RuntimeError
+        self.assertFalse(ChangeEvent.objects.exists())
+
+        book = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        book.delete()
+        self.assertEqual(
+            list(ChangeEvent.objects.values_list('topic', 'action', 'payload__title')),
+            [('book', 'created', 'Emma'), ('book', 'deleted', 'Emma')],
+        )
+
+    def test_book_write_invalidates_cached_lists(self):
+        cache.clear()
+        generation = current_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        self.assertEqual(current_generation(), generation + 1)
+
+        cache.clear()  # A Redis flush or restart
+        self.assertGreater(current_generation(), generation + 1)
+
+    def test_dispatch_is_at_least_once_and_consumers_ack(self):
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        book = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        Review.objects.create(book=book, user=user, rating=4, comment='Good')
+        stream = FakeStream()
+
+        with mock.patch.object(stream, 'execute', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                dispatch_batch(stream)
+        self.assertEqual(ChangeEvent.objects.filter(dispatched_at__isnull=True).count(), 2)
+
+        self.assertEqual(dispatch_batch(stream, batch_size=1), 1)
+        self.assertEqual(dispatch_batch(stream), 1)
+        self.assertEqual(dispatch_batch(stream), 0)
+        # The failed attempt's messages were added too: duplicates, never gaps
+        topics = [decode_message(fields)['topic'] for _, fields in stream.entries]
+        self.assertEqual(topics, ['book', 'review', 'book', 'review'])
+
+        calls = []
+
+        def handler(event):
+            calls.append(event['event_id'])
+            if len(calls) == 1:
+                raise ValueError
+        self.assertEqual(consume(stream, 'search', 'worker-1', handler), 3)
+        self.assertEqual(len(stream.pending), 1)  # The failed message stays pending
+        self.assertEqual(consume(stream, 'search', 'worker-1', handler), 1)
+        self.assertEqual(stream.pending, {})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CacheWarmingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        warming._sketch.counts.clear()  # Hits recorded by other tests
+
+    def test_sketch_keeps_frequent_keys_in_bounded_memory(self):
+        sketch = HotKeySketch(capacity=2)
+        for spec in ['a'] * 5 + ['b'] * 2 + ['c', 'a']:
+            sketch.add(spec)
+        self.assertEqual(sketch.counts, {'a': 6, 'c': 3})
+
+    @mock.patch('books.warming.FLUSH_INTERVAL', 0)
+    def test_hot_list_page_is_refilled_after_invalidation(self):
+        Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        self.client.get(reverse('list-books'), {'page': '1'})
+        self.assertEqual(hot_keys(10), [('book_list', {'page': '1'}, 1)])
+
+        warmer = CacheWarmer(concurrency=1, rate=0)
+        self.assertEqual(warmer.run_once(), (1, 0))
+        self.assertEqual(warmer.run_once(), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        key = build_cache_key('book_list', {'page': '1'}, LIST_PARAMS, current_generation())
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(warmer.run_once(), (1, 0))
+        self.assertEqual(cache.get(key)['count'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, API_COMPRESS_MIN_SIZE=512)
+class ConditionalCompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.for_name('Some Author')
+        Book.objects.bulk_create([Book(title=f'Book {i}', author=author, genre='Fiction') for i in range(10)])
+
+    def test_unchanged_list_is_answered_with_304_without_queries(self):
+        response = self.client.get(reverse('list-books'))
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('list-books'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        response = self.client.get(reverse('list-books'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_book_detail_etag_follows_updated_at_and_metadata(self):
+        book = Book.objects.first()
+        url = reverse('book-detail', args=[book.pk])
+        with mock.patch('books.views.BookDetailView.fetch_google_books_metadata', return_value={'error': 'Timeout'}):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Metadata that stopped failing is a new representation, though the book did not change
+        with mock.patch('books.views.BookDetailView.fetch_google_books_metadata', return_value={'publisher': 'Ace'}):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            book.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_is_compressed_and_variant_cached(self):
+        plain = self.client.get(reverse('list-books'))
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(reverse('list-books'), HTTP_ACCEPT_ENCODING='gzip;q=1.0, identity')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        key = build_cache_key('book_list', {}, LIST_PARAMS, current_generation())
+        self.assertIsNotNone(cache.get(f"{key}_gzip"))
+
+
+@unittest.skipIf(importlib.util.find_spec('scipy') is None, "NumPy/SciPy not installed")
+@override_settings(CACHES=LOCMEM_CACHE)
+@mock.patch('books.recommendations.WATERMARK_DELAY', timedelta(0))
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(4)]
+        author = Author.objects.for_name('A')
+        self.books = {title: Book.objects.create(title=title, author=author, genre='Fiction') for title in 'ABCD'}
+        ratings = {0: 'A5 B5 C1', 1: 'A4 B5 C2 D3', 2: 'A5 B4 D1', 3: 'A5 C1'}
+        for user, reviews in ratings.items():
+            for review in reviews.split():
+                Review.objects.create(user=self.users[user], book=self.books[review[0]], rating=int(review[1]), comment='')
+
+    def ids(self, results):
+        return [result['id'] for result in results]
+
+    def test_similar_books_and_user_recommendations(self):
+        self.assertEqual(build_recommendations(), ('full', 4))
+        response = self.client.get(reverse('book-similar', args=[self.books['A'].pk]))
+        self.assertEqual(self.ids(response.data['results'])[0], self.books['B'].pk)
+        self.assertEqual(self.client.get(reverse('book-similar', args=[999])).status_code, 404)
+
+        client = APIClient()
+        client.force_authenticate(self.users[3])
+        client.get(reverse('user-recommendations'))
+        with self.assertNumQueries(0):  # Cached after the first request, the user was loaded by auth
+            response = client.get(reverse('user-recommendations'))
+        self.assertEqual(self.ids(response.data['results']), [self.books['B'].pk])
+
+    def test_book_writes_keep_the_scores(self):
+        build_recommendations()
+        client = APIClient()
+        client.force_authenticate(self.users[3])
+        client.get(reverse('user-recommendations'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books['B'].title = 'B, revised'
+            self.books['B'].save()
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = client.get(reverse('user-recommendations'))
+        self.assertEqual(response.data['results'][0]['title'], 'B, revised')
+        self.assertEqual([query['sql'] for query in queries if 'books_review' in query['sql']
+                          or 'books_bookneighbors' in query['sql']], [])
+
+    def test_incremental_build_matches_a_full_one(self):
+        build_recommendations()
+        Review.objects.create(user=self.users[3], book=self.books['D'], rating=5, comment='')
+        Review.objects.filter(user=self.users[0], book=self.books['C']).delete()
+
+        self.assertEqual(build_recommendations()[0], 'incremental')
+        expected = compute_neighbors(CoRatingMatrix(*load_ratings()))
+        self.assertEqual(dict(BookNeighbors.objects.values_list('book_id', 'neighbors')), expected)
+
+
+@unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis not installed")
+@override_settings(CACHES=LOCMEM_CACHE)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        import fakeredis
+
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('books.leaderboards.get_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(3)]
+        self.dune = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        self.emma = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+
+    def board(self, **params):
+        response = self.client.get(reverse('book-leaderboards'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(entry['title'], entry['reviews'], entry['average_rating']) for entry in response.data['results']]
+
+    def consume(self):
+        # Every event from the start, as a redelivering stream would: applied ones are skipped
+        for event in ChangeEvent.objects.order_by('id'):
+            apply_leaderboard_event(event_data(event))
+
+    def test_review_writes_update_the_boards(self):
+        ulysses = Book.objects.create(title='Ulysses', author=Author.objects.for_name('James Joyce'), genre='Fiction')
+        Review.objects.create(user=self.users[0], book=self.emma, rating=5, comment='')
+        for user in self.users:
+            Review.objects.create(user=user, book=self.dune, rating=4, comment='')
+            Review.objects.create(user=user, book=ulysses, rating=1, comment='')
+        self.consume()
+        # A single five-star review ranks below three four-star ones once weighted towards the mean
+        self.assertEqual(self.board(), [('Dune', 3, 4.0), ('Emma', 1, 5.0), ('Ulysses', 3, 1.0)])
+        self.assertEqual(self.board(window='day', genre='Fiction', limit=1), [('Emma', 1, 5.0)])
+
+        review = Review.objects.get(user=self.users[0], book=self.dune)
+        review.rating = 1
+        review.save()
+        Review.objects.get(user=self.users[0], book=self.emma).delete()
+        self.consume()
+        self.consume()
+        self.assertCountEqual(self.board(board='most-reviewed'), [('Dune', 3, 3.0), ('Ulysses', 3, 1.0)])
+        self.assertEqual(self.board(board='most-reviewed', window='all', genre='Fiction'), [('Ulysses', 3, 1.0)])
+
+    def test_review_writes_do_not_wait_on_redis(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        with mock.patch('books.leaderboards.get_client', side_effect=AssertionError("Redis on the request path")), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('review-create', kwargs={'book': self.dune.pk}),
+                                   {'book': self.dune.pk, 'rating': 4, 'comment': 'Good'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_deleting_a_review_through_the_api_reaches_the_outbox_facets_and_boards(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mine = Review.objects.create(user=self.users[0], book=self.dune, rating=5, comment='')
+            Review.objects.create(user=self.users[1], book=self.dune, rating=3, comment='')
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+        self.assertEqual(client.delete(reverse('review-delete', kwargs={'pk': mine.pk})).status_code, 403)
+
+        client.force_authenticate(self.users[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.delete(reverse('review-delete', kwargs={'pk': mine.pk}))
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(ChangeEvent.objects.filter(topic='review', action='deleted', object_id=mine.pk).exists())
+        self.assertEqual(rating_counts()['5'], 0)
+        self.consume()
+        self.assertEqual(self.board(window='all'), [('Dune', 1, 3.0)])
+
+    def test_batch_updates_apply_the_rating_difference(self):
+        Review.objects.create(user=self.users[0], book=self.dune, rating=2, comment='')
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        client.post(reverse('review-batch'), {'reviews': [
+            {'book': self.dune.pk, 'rating': 5, 'comment': 'Better'},
+            {'book': self.emma.pk, 'rating': 3, 'comment': 'Fine'},
+        ]}, format='json')
+        self.consume()
+        self.assertEqual(self.board(window='all'), [('Dune', 1, 5.0), ('Emma', 1, 3.0)])
+
+    def test_rebuild_matches_incremental_updates(self):
+        for user, rating in zip(self.users, (5, 3, 4)):
+            Review.objects.create(user=user, book=self.dune, rating=rating, comment='')
+        Review.objects.create(user=self.users[0], book=self.emma, rating=2, comment='')
+        self.consume()
+        incremental = self.boards()
+        self.assertEqual(rebuild_leaderboards(), 2 * 39)  # Two books in all time, 1 day, 7 week and 30 month windows
+        rebuilt = self.boards()
+        # Averages differ only by the mean, the midpoint until a rebuild stores the real one
+        self.assertEqual(float(self.redis.get('leaderboard:mean')), 3.5)
+        self.assertEqual({key: scores for key, scores in rebuilt.items() if b':bayes:' not in key},
+                         {key: scores for key, scores in incremental.items() if b':bayes:' not in key})
+        self.assertEqual(rebuilt.keys(), incremental.keys())
+        self.assertEqual(self.redis.keys('leaderboard_rebuild:*'), [])
+
+        Review.objects.create(user=self.users[1], book=self.emma, rating=5, comment='')
+        self.consume()
+        Review.objects.get(user=self.users[1], book=self.emma).delete()
+        self.consume()
+        self.assertEqual(self.boards(), rebuilt)
+
+    def test_boards_stay_readable_during_a_rebuild(self):
+        Review.objects.create(user=self.users[0], book=self.dune, rating=4, comment='')
+        self.consume()
+        during = []
+
+        def window_counts(since=None):
+            during.append([(entry['book'], entry['reviews']) for entry in leaderboards.leaderboard('top-rated', 'all')])
+            return original(since)
+
+        original = leaderboards.window_counts
+        with mock.patch('books.leaderboards.window_counts', window_counts):
+            rebuild_leaderboards()
+        self.assertEqual(during, [[(self.dune.pk, 1)]] * 39)
+
+    def boards(self):
+        return {key: self.redis.zrange(key, 0, -1, withscores=True) for key in self.redis.keys('leaderboard:*:*:*')}
+
+    def test_reads_are_a_range_of_one_set(self):
+        Review.objects.create(user=self.users[0], book=self.dune, rating=4, comment='')
+        self.consume()
+        with mock.patch.object(self.redis, 'zrange', side_effect=AssertionError("scanned a whole set")), \
+                mock.patch.object(self.redis, 'zunionstore', side_effect=AssertionError("merged sets")):
+            self.assertEqual(self.board(window='month', genre='Sci-Fi'), [('Dune', 1, 4.0)])
+
+    def test_rejects_unknown_parameters(self):
+        response = self.client.get(reverse('book-leaderboards'), {'window': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, AUTOCOMPLETE_REFRESH_SECONDS=3600)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        tolkien = Author.objects.for_name('J. R. R. Tolkien')
+        self.rings = Book.objects.create(title='The Lord of the Rings', author=tolkien, genre='Fantasy')
+        self.hobbit = Book.objects.create(title='The Hobbit', author=tolkien, genre='Fantasy')
+        self.ringworld = Book.objects.create(title='Ringworld', author=Author.objects.for_name('Larry Niven'),
+                                             genre='Sci-Fi')
+        self.emma = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+
+    def titles(self, query):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('book-autocomplete'), {'q': query})
+        return [result['title'] for result in response.data['results']], response.data['correction']
+
+    def test_matches_word_prefixes_title_first(self):
+        autocomplete.get_index()
+        self.assertEqual(self.titles('ring'), (['Ringworld', 'The Lord of the Rings'], None))
+        self.assertEqual(self.titles('tolk'), (['The Hobbit', 'The Lord of the Rings'], None))
+        self.assertEqual(self.titles('the lord of the r'), (['The Lord of the Rings'], None))
+        self.assertEqual(self.titles('AUSTEN em'), (['Emma'], None))
+        self.assertEqual(self.titles('zzz'), ([], None))
+
+    def test_corrects_typos_from_trigrams(self):
+        autocomplete.get_index()
+        self.assertEqual(self.titles('hobitt'), (['The Hobbit'], 'hobbit'))
+        self.assertEqual(self.titles('tolkein hob'), (['The Hobbit'], 'tolkien hob'))
+
+    def test_patched_from_book_change_events(self):
+        index = autocomplete.get_index()
+        self.emma.title = 'Persuasion'
+        self.emma.save()
+        self.ringworld.delete()
+        Book.objects.create(title='Rings of Saturn', author=Author.objects.for_name('W. G. Sebald'), genre='Non-Fiction')
+        index.refresh()
+        index.refresh()  # Replaying unsettled events is harmless
+        self.assertEqual(self.titles('ring'), (['Rings of Saturn', 'The Lord of the Rings'], None))
+        self.assertEqual(self.titles('emma'), ([], None))
+        self.assertEqual(self.titles('persu'), (['Persuasion'], None))
+        self.assertNotIn('ringworld', index.vocab)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        Review.objects.create(book=self.book, user=user, rating=5, comment='A long review ' * 50)
+
+    def test_fields_narrow_output_columns_and_cache_key(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('list-books'), {'fields': 'title,id'})
+        self.assertEqual(response.data['results'], [{'id': self.book.pk, 'title': 'Dune'}])
+        select = next(query['sql'] for query in queries if '"books_book"."title"' in query['sql'])
+        self.assertNotIn('cover_renditions', select)
+
+        self.assertEqual(
+            build_cache_key('book_list', {'fields': 'title,id'}, LIST_PARAMS),
+            build_cache_key('book_list', {'fields': ' id,title,id'}, LIST_PARAMS),
+        )
+        self.assertNotEqual(
+            build_cache_key('book_list', {'fields': 'id'}, LIST_PARAMS),
+            build_cache_key('book_list', {}, LIST_PARAMS),
+        )
+        full = self.client.get(reverse('book-filter'), {'genre': 'Sci-Fi'}).data['results'][0]
+        self.assertIn('cover_renditions', full)
+        narrow = self.client.get(reverse('book-filter'), {'genre': 'Sci-Fi', 'exclude': 'cover_renditions'})
+        self.assertEqual(set(narrow.data['results'][0]), set(full) - {'cover_renditions'})
+
+    def test_exclude_skips_review_comment_column(self):
+        url = reverse('book-reviews-list', kwargs={'book_id': self.book.pk})
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(url, {'exclude': 'comment', 'include': 'username'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'book', 'user', 'username', 'rating', 'created_at'})
+        self.assertFalse(any('"comment"' in query['sql'] for query in queries))
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('list-books'), {'fields': 'id,isbn'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('isbn', response.data['fields'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AuthorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.herbert = Author.objects.for_name('Frank Herbert')
+        self.dune = Book.objects.create(title='Dune', author=self.herbert, genre='Sci-Fi')
+        self.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_names_are_deduplicated_and_returned_as_strings(self):
+        response = self.client.post(reverse('create_book'), {'title': 'Dune Messiah', 'author': ' frank  HERBERT '},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['author'], response.data['author_id']), ('Frank Herbert', self.herbert.pk))
+        self.assertEqual(Author.objects.count(), 1)
+        ids = resolve_authors(Author, ['Jane Austen', 'jane austen', 'Ｊane Austen', 'Frank Herbert'])
+        self.assertEqual(ids, {'jane austen': ids['jane austen'], 'frank herbert': self.herbert.pk})
+
+    def test_author_books_and_search_use_the_author_table(self):
+        Book.objects.create(title='Children of Dune', author=self.herbert, genre='Sci-Fi')
+        Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+        with self.assertNumQueries(3):  # Author, count, page
+            response = self.client.get(reverse('author-books', kwargs={'author_id': self.herbert.pk}))
+        self.assertEqual([(b['title'], b['author']) for b in response.data['results']],
+                         [('Dune', 'Frank Herbert'), ('Children of Dune', 'Frank Herbert')])
+        self.assertEqual(self.client.get(reverse('author-books', kwargs={'author_id': 999})).status_code, 404)
+
+        found = self.client.get(reverse('book-filter'), {'search': 'herb'}).data['results']
+        self.assertEqual(sorted(book['title'] for book in found), ['Children of Dune', 'Dune'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CompoundDocumentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x')
+                      for i in range(3)]
+        for user, rating in zip(self.users, (5, 4, 4)):
+            Review.objects.create(book=self.book, user=user, rating=rating, comment='')
+        self.url = reverse('book-document', kwargs={'id': self.book.pk})
+        patcher = mock.patch('books.documents.fetch_google_books_metadata', return_value={'publisher': 'Chilton'})
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_assembles_every_part_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(4):  # Book and author, stats, reviews, reviewers
+            response = self.client.get(self.url, {'include': 'reviews,metadata,stats'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['title'], response.data['author']), ('Dune', 'Frank Herbert'))
+        self.assertEqual(response.data['google_books_metadata'], {'publisher': 'Chilton'})
+        self.assertEqual(response.data['stats'], {
+            'review_count': 3, 'average_rating': 4.33, 'ratings': {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1},
+        })
+        self.assertEqual([r['username'] for r in response.data['reviews']['results']], ['u2', 'u1', 'u0'])
+        self.assertIsNone(response.data['reviews']['next'])
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'include': 'stats,metadata,reviews'})
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertEqual(self.client.get(self.url, {'include': 'comments'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('book-document', kwargs={'id': 999})).status_code, 404)
+
+    def test_writes_drop_only_the_documents_they_change(self):
+        for include in ('metadata', 'stats'):
+            self.client.get(self.url, {'include': include})
+
+        def cached(parts):
+            return cache.get(compound_document_key(self.book.pk, parts, document_versions(self.book.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(user=self.users[0]).get().delete()
+        self.assertIsNotNone(cached({'metadata'}))
+        self.assertIsNone(cached({'stats'}))
+        self.assertEqual(self.client.get(self.url, {'include': 'stats'}).data['stats']['review_count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.genre = 'Fiction'
+            self.book.save()
+        self.assertIsNone(cached({'metadata'}))
+        self.assertEqual(self.client.get(self.url, {'include': 'metadata'}).data['genre'], 'Fiction')
+
+    def test_read_racing_a_write_caches_under_an_old_version(self):
+        versions = document_versions(self.book.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.genre = 'Fiction'
+            self.book.save()
+        # Computed from the rows before the write, cached after it committed
+        cache.set(compound_document_key(self.book.pk, set(), versions), {'genre': 'Sci-Fi'})
+        self.assertEqual(self.client.get(self.url).data['genre'], 'Fiction')
+
+    @mock.patch('books.documents.REVIEWS_PER_DOCUMENT', 2)
+    def test_next_link_follows_the_requesting_host(self):
+        first = self.client.get(self.url, {'include': 'reviews'}, HTTP_HOST='localhost')
+        second = self.client.get(self.url, {'include': 'reviews'}, HTTP_HOST='127.0.0.1')
+        self.assertTrue(first.data['reviews']['next'].startswith('http://localhost/'))
+        self.assertTrue(second.data['reviews']['next'].startswith('http://127.0.0.1/'))
+
+    @mock.patch('books.documents.METADATA_WAIT', 0.01)
+    def test_slow_metadata_is_an_error_part_and_not_cached(self):
+        release = threading.Event()
+        self.fetch.side_effect = lambda title, author: release.wait(5) and {'publisher': 'Chilton'}
+        self.addCleanup(release.set)
+        response = self.client.get(self.url, {'include': 'metadata'})
+        self.assertIn('Timed out', response.data['google_books_metadata']['error'])
+        release.set()
+        self.assertIsNone(cache.get(compound_document_key(self.book.pk, {'metadata'},
+                                                          document_versions(self.book.pk))))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BookBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dune = Book.objects.create(title='Dune', author=Author.objects.for_name('Frank Herbert'), genre='Sci-Fi')
+        self.emma = Book.objects.create(title='Emma', author=Author.objects.for_name('Jane Austen'), genre='Fiction')
+
+    def test_keeps_order_reports_missing_and_caches_documents(self):
+        url = reverse('book-batch')
+        ids = f"{self.emma.pk},999,{self.dune.pk},{self.emma.pk}"
+        cache.set(metadata_cache_key('Emma', 'Jane Austen'), {'publisher': 'Penguin'})
+        with mock.patch('books.batch.fetch_google_books_metadata', return_value={'publisher': 'Ace'}) as fetch:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'ids': ids})
+            self.assertEqual([book['id'] for book in response.data['results']], [self.emma.pk, self.dune.pk])
+            self.assertEqual(response.data['missing'], [999])
+            self.assertEqual(response.data['results'][0]['google_books_metadata'], {'publisher': 'Penguin'})
+            self.assertEqual(response.data['results'][1]['google_books_metadata'], {'publisher': 'Ace'})
+            self.assertEqual(fetch.call_count, 1)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, {'ids': ids}).data, response.data)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.dune.title = 'Dune Messiah'
+                self.dune.save()
+            response = self.client.get(url, {'ids': ids})
+            self.assertEqual(response.data['results'][1]['title'], 'Dune Messiah')
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_unmatched_and_failed_lookups_are_not_repeated(self):
+        import requests
+
+        url = reverse('book-batch')
+        ids = f"{self.dune.pk},{self.emma.pk}"
+        no_match = mock.Mock(**{'json.return_value': {'totalItems': 0}})
+        with mock.patch('requests.get', side_effect=[no_match, requests.Timeout('timed out')]) as get:
+            response = self.client.get(url, {'ids': ids})
+            self.assertIn('No matching', response.data['results'][0]['google_books_metadata']['error'])
+            self.assertIn('timed out', response.data['results'][1]['google_books_metadata']['error'])
+            self.assertIsNotNone(get.call_args.kwargs['timeout'])
+
+            self.assertEqual(self.client.get(url, {'ids': ids}).data, response.data)
+            self.assertEqual(get.call_count, 2)
+
+    @mock.patch('books.batch.METADATA_WAIT', 0.05)
+    def test_slow_lookups_share_one_wait_and_are_not_cached(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        ids = f"{self.dune.pk},{self.emma.pk}"
+        with mock.patch('books.batch.fetch_google_books_metadata',
+                        side_effect=lambda title, author: release.wait(5) and {'publisher': 'Ace'}):
+            started = time.perf_counter()
+            response = self.client.get(reverse('book-batch'), {'ids': ids})
+            self.assertLess(time.perf_counter() - started, 2)
+        release.set()
+        for document in response.data['results']:
+            self.assertIn('Timed out', document['google_books_metadata']['error'])
+        self.assertIsNone(cache.get(book_document_key(self.dune.pk, current_generation())))
+
+    def test_rejects_invalid_or_too_many_ids(self):
+        url = reverse('book-batch')
+        self.assertEqual(self.client.get(url, {'ids': '1,two'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': ','.join(map(str, range(1, 102)))}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PAGINATION_ESTIMATE_THRESHOLD=5)
+class EstimatedCountPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.for_name('Some Author')
+        Book.objects.bulk_create([Book(title=f'Book {i}', author=author, genre='Fiction') for i in range(12)])
+
+    def test_counts_exactly_without_an_estimate(self):
+        response = self.client.get(reverse('list-books'))
+        self.assertEqual((response.data['count'], response.data['count_approximate']), (12, False))
+
+    def test_large_estimate_replaces_count_query(self):
+        with mock.patch('book_review_service.pagination.estimated_count', return_value=5):
+            with CaptureQueriesContext(connections['default']) as queries:
+                first = self.client.get(reverse('book-filter'), {'genre': 'Fiction'})
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+            self.assertEqual((first.data['count'], first.data['count_approximate']), (5, True))
+            self.assertIsNotNone(first.data['next'])
+
+            # The estimate is low: the page past its end is still served
+            second = self.client.get(reverse('book-filter'), {'genre': 'Fiction', 'page': 2})
+            self.assertEqual(len(second.data['results']), 2)
+            self.assertIsNone(second.data['next'])
+            self.assertEqual(self.client.get(reverse('book-filter'), {'genre': 'Fiction', 'page': 3}).status_code, 404)
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},  # No collectstatic manifest
+    })
+    def test_user_admin_uses_estimate(self):
+        admin = get_user_model().objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.client.force_login(admin)
+        with mock.patch('book_review_service.pagination.estimated_count', return_value=500):
+            with CaptureQueriesContext(connections['default']) as queries:
+                response = self.client.get(reverse('admin:users_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROFILE_BUFFER_SIZE=2, PROFILE_SAMPLE_INTERVAL=0.001)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='x', is_staff=True)
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+        self.staff_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(staff)}'}
+        self.reader_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(reader)}'}
+
+    def slow_facets(self, **extra):
+        with mock.patch('books.views.genre_counts', side_effect=lambda: time.sleep(0.05) or {}):
+            return self.client.get(reverse('book-facets'), **extra)
+
+    def test_staff_request_is_sampled_into_ring_buffer(self):
+        response = self.slow_facets(HTTP_X_PROFILE='collapsed', **self.staff_auth)
+        profile_id = response['X-Profile-Id']
+        stacks = self.client.get(reverse('profile-download', args=[profile_id]), **self.staff_auth)
+        self.assertIn('books.views:BookFacetsView.get', stacks.content.decode())
+
+        for _ in range(2):
+            self.client.get(reverse('book-facets') + '?profile=collapsed', **self.staff_auth)
+        listed = self.client.get(reverse('profile-list'), **self.staff_auth).data['results']
+        self.assertEqual([entry['id'] for entry in listed], [int(profile_id) + 2, int(profile_id) + 1])
+        self.assertEqual(self.client.get(reverse('profile-download', args=[profile_id]), **self.staff_auth).status_code, 404)
+
+    def test_pstats_download_loads(self):
+        profile_id = self.slow_facets(HTTP_X_PROFILE='pstats', **self.staff_auth)['X-Profile-Id']
+        response = self.client.get(reverse('profile-download', args=[profile_id]), **self.staff_auth)
+        with tempfile.NamedTemporaryFile(suffix='.prof') as f:
+            f.write(response.content)
+            f.flush()
+            functions = {function for _, _, function in pstats.Stats(f.name).stats}
+        self.assertIn('get', functions)
+
+    def test_ignored_for_other_users_and_off_by_default(self):
+        with mock.patch('book_review_service.profiling.Sampler') as sampler:
+            self.assertNotIn('X-Profile-Id', self.client.get(reverse('book-facets'), **self.staff_auth))
+            response = self.client.get(reverse('book-facets'), HTTP_X_PROFILE='collapsed', **self.reader_auth)
+        self.assertNotIn('X-Profile-Id', response)
+        sampler.assert_not_called()
+        self.assertEqual(self.client.get(reverse('profile-list'), **self.reader_auth).status_code, 403)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import BookCreateView, BookListView, BookDetailView, BookUpdateView, BookDeleteView, ReviewCreateView, BookReviewsList, ReviewUpdateView, ReviewDeleteView, BookFilterView
+from .views import BookCreateView, BookListView, BookDetailView, BookBatchView, AuthorBooksView, BookDocumentView, BookUpdateView, BookDeleteView, ReviewCreateView, BookReviewsList, ReviewUpdateView, ReviewDeleteView, BookFilterView, BookFacetsView, ReviewBatchCreateView, SimilarBooksView, UserRecommendationsView, LeaderboardView, AutocompleteView
 
 urlpatterns = [
     path('2.1/create-book/', BookCreateView.as_view(), name='create_book'),
@@ -7,9 +7,18 @@ urlpatterns = [
     path('2.3/<int:id>/', BookDetailView.as_view(), name='book-detail'),
     path('2.4/<int:id>/update/', BookUpdateView.as_view(), name='book-update'),
     path('2.5/<int:id>/delete/', BookDeleteView.as_view(), name='book-delete'),
+    path('2.6/batch/', BookBatchView.as_view(), name='book-batch'),
+    path('2.7/authors/<int:author_id>/books/', AuthorBooksView.as_view(), name='author-books'),
+    path('2.8/<int:id>/document/', BookDocumentView.as_view(), name='book-document'),
     path('3.1/<int:book>/reviews/create/', ReviewCreateView.as_view(), name='review-create'),
     path('3.2/<int:book_id>/reviews/', BookReviewsList.as_view(), name='book-reviews-list'),
     path('3.3/review/<int:pk>/update/', ReviewUpdateView.as_view(), name='review-update'),
     path('3.3/review/<int:pk>/delete/', ReviewDeleteView.as_view(), name='review-delete'),
+    path('3.4/reviews/batch/', ReviewBatchCreateView.as_view(), name='review-batch'),
     path('4.1/filter/', BookFilterView.as_view(), name='book-filter'),
+    path('4.2/facets/', BookFacetsView.as_view(), name='book-facets'),
+    path('5.1/<int:id>/similar/', SimilarBooksView.as_view(), name='book-similar'),
+    path('5.2/recommendations/', UserRecommendationsView.as_view(), name='user-recommendations'),
+    path('5.3/leaderboards/', LeaderboardView.as_view(), name='book-leaderboards'),
+    path('5.4/autocomplete/', AutocompleteView.as_view(), name='book-autocomplete'),
 ]
\ No newline at end of file
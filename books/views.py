@@ -1,25 +1,119 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, generics, permissions, pagination
+from rest_framework import status, generics, permissions
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Book, Review
-from .serializers import BookSerializer, ReviewSerializer
+from book_review_service.db_router import fresh_reads
+from book_review_service.pagination import EstimatedCountPagination
+from .models import ALLOWED_GENRES, Author, Book, ChangeEvent, Review
+from .serializers import DUPLICATE_TITLE_MESSAGE, BookSerializer, ReviewSerializer, ReviewBatchSerializer, ReviewBatchItemSerializer
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAdminUser
-import requests
+import time
+import logging
 from rest_framework.generics import RetrieveAPIView, UpdateAPIView, DestroyAPIView
-from rest_framework.generics import UpdateAPIView, DestroyAPIView
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from rest_framework.exceptions import PermissionDenied
-from rest_framework import status
-from django.views.decorators.cache import cache_page
+from rest_framework.exceptions import ValidationError
 from django.core.cache import cache
+from django.db import IntegrityError, ProgrammingError, transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter
+from . import autocomplete
+from .batch import MAX_BOOK_BATCH_SIZE, book_documents
+from .documents import INCLUDES, compound_document
+from .facets import adjust_rating_counts, genre_counts, rating_counts
+from .fieldsets import SparseFieldsetMixin, split_names
+from .invalidation import apply_changes
+from .leaderboards import BOARDS, MAX_LIMIT, WINDOWS, leaderboard
+from .metadata import fetch_google_books_metadata
+from .outbox import event_data, record_many
+from .pagination import BookReviewsPagination
+from .partitioning import reviews_partitioned, upsert_reviews
+from .recommendations import MAX_RESULTS, similar_books, user_recommendations
+from .cache_keys import (
+    build_cache_key, current_generation, set_tracked, FILTER_PARAMS, LIST_CACHE_TIMEOUT, LIST_PARAMS,
+)
+from .conditional import book_validators, list_validators, not_modified, set_validators
+from .warming import record_hit
+
+logger = logging.getLogger(__name__)
+
+# Model fields each serialized field reads, for ?fields= and ?exclude=
+BOOK_FIELD_COLUMNS = {
+    'id': ('id',),
+    'title': ('title',),
+    'author': ('author',),
+    'author_id': ('author',),
+    'genre': ('genre',),
+    'cover_image': ('cover_image',),
+    'cover_renditions': ('cover_renditions',),
+}
+REVIEW_FIELD_COLUMNS = {
+    'id': ('id',),
+    'book': ('book',),
+    'user': ('user',),
+    'username': ('user',),
+    'rating': ('rating',),
+    'comment': ('comment',),
+    'created_at': ('created_at',),
+}
+FIELDSET_PARAMETERS = [
+    openapi.Parameter(
+        name='fields',
+        in_=openapi.IN_QUERY,
+        description="Comma-separated fields to return, e.g. 'id,title'. Only these columns are read.",
+        type=openapi.TYPE_STRING,
+        required=False
+    ),
+    openapi.Parameter(
+        name='exclude',
+        in_=openapi.IN_QUERY,
+        description="Comma-separated fields to leave out, e.g. 'comment'.",
+        type=openapi.TYPE_STRING,
+        required=False
+    ),
+]
+
+
+def select_author(queryset, fieldset):
+    # The author's name is serialized from the author table
+    if fieldset is None or 'author' in fieldset:
+        return queryset.select_related('author')
+    return queryset
+
+
+class BookSearchFilter(SearchFilter):
+    """
+    SearchFilter over the title and the author's name. Each term is matched
+    against the small author table first, and their books are found through
+    books_book_author_idx, rather than joining every book to its author.
+    """
+    def filter_queryset(self, request, queryset, view):
+        for term in self.get_search_terms(request):
+            authors = Author.objects.filter(name__icontains=term).values('pk')
+            queryset = queryset.filter(Q(title__icontains=term) | Q(author__in=authors))
+        return queryset
 
 
+TITLE_CONSTRAINT = 'books_book_title_normalized_unique'
+
+
+def save_book(serializer, **kwargs):
+    """
+    `serializer.save()` for a BookSerializer. A concurrent write of the same
+    title passes `validate_title` but fails the unique constraint; answer it
+    with the same 400 instead of a 500.
+    """
+    try:
+        with transaction.atomic():
+            return serializer.save(**kwargs)
+    except IntegrityError as exc:
+        if TITLE_CONSTRAINT not in str(exc):
+            raise
+        raise ValidationError({'title': [DUPLICATE_TITLE_MESSAGE]})
 
 
 class BookCreateView(APIView):
@@ -50,16 +144,16 @@ class BookCreateView(APIView):
         """
         serializer = BookSerializer(data=request.data)
         if serializer.is_valid():
-            book = serializer.save()
-            cache.delete_pattern("book_list_*")  # Invalidate all cached book lists
+            save_book(serializer)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class BookListView(ListAPIView):
+class BookListView(SparseFieldsetMixin, ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = EstimatedCountPagination
+    field_columns = BOOK_FIELD_COLUMNS
 
     @swagger_auto_schema(
         operation_description="Retrieve a paginated list of all books.",
@@ -78,6 +172,7 @@ class BookListView(ListAPIView):
                 type=openapi.TYPE_INTEGER,
                 required=False
             ),
+            *FIELDSET_PARAMETERS,
         ],
         responses={
             200: openapi.Response(
@@ -88,21 +183,33 @@ class BookListView(ListAPIView):
         }
     )
     def get(self, request, *args, **kwargs):
-        cache_key = f"book_list_page_{request.GET.get('page', 1)}_limit_{request.GET.get('limit', 10)}"
-        cached_data = cache.get(cache_key)
-
+        warming = getattr(request, 'warming', False)  # Set by the cache warmer to force a refresh
+        self.get_fieldset()  # An unknown field is a 400 before any cache lookup
+        cache_key = build_cache_key('book_list', request.GET, LIST_PARAMS, generation=current_generation())
+        etag, last_modified = list_validators(request, cache_key)
+        if not warming:
+            record_hit('book_list', request.GET)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged is not None:
+                return unchanged
+
+        cached_data = None if warming else cache.get(cache_key)
         if cached_data:
-            return Response(cached_data)
+            response = Response(cached_data)
+        else:
+            with fresh_reads(last_modified):  # Cached for everyone under the new generation
+                response = super().get(request, *args, **kwargs)
+            set_tracked('book_list', cache_key, response.data, timeout=LIST_CACHE_TIMEOUT)
 
-        # If not cached, fetch data and cache it
-        response = super().get(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=300)  # Cache for 5 minutes
+        response.compression_cache_key = cache_key  # Compressed bodies are cached next to the payload
+        return set_validators(response, etag, last_modified)
 
-        return response
+    def get_queryset(self):
+        return self.narrow_queryset(select_author(super().get_queryset(), self.get_fieldset()))
 
 
 class BookDetailView(RetrieveAPIView):
-    queryset = Book.objects.all()
+    queryset = Book.objects.select_related('author')
     serializer_class = BookSerializer
     lookup_field = 'id'  
 
@@ -127,106 +234,113 @@ class BookDetailView(RetrieveAPIView):
     )
     def get(self, request, *args, **kwargs):
         book = self.get_object()
-
-        google_books_data = self.fetch_google_books_metadata(book.title, book.author)
+        # Part of the validators: usually one cache read, fetched on a miss as a 200 would
+        google_books_data = self.fetch_google_books_metadata(book.title, book.author.name)
+        etag, last_modified = book_validators(request, book, google_books_data)
+        if not getattr(request, 'warming', False):
+            record_hit('book_detail', {'id': book.id})
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged is not None:
+                return unchanged
 
         response_data = self.serializer_class(book).data
         response_data['google_books_metadata'] = google_books_data
 
-        return Response(response_data, status=status.HTTP_200_OK)
+        return set_validators(Response(response_data, status=status.HTTP_200_OK), etag, last_modified)
 
     def fetch_google_books_metadata(self, title, author):
         """
         Fetch metadata from Google Books API with caching.
         """
-        cache_key = f"google_books:{title}:{author}"  
-        cached_data = cache.get(cache_key)  
+        return fetch_google_books_metadata(title, author, use_cache=not getattr(self.request, 'warming', False))
 
-        if cached_data is not None:
-            return cached_data 
 
-        base_url = "https://www.googleapis.com/books/v1/volumes"
-        query = f"intitle:{title}+inauthor:{author}"
-        params = {
-            'q': query,
-            'maxResults': 1
+class BookBatchView(APIView):
+    @swagger_auto_schema(
+        operation_description="Retrieve the details of several books at once, in the order requested.",
+        manual_parameters=[
+            openapi.Parameter(
+                name='ids',
+                in_=openapi.IN_QUERY,
+                description=f"Comma-separated book IDs, at most {MAX_BOOK_BATCH_SIZE}. Repeated IDs are returned once.",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="'results' holds the book details (as book-detail returns them), 'missing' the IDs not found"
+            ),
+            400: "Missing, invalid or too many IDs",
         }
-
+    )
+    def get(self, request):
+        """
+        Replaces one book-detail call per book with a fixed number of cache
+        and database round trips.
+        """
         try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get('totalItems', 0) > 0:
-                book_info = data['items'][0]['volumeInfo']
-                api_data = {
-                    'description': book_info.get('description', 'No description available'),
-                    'published_date': book_info.get('publishedDate', 'Unknown'),
-                    'publisher': book_info.get('publisher', 'Unknown'),
-                    'average_rating': book_info.get('averageRating', 'Not rated'),
-                    'ratings_count': book_info.get('ratingsCount', 0),
-                    'thumbnail': book_info.get('imageLinks', {}).get('thumbnail', 'No thumbnail available')
-                }
-                cache.set(cache_key, api_data, 60 * 60 * 24)  # Cache for 24 hours (adjust as needed)
-                return api_data
-            else:
-                return {"error": "No matching book found in Google Books"} 
+            ids = list(dict.fromkeys(int(value) for value in request.GET.get('ids', '').split(',') if value.strip()))
+        except ValueError:
+            return Response({'ids': "Book IDs must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'ids': "At least one book ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BOOK_BATCH_SIZE:
+            return Response({'ids': f"At most {MAX_BOOK_BATCH_SIZE} book IDs per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results, missing = book_documents(ids)
+        return Response({'results': results, 'missing': missing}, status=status.HTTP_200_OK)
 
-        except requests.RequestException as e:
-            return {"error": f"Failed to fetch metadata from Google Books: {str(e)}"} 
-        
-class BookUpdateView(UpdateAPIView):
-    queryset = Book.objects.all()
-    serializer_class = BookSerializer
-    lookup_field = 'id'  
 
+class BookDocumentView(APIView):
     @swagger_auto_schema(
-        operation_description="Update details for a specific book by ID.",
+        operation_description="Retrieve a book together with the parts named in `include`, in one request.",
         manual_parameters=[
             openapi.Parameter(
                 name='id',
                 in_=openapi.IN_PATH,
-                description="The ID of the book to update.",
+                description="The ID of the book to retrieve.",
                 type=openapi.TYPE_INTEGER,
                 required=True
-            )
+            ),
+            openapi.Parameter(
+                name='include',
+                in_=openapi.IN_QUERY,
+                description=f"Comma-separated parts to embed: {', '.join(INCLUDES)}. 'reviews' is the first page of "
+                            "reviews with usernames, 'metadata' the Google Books metadata and 'stats' the review "
+                            "count, average rating and count per rating.",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
         ],
-        request_body=BookSerializer,
         responses={
-            200: openapi.Response(
-                description="Book updated successfully",
-                schema=BookSerializer
-            ),
-            400: "Invalid data",
+            200: openapi.Response(description="The book's details with the included parts"),
+            400: "Unknown part in include",
             404: "Book not found",
         }
     )
-    def patch(self, request, *args, **kwargs):
+    def get(self, request, id):
         """
-        Partially update a book's details.
+        Replaces book-detail, book-reviews-list and a user lookup per reviewer
+        with at most four queries, or one cache read.
         """
-        response = self.partial_update(request, *args, **kwargs)
-        book_id = kwargs.get('id')
-
-        # Clear caches after updating a book
-        cache.delete_pattern("book_list_*")  # Invalidate book lists
-        cache.delete(f"book_detail_{book_id}")  # Invalidate the specific book cache
-
-        return response
-
-    def put(self, request, *args, **kwargs):
-        """
-        Fully update a book's details.
-        """
-        response = self.update(request, *args, **kwargs)
-        book_id = kwargs.get('id')
+        parts = set(split_names(request.GET.get('include', '')))
+        unknown = sorted(parts.difference(INCLUDES))
+        if unknown:
+            return Response({'include': f"Unknown part(s): {', '.join(unknown)}. Choose from: {', '.join(INCLUDES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        document = compound_document(id, parts, reverse('book-reviews-list', kwargs={'book_id': id}))
+        if document is None:
+            return Response({'detail': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if document.get('reviews', {}).get('next'):  # Cached relative, for whichever host asks
+            document['reviews']['next'] = request.build_absolute_uri(document['reviews']['next'])
+        return Response(document, status=status.HTTP_200_OK)
 
-        # Clear caches after updating a book
-        cache.delete_pattern("book_list_*")  # Invalidate book lists
-        cache.delete(f"book_detail_{book_id}")  # Invalidate the specific book cache
 
-        return response
-    queryset = Book.objects.all()
+class BookUpdateView(UpdateAPIView):
+    queryset = Book.objects.select_related('author')
     serializer_class = BookSerializer
     lookup_field = 'id'  
 
@@ -262,41 +376,12 @@ class BookUpdateView(UpdateAPIView):
         Fully update a book's details.
         """
         return self.update(request, *args, **kwargs)
-    
-class BookDeleteView(DestroyAPIView):
-    queryset = Book.objects.all()
-    lookup_field = 'id'  
-    permission_classes = [IsAdminUser]  
 
-    @swagger_auto_schema(
-        operation_description="Delete a specific book by ID.",
-        manual_parameters=[
-            openapi.Parameter(
-                name='id',
-                in_=openapi.IN_PATH,
-                description="The ID of the book to delete.",
-                type=openapi.TYPE_INTEGER,
-                required=True
-            )
-        ],
-        responses={
-            204: "Book deleted successfully",
-            403: "Permission denied - Only admins can delete books",
-            404: "Book not found",
-        }
-    )
-    def delete(self, request, *args, **kwargs):
-        """
-        Delete a book by ID.
-        """
-        book_id = kwargs.get('id')
+    def perform_update(self, serializer):
+        save_book(serializer)
 
-        # Clear caches before deleting the book
-        cache.delete_pattern("book_list_*")  # Invalidate book lists
-        cache.delete(f"book_detail_{book_id}")  # Invalidate the specific book cache
-
-        return self.destroy(request, *args, **kwargs)
-    queryset = Book.objects.all()
+class BookDeleteView(DestroyAPIView):
+    queryset = Book.objects.select_related('author')  # The outbox event records the author's name
     lookup_field = 'id'  
     permission_classes = [IsAdminUser]  
 
@@ -339,24 +424,180 @@ class ReviewCreateView(generics.CreateAPIView):
 
         serializer.save(user=self.request.user, book=book)
         
-class BookReviewsPagination(pagination.PageNumberPagination):
-    page_size = 10  
-    page_size_query_param = 'page_size' 
-    max_page_size = 100 
-
-
-class BookReviewsList(generics.ListAPIView):
+class BookReviewsList(SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = ReviewSerializer
     pagination_class = BookReviewsPagination
+    field_columns = REVIEW_FIELD_COLUMNS
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the reviews of a book, newest first.",
+        manual_parameters=[
+            openapi.Parameter(
+                name='include',
+                in_=openapi.IN_QUERY,
+                description="Set to 'username' to embed each reviewer's username.",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            *FIELDSET_PARAMETERS,
+        ],
+        responses={
+            200: openapi.Response(
+                description="Paginated list of reviews",
+                schema=ReviewSerializer(many=True)
+            ),
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        book_id = self.kwargs['book_id']
-        try:
-            book = Book.objects.get(pk=book_id)
-            return book.reviews.all() 
-        except Book.DoesNotExist:
-            return Review.objects.none()
-        
+        # A missing book simply yields no reviews, no separate existence check.
+        # Ordered to match the books_review_book_created_idx index.
+        queryset = Review.objects.filter(book_id=self.kwargs['book_id']).order_by('-created_at', '-id')
+        fieldset = self.get_fieldset()
+        if self.include_username() and (fieldset is None or 'username' in fieldset):
+            queryset = queryset.select_related('user')
+        return self.narrow_queryset(queryset)
+
+    def include_username(self):
+        return 'username' in self.request.GET.get('include', '').split(',')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_username'] = self.include_username()
+        return context
+
+
+class ReviewBatchCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Create or update many reviews for the authenticated user in one request. "
+                              "Each book gets at most one review per user; existing reviews are updated.",
+        request_body=ReviewBatchSerializer,
+        responses={
+            200: openapi.Response(
+                description="Per-item results and throughput",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                        'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'updated': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'failed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'reviews_per_second': openapi.Schema(type=openapi.TYPE_NUMBER),
+                    }
+                )
+            ),
+            400: "Invalid payload, or no item could be saved",
+        },
+        security=[{"Bearer": []}]
+    )
+    def post(self, request):
+        """
+        Validate all items, check their books with a single IN query and upsert
+        the valid ones atomically with one bulk_create.
+        """
+        started = time.perf_counter()
+        batch = ReviewBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        results = []
+        valid = {}  # book id -> (index, data); the last item for a book wins
+        for index, item in enumerate(batch.validated_data['reviews']):
+            serializer = ReviewBatchItemSerializer(data=item)
+            if not serializer.is_valid():
+                results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+                continue
+            book_id = serializer.validated_data['book']
+            if book_id in valid:
+                superseded = valid[book_id][0]
+                results.append({'index': superseded, 'book': book_id, 'status': 'error',
+                                'errors': {'book': ["Superseded by a later item for the same book."]}})
+            valid[book_id] = (index, serializer.validated_data)
+
+        existing_books = set(Book.objects.filter(pk__in=valid).values_list('pk', flat=True))
+        for book_id in list(valid):
+            if book_id not in existing_books:
+                index, _ = valid.pop(book_id)
+                results.append({'index': index, 'book': book_id, 'status': 'error',
+                                'errors': {'book': ["Book not found."]}})
+
+        created = updated = 0
+        if valid:
+            try:
+                reviewed = self.save_reviews(request.user, valid)
+            except ProgrammingError:
+                # ON CONFLICT (book, user) fails once `partition_reviews swap` has run: look again
+                if reviews_partitioned() or not reviews_partitioned(refresh=True):
+                    raise
+                reviewed = self.save_reviews(request.user, valid)
+
+            for book_id, (index, _) in valid.items():
+                result = 'updated' if book_id in reviewed else 'created'
+                results.append({'index': index, 'book': book_id, 'status': result})
+            updated = len(reviewed)
+            created = len(valid) - updated
+
+        elapsed = time.perf_counter() - started
+        saved = created + updated
+        reviews_per_second = round(saved / elapsed, 1) if elapsed else 0.0
+        logger.info(f"Review batch by {request.user.username}: {saved} saved, "
+                    f"{len(results) - saved} failed, {reviews_per_second} reviews/sec")
+
+        results.sort(key=lambda result: result['index'])
+        return Response(
+            {
+                'results': results,
+                'created': created,
+                'updated': updated,
+                'failed': len(results) - saved,
+                'elapsed_ms': round(elapsed * 1000, 2),
+                'reviews_per_second': reviews_per_second,
+            },
+            status=status.HTTP_200_OK if saved else status.HTTP_400_BAD_REQUEST
+        )
+
+    def save_reviews(self, user, valid):
+        """
+        Upsert `user`'s reviews of `valid` (book id -> (index, data)) in one
+        transaction. Returns `{book id: (rating, created_at)}` of the reviews
+        that already existed.
+        """
+        with transaction.atomic():
+            reviewed = {
+                book_id: (rating, created_at)
+                for book_id, rating, created_at in Review.objects.filter(user=user, book_id__in=valid)
+                .values_list('book_id', 'rating', 'created_at')
+            }
+            reviews = [
+                Review(book_id=book_id, user=user, rating=data['rating'], comment=data['comment'])
+                for book_id, (_, data) in valid.items()
+            ]
+            if reviews_partitioned():
+                upserted = upsert_reviews(reviews, update_fields=['rating', 'comment'])
+            else:
+                upserted = Review.objects.bulk_create(
+                    reviews,
+                    update_conflicts=True,
+                    unique_fields=['book', 'user'],
+                    update_fields=['rating', 'comment'],
+                )
+            # bulk_create sends no model signals, so record the changes here.
+            # Updated rows keep their stored created_at; give the events the stored values.
+            for review in upserted:
+                if review.book_id in reviewed:
+                    review._loaded_rating, review.created_at = reviewed[review.book_id]
+            events = record_many('review', [
+                (ChangeEvent.UPDATED if review.book_id in reviewed else ChangeEvent.CREATED, review)
+                for review in upserted
+            ])
+            changes = [event_data(event) for event in events]
+            apply_changes(changes)
+            adjust_rating_counts(changes)
+        return reviewed
+
 
 class IsOwnerOrAdmin(BasePermission):
     """
@@ -409,20 +650,18 @@ class ReviewDeleteView(DestroyAPIView):
         }
     )
     def delete(self, request, *args, **kwargs):
-        review = self.get_object() 
-        if not self.has_permission(request, review):
-            raise PermissionDenied("You do not have permission to delete this review.")
-
+        review = self.get_object()  # Checks IsOwnerOrAdmin
         self.perform_destroy(review)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
-class BookFilterView(ListAPIView):
+class BookFilterView(SparseFieldsetMixin, ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    pagination_class = EstimatedCountPagination
+    field_columns = BOOK_FIELD_COLUMNS
+    filter_backends = [DjangoFilterBackend, BookSearchFilter]
     filterset_fields = ['genre']
-    search_fields = ['title', 'author']
+    search_fields = ['title', 'author__name']
 
     @swagger_auto_schema(
         operation_description="Retrieve a filtered list of books based on search query and genre.",
@@ -455,6 +694,7 @@ class BookFilterView(ListAPIView):
                 type=openapi.TYPE_INTEGER,
                 required=False
             ),
+            *FIELDSET_PARAMETERS,
         ],
         responses={
             200: openapi.Response(
@@ -469,16 +709,239 @@ class BookFilterView(ListAPIView):
         Retrieve a paginated list of books with optional search and genre filtering.
         Caches results to improve performance.
         """
-        search_query = request.GET.get('search', '')
-        genre_filter = request.GET.get('genre', '')
+        warming = getattr(request, 'warming', False)  # Set by the cache warmer to force a refresh
+        self.get_fieldset()  # An unknown field is a 400 before any cache lookup
+        cache_key = build_cache_key('book_filter', request.GET, FILTER_PARAMS, generation=current_generation())
+        etag, last_modified = list_validators(request, cache_key)
+        if not warming:
+            record_hit('book_filter', request.GET)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged is not None:
+                return unchanged
+
+        cached_data = None if warming else cache.get(cache_key)
+        if cached_data:
+            response = Response(cached_data)
+        else:
+            with fresh_reads(last_modified):  # Cached for everyone under the new generation
+                response = super().get(request, *args, **kwargs)
+            set_tracked('book_filter', cache_key, response.data, timeout=LIST_CACHE_TIMEOUT)
 
-        cache_key = f"book_filter_search_{search_query}_genre_{genre_filter}_page_{request.GET.get('page', 1)}_limit_{request.GET.get('limit', 10)}"
-        cached_data = cache.get(cache_key)
+        response.compression_cache_key = cache_key  # Compressed bodies are cached next to the payload
+        return set_validators(response, etag, last_modified)
 
-        if cached_data:
-            return Response(cached_data)
+    def get_queryset(self):
+        return self.narrow_queryset(select_author(super().get_queryset(), self.get_fieldset()))
+
+
+class AuthorBooksView(SparseFieldsetMixin, ListAPIView):
+    serializer_class = BookSerializer
+    field_columns = BOOK_FIELD_COLUMNS
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a paginated list of an author's books, oldest first.",
+        manual_parameters=[
+            openapi.Parameter(
+                name='author_id',
+                in_=openapi.IN_PATH,
+                description="The ID of the author, as returned in a book's `author_id`.",
+                type=openapi.TYPE_INTEGER,
+                required=True
+            ),
+            openapi.Parameter(
+                name='page',
+                in_=openapi.IN_QUERY,
+                description="Page number to retrieve.",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            *FIELDSET_PARAMETERS,
+        ],
+        responses={
+            200: openapi.Response(
+                description="Paginated list of the author's books",
+                schema=BookSerializer(many=True)
+            ),
+            404: "Author not found",
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        self.author = get_object_or_404(Author, pk=self.kwargs['author_id'])
+        return super().get(request, *args, **kwargs)
 
-        response = super().get(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=300)  # Cache for 5 minutes
+    def get_queryset(self):
+        # Ordered to match the books_book_author_idx index
+        return self.narrow_queryset(Book.objects.filter(author=self.author).order_by('id'))
 
-        return response
\ No newline at end of file
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        for book in page or ():
+            book.author = self.author  # Already loaded: no join needed
+        return page
+
+
+class BookFacetsView(APIView):
+    @swagger_auto_schema(
+        operation_description="Retrieve the number of books per genre, and optionally the number of reviews per rating.",
+        manual_parameters=[
+            openapi.Parameter(
+                name='include',
+                in_=openapi.IN_QUERY,
+                description="Set to 'ratings' to also return review counts per star rating.",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Facet counts",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'genres': openapi.Schema(type=openapi.TYPE_OBJECT, additional_properties=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                        'ratings': openapi.Schema(type=openapi.TYPE_OBJECT, additional_properties=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                    }
+                )
+            ),
+        }
+    )
+    def get(self, request):
+        """
+        Facet counts are read from the materialized genre table (cached),
+        instead of one paginated COUNT(*) per genre.
+        """
+        data = {'genres': genre_counts()}
+        if 'ratings' in request.GET.get('include', '').split(','):
+            data['ratings'] = rating_counts()
+        return Response(data, status=status.HTTP_200_OK)
+
+
+
+def _result_limit(request, default=10):
+    try:
+        return min(max(int(request.GET.get('limit', default)), 1), MAX_RESULTS)
+    except ValueError:
+        return default
+
+
+RECOMMENDATION_LIMIT_PARAMETER = openapi.Parameter(
+    name='limit',
+    in_=openapi.IN_QUERY,
+    description=f"Number of books to return (1-{MAX_RESULTS}, default 10).",
+    type=openapi.TYPE_INTEGER,
+    required=False
+)
+
+
+class SimilarBooksView(APIView):
+    @swagger_auto_schema(
+        operation_description="Readers who liked this book also liked: the most similar books by co-rating.",
+        manual_parameters=[RECOMMENDATION_LIMIT_PARAMETER],
+        responses={
+            200: openapi.Response(description="Similar books, most similar first, each with a 'score'"),
+            404: "Book not found",
+        }
+    )
+    def get(self, request, id):
+        """
+        Served from the neighbour lists precomputed by `build_recommendations`.
+        """
+        results = similar_books(id)
+        if results is None:
+            return Response({'detail': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'book': id, 'results': results[:_result_limit(request)]}, status=status.HTTP_200_OK)
+
+
+class UserRecommendationsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Books recommended to the authenticated user from the books they reviewed.",
+        manual_parameters=[RECOMMENDATION_LIMIT_PARAMETER],
+        responses={
+            200: openapi.Response(description="Recommended books, best first, each with a 'score'"),
+        },
+        security=[{"Bearer": []}]
+    )
+    def get(self, request):
+        results = user_recommendations(request.user.pk)
+        return Response({'results': results[:_result_limit(request)]}, status=status.HTTP_200_OK)
+
+
+class LeaderboardView(APIView):
+    @swagger_auto_schema(
+        operation_description=(
+            "Books ranked by reviews in a time window: 'top-rated' by Bayesian-weighted average rating "
+            "(few reviews pull a book towards the window's mean), 'most-reviewed' by number of reviews."
+        ),
+        manual_parameters=[
+            openapi.Parameter('board', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(BOARDS),
+                              description="Ranking, default 'top-rated'.", required=False),
+            openapi.Parameter('window', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(WINDOWS),
+                              description="Reviews created in the last day, week (default), month, or all time.",
+                              required=False),
+            openapi.Parameter('genre', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=ALLOWED_GENRES,
+                              description="Rank only books of this genre.", required=False),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f"Number of books to return (1-{MAX_LIMIT}, default 10).", required=False),
+        ],
+        responses={
+            200: openapi.Response(description="Ranked books with their score, review count and average rating"),
+            400: "Bad Request - Unknown board, window or genre",
+        }
+    )
+    def get(self, request):
+        board = request.GET.get('board', 'top-rated')
+        window = request.GET.get('window', 'week')
+        genre = request.GET.get('genre') or None
+        if board not in BOARDS or window not in WINDOWS or (genre and genre not in ALLOWED_GENRES):
+            return Response(
+                {'detail': f"board must be one of {', '.join(BOARDS)}; window one of {', '.join(WINDOWS)}; "
+                           f"genre one of {', '.join(ALLOWED_GENRES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_LIMIT)
+        except ValueError:
+            limit = 10
+
+        entries = leaderboard(board, window, genre, limit)
+        titles = Book.objects.in_bulk([entry['book'] for entry in entries])
+        results = [
+            {
+                'id': entry['book'],
+                'title': titles[entry['book']].title,
+                'score': entry['score'],
+                'reviews': entry['reviews'],
+                'average_rating': entry['average_rating'],
+            }
+            for entry in entries if entry['book'] in titles  # Skip books deleted since the last update
+        ]
+        return Response({'board': board, 'window': window, 'genre': genre, 'results': results},
+                        status=status.HTTP_200_OK)
+
+
+class AutocompleteView(APIView):
+    @swagger_auto_schema(
+        operation_description=(
+            "Search-as-you-type over book titles and authors. Every word of `q` must start a word of the "
+            "book's title or author; the last one may be unfinished. Served from an in-memory index, "
+            "without a database query. When nothing matches, misspelt words are corrected and the "
+            "corrected query is returned as `correction`."
+        ),
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="What the user typed so far."),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description=f"Number of books to return (1-{autocomplete.MAX_LIMIT}, default 10)."),
+        ],
+        responses={200: openapi.Response(description="Matching books, best first: title matches before author matches")}
+    )
+    def get(self, request):
+        query = request.GET.get('q', '')
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), autocomplete.MAX_LIMIT)
+        except ValueError:
+            limit = 10
+        results, correction = autocomplete.get_index().search(query, limit)
+        return Response({'query': query, 'correction': correction, 'results': results}, status=status.HTTP_200_OK)
@@ -0,0 +1,233 @@
+"""
+Proactive cache warming.
+
+Views count hits per cacheable request in a small per-process top-K sketch,
+merged into the shared cache every few seconds. `manage.py warm_cache` reads
+the merged hot set and refills those entries when they are missing (after a
+deploy, or once a book write bumped the cache generation) or before their
+TTL runs out, so users do not pay for the first miss.
+"""
+import io
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import resolve, reverse
+
+from .cache_keys import (
+    build_cache_key, canonical_params, current_generation, FILTER_PARAMS, LIST_CACHE_TIMEOUT, LIST_PARAMS,
+    METADATA_CACHE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+HOT_KEYS_CACHE_KEY = 'cache_warming_hot_keys'
+FLUSH_INTERVAL = 10  # Seconds between merges of a process's counts into the cache
+HALF_LIFE = 600  # Seconds for merged hit counts to halve, so the hot set follows traffic
+REFRESH_AT = 0.8  # Refresh entries once this share of their TTL has passed
+
+
+@dataclass(frozen=True)
+class Family:
+    url_name: str
+    params: dict  # Query params the view reads, None when the params are URL kwargs
+    timeout: int
+    generational: bool  # Whether the key includes the cache generation
+
+
+FAMILIES = {
+    'book_list': Family('list-books', LIST_PARAMS, LIST_CACHE_TIMEOUT, True),
+    'book_filter': Family('book-filter', FILTER_PARAMS, LIST_CACHE_TIMEOUT, True),
+    'book_detail': Family('book-detail', None, METADATA_CACHE_TIMEOUT, False),
+}
+
+
+def _spec(family, params):
+    return f"{family}:{json.dumps(params, sort_keys=True)}"
+
+
+def _parse_spec(spec):
+    family, params = spec.split(':', 1)
+    return family, json.loads(params)
+
+
+def merge_hot_keys(counts, capacity):
+    """
+    Add a process's hit counts to the shared, decaying hot set. Concurrent
+    merges can drop each other's counts, which an estimate tolerates.
+    """
+    now = time.time()
+    state = cache.get(HOT_KEYS_CACHE_KEY) or {'at': now, 'counts': {}}
+    decay = 0.5 ** ((now - state['at']) / HALF_LIFE)
+    merged = {spec: count * decay for spec, count in state['counts'].items()}
+    for spec, count in counts.items():
+        merged[spec] = merged.get(spec, 0) + count
+    top = dict(sorted(merged.items(), key=lambda item: -item[1])[:capacity])
+    cache.set(HOT_KEYS_CACHE_KEY, {'at': now, 'counts': top}, timeout=None)
+
+
+class HotKeySketch:
+    """
+    Space-Saving top-K counter. Once full, a new key takes over the least
+    counted slot and its count, so memory stays at `capacity` entries and
+    every truly frequent key is kept.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, spec):
+        with self._lock:
+            if spec in self.counts:
+                self.counts[spec] += 1
+            elif len(self.counts) < self.capacity:
+                self.counts[spec] = 1
+            else:
+                evicted = min(self.counts, key=self.counts.get)
+                self.counts[spec] = self.counts.pop(evicted) + 1
+
+            now = time.monotonic()
+            if now - self._flushed_at < FLUSH_INTERVAL:
+                return
+            counts, self.counts, self._flushed_at = self.counts, {}, now
+        merge_hot_keys(counts, self.capacity)
+
+
+_sketch = HotKeySketch(settings.CACHE_WARMER_TOP_K)
+
+
+def record_hit(family, params):
+    allowed = FAMILIES[family].params
+    _sketch.add(_spec(family, canonical_params(params, allowed) if allowed is not None else params))
+
+
+def hot_keys(limit):
+    """
+    The `limit` most requested `(family, params, score)` across processes.
+    """
+    state = cache.get(HOT_KEYS_CACHE_KEY) or {'counts': {}}
+    ranked = sorted(state['counts'].items(), key=lambda item: -item[1])[:limit]
+    return [(*_parse_spec(spec), score) for spec, score in ranked]
+
+
+class RateLimiter:
+    """
+    Spaces calls at least `1 / rate` seconds apart across threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def render(family, params, base_url):
+    """
+    Run the view for a cache entry with the cache read bypassed, so it stores a
+    fresh payload. Goes through replica routing, keeping warming reads off the
+    primary when replicas are configured.
+    """
+    from book_review_service.db_router import ReplicaRoutingMiddleware
+
+    spec = FAMILIES[family]
+    if spec.params is None:
+        path, query = reverse(spec.url_name, kwargs=params), {}
+    else:
+        path, query = reverse(spec.url_name), params
+    url = urlsplit(base_url)
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query, doseq=True),
+        'SERVER_NAME': url.hostname or 'localhost',
+        'SERVER_PORT': str(url.port or (443 if url.scheme == 'https' else 80)),
+        'HTTP_HOST': url.netloc,
+        'wsgi.url_scheme': url.scheme or 'http',
+        'wsgi.input': io.BytesIO(),
+    })
+    request.warming = True
+
+    match = resolve(path)
+    response = ReplicaRoutingMiddleware(lambda request: match.func(request, *match.args, **match.kwargs))(request)
+    return response.status_code
+
+
+class CacheWarmer:
+    """
+    Refills the hottest cache entries, with at most `concurrency` views
+    rendering at once and at most `rate` renders per second.
+    """
+
+    def __init__(self, top=100, concurrency=2, rate=10.0, base_url=None):
+        self.top = top
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.base_url = base_url or settings.CACHE_WARMER_BASE_URL
+        self.warmed = {}  # spec -> (generation, monotonic time of the last render)
+
+    def due(self, generation, now):
+        """
+        Hot entries that are missing, not warmed by this warmer yet, or close to expiry.
+        """
+        due = []
+        hot = hot_keys(self.top)
+        for family, params, _ in hot:
+            spec = FAMILIES[family]
+            entry_generation = generation if spec.generational else None
+            warmed = self.warmed.get(_spec(family, params))
+            if warmed is None or warmed[0] != entry_generation or now - warmed[1] > spec.timeout * REFRESH_AT:
+                due.append((family, params, entry_generation))
+            elif spec.generational and build_cache_key(family, params, spec.params, generation) not in cache:
+                due.append((family, params, entry_generation))  # Evicted
+        hot_specs = {_spec(family, params) for family, params, _ in hot}
+        self.warmed = {spec: warmed for spec, warmed in self.warmed.items() if spec in hot_specs}
+        return due
+
+    def warm(self, family, params, generation, in_thread=False):
+        self.limiter.wait()
+        try:
+            status = render(family, params, self.base_url)
+        except Exception:
+            logger.exception(f"Warming {family} {params} failed")
+            return False
+        finally:
+            if in_thread:
+                connections.close_all()
+        if status != 200:
+            logger.warning(f"Warming {family} {params} returned {status}")
+            return False
+        self.warmed[_spec(family, params)] = (generation, time.monotonic())
+        return True
+
+    def run_once(self):
+        """
+        Warm every due entry, returning `(warmed, failed)`.
+        """
+        due = self.due(current_generation(), time.monotonic())
+        if self.concurrency <= 1:
+            results = [self.warm(*job) for job in due]
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = list(executor.map(lambda job: self.warm(*job, in_thread=True), due))
+        return results.count(True), results.count(False)
@@ -1,5 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User 
+from book_review_service.pagination import EstimatedCountPaginator
+from .models import User
 
-admin.site.register(User, UserAdmin)
\ No newline at end of file
+
+class EstimatedCountUserAdmin(UserAdmin):
+    # The user table is too large to COUNT(*) on every changelist page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(User, EstimatedCountUserAdmin)